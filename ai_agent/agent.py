@@ -3,15 +3,25 @@ import json
 import logging
 import re
 import ast
+import time
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
-from .llm import PhindCodeLlamaLLM
+from .llm import PhindCodeLlamaLLM, code_language_kwargs
 from .generator import TestGenerator
 from .documentation import DocumentationGenerator
 from .memory import MemoryModule
-from .watcher import get_functions_from_diff_file, analyze_diff_changes
+from .watcher import get_functions_from_diff_file, analyze_diff_changes, FunctionChange
 from .prompts import PromptStrategy
 from .enhanced_context import EnhancedContextLoader
+from .scheduler import FunctionScheduler
+from .metrics import metrics
+from .fingerprint import function_fingerprint
+from .bandit import ADAPTIVE, StrategyBandit, function_type
+from .candidate_ranking import local_modules_for, score_candidate
+
+# PR directories whose context loaders are kept in memory at once
+CONTEXT_LOADER_CACHE_SIZE = 2
+
 
 class AIAgent:
     def __init__(
@@ -20,6 +30,11 @@ class AIAgent:
         model_name: str = "h2oai/h2ogpt-16k-codellama-13b-python",
         api_token: Optional[str] = None,
         provider: str = "hf-inference",
+        reuse_unchanged: Optional[bool] = None,
+        execute_tests: bool = False,
+        mutation_testing: bool = False,
+        num_candidates: Optional[int] = None,
+        memory_file: Optional[str] = None,
     ):
         # If LLM is provided directly, use it; otherwise create default
         if llm is not None:
@@ -28,10 +43,23 @@ class AIAgent:
             self.llm = PhindCodeLlamaLLM(model_name, api_token=api_token, provider=provider)
         
         self.model_name = getattr(self.llm, 'model_name', model_name)
-        self.test_generator = TestGenerator(self.llm)
+        self.test_generator = TestGenerator(self.llm, num_candidates=num_candidates)
         self.doc_generator = DocumentationGenerator(self.llm)
-        self.memory = MemoryModule()
+        self.memory = MemoryModule(memory_file)
         self.prompt_strategy = PromptStrategy()
+        # Loaders for the most recent PR directories, so PR-level context is reused
+        # across strategies without keeping every PR of a batch resident
+        self._context_loaders: Dict[str, EnhancedContextLoader] = {}
+        # Reuse the stored test when a function's normalized fingerprint is unchanged
+        if reuse_unchanged is None:
+            reuse_unchanged = os.environ.get("AI_AGENT_REUSE_TESTS", "1").lower() not in ("0", "false", "no")
+        self.reuse_unchanged = reuse_unchanged
+        # Run the saved Python tests in the sandboxed executor after each diff is processed
+        self.execute_tests = execute_tests
+        # Score each new Python test by the share of function mutants it kills
+        self.mutation_testing = mutation_testing
+        # Created on first use of the "adaptive" prompt strategy
+        self._strategy_bandit = None
 
         logging.basicConfig(
             level=logging.INFO,
@@ -45,6 +73,7 @@ class AIAgent:
         output_dir: str = "generated",
         prompt_strategy: str = "naive",
         generate_docs: bool = True,
+        time_budget: Optional[float] = None,
     ) -> Dict[str, Any]:
         self.logger.info(f"Processing diff file: {diff_file_path}")
 
@@ -52,17 +81,26 @@ class AIAgent:
 
         pr_data_path = self._find_pr_data_directory(diff_file_path)
         
+        sources = None
         if pr_data_path and os.path.exists(pr_data_path):
             self.logger.info(f"Found PR data directory: {pr_data_path}")
-            return self._process_with_enhanced_context(
-                pr_data_path, output_dir, prompt_strategy, generate_docs
+            results = self._process_with_enhanced_context(
+                pr_data_path, output_dir, prompt_strategy, generate_docs, time_budget
             )
+            if self.execute_tests:
+                sources = self._python_sources(self._get_context_loader(pr_data_path))
         else:
             self.logger.info("No enhanced context found, falling back to basic processing")
-            return self._process_with_basic_context(
+            results = self._process_with_basic_context(
                 diff_file_path, output_dir, prompt_strategy, generate_docs
             )
 
+        if self.execute_tests:
+            results["execution"] = self.execute_generated_tests(
+                results.get("test_files", []), prompt_strategy, sources, results.get("test_file_strategies")
+            )
+        return results
+
     def _find_pr_data_directory(self, diff_file_path: str) -> Optional[str]:
         current_path = os.path.dirname(os.path.abspath(diff_file_path))
         
@@ -78,15 +116,33 @@ class AIAgent:
         
         return None
 
+    def _get_context_loader(self, pr_data_path: str) -> EnhancedContextLoader:
+        key = os.path.abspath(pr_data_path)
+        # Re-insert on every use so dict order is least recently used first
+        loader = self._context_loaders.pop(key, None) or EnhancedContextLoader(pr_data_path)
+        self._context_loaders[key] = loader
+        while len(self._context_loaders) > CONTEXT_LOADER_CACHE_SIZE:
+            evicted = next(iter(self._context_loaders))
+            logging.debug(f"Dropping cached context for {evicted}")
+            del self._context_loaders[evicted]
+        return loader
+
     def _process_with_enhanced_context(
         self,
         pr_data_path: str,
         output_dir: str,
         prompt_strategy: str,
-        generate_docs: bool
+        generate_docs: bool,
+        time_budget: Optional[float] = None
     ) -> Dict[str, Any]:
-        enhanced_context = EnhancedContextLoader(pr_data_path)
-        source_files = enhanced_context.get_source_files()
+        with metrics.span("context_load") as span:
+            enhanced_context = self._get_context_loader(pr_data_path)
+            source_files = enhanced_context.get_source_files()
+            span["source_files"] = len(source_files)
+        if time_budget is None:
+            time_budget = FunctionScheduler.budget_from_env()
+        scheduler = FunctionScheduler(time_budget)
+        work_items = []
         
         results = {
             "enhanced_context_used": True,
@@ -95,8 +151,18 @@ class AIAgent:
             "source_files_processed": [],
             "generated_tests": {},
             "generated_docs": {},
+            "reused_tests": [],
+            "test_files": [],
+            "mutation_scores": {},
+            "strategy_choices": {},
+            "test_file_strategies": {},
             "memory_summary": self.memory.get_memory_summary(),
+            "skipped": [],
+            # Functions whose generation raised; the run itself still completes
+            "failed": [],
         }
+        mutation_sources = self._python_sources(enhanced_context) if self.mutation_testing else None
+        local_modules = local_modules_for(source_files)
 
         for file_path in source_files:
             self.logger.info(f"Processing source file: {file_path}")
@@ -113,18 +179,55 @@ class AIAgent:
                 self.logger.warning(f"Could not determine language for {file_path}")
                 continue
             
-            functions = self._extract_functions_from_file_content(
-                file_path, file_context, language
-            )
-            
-            if not functions:
-                self.logger.warning(f"No functions extracted from {file_path}, creating basic test")
-                functions = self._create_basic_function_from_file(file_path, file_context, language)
+            with metrics.span("function_extraction", file=file_path, language=language) as span:
+                functions = self._extract_functions_from_file_content(
+                    file_path, file_context, language
+                )
+                
+                if not functions:
+                    self.logger.warning(f"No functions extracted from {file_path}, creating basic test")
+                    functions = self._create_basic_function_from_file(file_path, file_context, language)
+                span["functions"] = len(functions)
             
             for function_name, function_code in functions:
-                self.logger.info(f"Processing {language} function: {function_name}")
-                
+                work_items.append(FunctionScheduler.build_item(
+                    file_path, language, function_name, function_code, enhanced_context
+                ))
+
+        scheduler.start()
+        ordered_items = scheduler.order(work_items)
+        for index, item in enumerate(ordered_items):
+            if not scheduler.has_time_for_next():
+                results["skipped"] = [skipped.to_dict() for skipped in ordered_items[index:]]
+                self.logger.warning(
+                    f"Time budget of {scheduler.time_budget}s reached after {scheduler.elapsed():.1f}s, "
+                    f"skipping {len(results['skipped'])} lower-priority functions"
+                )
+                break
+
+            file_path, language = item.file_path, item.language
+            function_name, function_code = item.function_name, item.function_code
+            item_started = time.monotonic()
+            self.logger.info(f"Processing {language} function: {function_name} (priority {item.score:.2f})")
+            
+            # Every span recorded while this function is processed carries these labels
+            strategy, kind = self._resolve_strategy(prompt_strategy, language, function_code)
+            if strategy != prompt_strategy:
+                results["strategy_choices"][f"{file_path}::{function_name}"] = strategy
+            with metrics.labels(file=file_path, function=function_name, language=language, strategy=strategy):
                 try:
+                    reused = self._reusable_test(file_path, function_name, function_code, language, strategy)
+                    if reused is not None:
+                        results["generated_tests"][function_name] = reused
+                        results["reused_tests"].append(f"{file_path}::{function_name}")
+                        with metrics.span("file_save", reused=True):
+                            saved = self._save_test_file(file_path, language, reused, strategy, enhanced_context)
+                        if saved and saved not in results["test_files"]:
+                            results["test_files"].append(saved)
+                            results["test_file_strategies"][saved] = strategy
+                        continue
+                    
+                    generation_started = time.monotonic()
                     test_code = self.test_generator.generate_tests_with_enhanced_context(
                         function_code=function_code,
                         function_name=function_name,
@@ -132,44 +235,73 @@ class AIAgent:
                         language=language,
                         enhanced_context=enhanced_context,
                         output_dir=output_dir,
-                        prompt_strategy=prompt_strategy
+                        prompt_strategy=strategy
                     )
-                    
+                    generation_seconds = time.monotonic() - generation_started
+                    # The template test written when the LLM call fails is saved but not counted as output
+                    fallback_error = self.test_generator.last_fallback_error
+                
                     if not test_code or not test_code.strip():
+                        if prompt_strategy == ADAPTIVE:
+                            self._record_strategy_outcome(strategy, language, kind, "", generation_seconds,
+                                                          None, local_modules)
                         raise RuntimeError("Empty test generation")
-                    
-                    self.memory.store_test_pattern(
-                        function_name=function_name,
-                        function_signature=function_code.split("\n")[0],
-                        test_code=test_code,
-                    )
-                    
-                    results["generated_tests"][function_name] = test_code
-                    
+                
+                    mutation_score = None
+                    if fallback_error:
+                        if prompt_strategy == ADAPTIVE:
+                            self._record_strategy_outcome(strategy, language, kind, "", generation_seconds,
+                                                          None, local_modules)
+                    elif mutation_sources and file_path.endswith(".py"):
+                        mutation_score = self._mutation_score(
+                            mutation_sources, file_path, function_name, function_code, test_code
+                        )
+                        results["mutation_scores"][f"{file_path}::{function_name}"] = mutation_score
+                    if prompt_strategy == ADAPTIVE and not fallback_error:
+                        self._record_strategy_outcome(strategy, language, kind, test_code, generation_seconds,
+                                                      mutation_score, local_modules)
+                
+                    if not fallback_error:
+                        self.memory.store_test_pattern(
+                            function_name=function_name,
+                            function_signature=function_code.split("\n")[0],
+                            test_code=test_code,
+                            mutation_score=mutation_score,
+                            file_path=file_path,
+                        )
+                
+                        results["generated_tests"][function_name] = test_code
+                        self._remember_fingerprint(file_path, function_name, function_code, language, strategy, test_code)
+                
                     # Save test file using the proper method
-                    self._save_test_file(file_path, language, test_code, prompt_strategy, enhanced_context)
-                    self.logger.info(f"Generated test: {file_path} using {prompt_strategy} strategy")
-                    
+                    with metrics.span("file_save"):
+                        saved = self._save_test_file(file_path, language, test_code, strategy, enhanced_context)
+                    if saved and saved not in results["test_files"]:
+                        results["test_files"].append(saved)
+                        results["test_file_strategies"][saved] = strategy
+                    self.logger.info(f"Generated test: {file_path} using {strategy} strategy")
+                
                     # ALWAYS generate documentation for the test file
-                    self.logger.info(f"Starting documentation generation for {file_path} using {prompt_strategy} strategy")
-                    
+                    self.logger.info(f"Starting documentation generation for {file_path} using {strategy} strategy")
+                
                     try:
-                        doc_content = self.doc_generator.generate_documentation(
-                            function_code=test_code,
-                            function_name=f"test_{Path(file_path).stem}",
-                            language=language
-                        )
-                        
+                        with metrics.span("doc_generation"):
+                            doc_content = self.doc_generator.generate_documentation(
+                                function_code=test_code,
+                                function_name=f"test_{Path(file_path).stem}",
+                                language=language
+                            )
+                    
                         if doc_content and doc_content.strip():
                             logging.info(f"Documentation generated successfully, length: {len(doc_content)} characters")
-                            self._save_documentation_file(file_path, language, doc_content, prompt_strategy, enhanced_context)
-                            logging.info(f"Generated documentation for {file_path} using {prompt_strategy} strategy")
+                            self._save_documentation_file(file_path, language, doc_content, strategy, enhanced_context)
+                            logging.info(f"Generated documentation for {file_path} using {strategy} strategy")
                         else:
                             logging.warning(f"Empty documentation generated for {file_path}, attempting fallback")
                             # Generate fallback documentation
                             doc_content = self._generate_fallback_documentation(file_path, language, test_code)
                             if doc_content:
-                                self._save_documentation_file(file_path, language, doc_content, prompt_strategy, enhanced_context)
+                                self._save_documentation_file(file_path, language, doc_content, strategy, enhanced_context)
                                 logging.info(f"Generated fallback documentation for {file_path}")
                     except Exception as e:
                         logging.error(f"Error generating documentation for {file_path}: {e}")
@@ -177,29 +309,36 @@ class AIAgent:
                         try:
                             doc_content = self._generate_fallback_documentation(file_path, language, test_code)
                             if doc_content:
-                                self._save_documentation_file(file_path, language, doc_content, prompt_strategy, enhanced_context)
+                                self._save_documentation_file(file_path, language, doc_content, strategy, enhanced_context)
                                 logging.info(f"Generated fallback documentation for {file_path} after error")
                         except Exception as fallback_error:
                             logging.error(f"Failed to generate fallback documentation for {file_path}: {fallback_error}")
-                    
+                
                     # Get the test file path for results
                     from .language_detector import LanguageDetector
                     file_extension = LanguageDetector.get_file_extension_for_language(language, file_path)
                     test_file_name = f"test_{Path(file_path).stem}{file_extension}"
-                    
+                
                     results["source_files_processed"].append({
                         "file": file_path,
                         "function": function_name,
                         "language": language,
                         "test_file": test_file_name
                     })
-                    
+                    if fallback_error:
+                        results["failed"].append({"file": file_path, "function": function_name,
+                                                  "language": language, "error": fallback_error})
+                
                 except Exception as e:
-                    self.logger.error(f"Error processing function {function_name} with strategy {prompt_strategy}: {e}")
+                    self.logger.error(f"Error processing function {function_name} with strategy {strategy}: {e}")
                     # Log additional context for debugging
-                    self.logger.error(f"Function: {function_name}, Language: {language}, Strategy: {prompt_strategy}")
+                    self.logger.error(f"Function: {function_name}, Language: {language}, Strategy: {strategy}")
                     self.logger.error(f"File: {file_path}")
+                    results["failed"].append({"file": file_path, "function": function_name,
+                                              "language": language, "error": str(e)})
                     continue
+                finally:
+                    scheduler.record(time.monotonic() - item_started)
         
         return results
 
@@ -225,11 +364,24 @@ class AIAgent:
             "functions": [],
             "generated_tests": {},
             "generated_docs": {},
+            "reused_tests": [],
+            "test_files": [],
+            "strategy_choices": {},
+            "test_file_strategies": {},
             "memory_summary": self.memory.get_memory_summary(),
+            "failed": [],
         }
 
+        local_modules = local_modules_for([function[2] for function in functions])
         for function_name, function_code, file_path, language in functions:
             self.logger.info(f"Processing {language} function: {function_name}")
+            strategy, kind = self._resolve_strategy(prompt_strategy, language, function_code)
+            test_dir = output_dir
+            if strategy != prompt_strategy:
+                results["strategy_choices"][f"{file_path}::{function_name}"] = strategy
+                # Adaptive runs keep each arm's tests apart, as _save_test_file does
+                test_dir = os.path.join(output_dir, strategy)
+                os.makedirs(test_dir, exist_ok=True)
 
             self.memory.store_function_context(
                 function_name=function_name,
@@ -238,30 +390,53 @@ class AIAgent:
             )
 
             try:
+                reused = self._reusable_test(file_path, function_name, function_code, language, strategy)
+                if reused is not None:
+                    from .language_detector import LanguageDetector
+                    file_extension = LanguageDetector.get_file_extension_for_language(language, file_path)
+                    test_file_path = os.path.join(test_dir, f"test_{function_name}{file_extension}")
+                    with open(test_file_path, "w", encoding='utf-8') as f:
+                        f.write(reused)
+                    results["generated_tests"][function_name] = reused
+                    results["reused_tests"].append(f"{file_path}::{function_name}")
+                    results["test_files"].append(test_file_path)
+                    results["test_file_strategies"][test_file_path] = strategy
+                    continue
+
+                generation_started = time.monotonic()
                 test_code = self.test_generator.generate_tests_for_function(
                     function_code=function_code,
                     function_name=function_name,
                     diff_context=diff_content,
-                    prompt_strategy=prompt_strategy,
+                    prompt_strategy=strategy,
                     language=language,
                 )
+                generation_seconds = time.monotonic() - generation_started
 
-                if not test_code or not test_code.strip() or test_code.strip().startswith("# Error"):
+                failed = not test_code or not test_code.strip() or test_code.strip().startswith("# Error")
+                if prompt_strategy == ADAPTIVE:
+                    self._record_strategy_outcome(strategy, language, kind, "" if failed else test_code,
+                                                  generation_seconds, None, local_modules)
+                if failed:
                     raise RuntimeError("Empty/errored test generation")
+                self._remember_fingerprint(file_path, function_name, function_code, language, strategy, test_code)
 
                 self.memory.store_test_pattern(
                     function_name=function_name,
                     function_signature=function_code.split("\n")[0],
                     test_code=test_code,
+                    file_path=file_path,
                 )
 
                 results["generated_tests"][function_name] = test_code
 
                 from .language_detector import LanguageDetector
                 file_extension = LanguageDetector.get_file_extension_for_language(language, file_path)
-                test_file_path = os.path.join(output_dir, f"test_{function_name}{file_extension}")
+                test_file_path = os.path.join(test_dir, f"test_{function_name}{file_extension}")
                 with open(test_file_path, "w", encoding='utf-8') as f:
                     f.write(test_code)
+                results["test_files"].append(test_file_path)
+                results["test_file_strategies"][test_file_path] = strategy
 
                 # ALWAYS generate documentation for both source function and test file
                 try:
@@ -304,6 +479,8 @@ class AIAgent:
 
             except Exception as e:
                 self.logger.error(f"Error processing function {function_name}: {e}")
+                results["failed"].append({"file": file_path, "function": function_name,
+                                          "language": language, "error": str(e)})
                 continue
 
         return results
@@ -316,8 +493,8 @@ class AIAgent:
     ) -> List[Tuple[str, str]]:
         from .language_detector import LanguageDetector
         
-        full_content = file_context.get("full_content", "")
-        patch_content = file_context.get("patch", "")
+        full_content = file_context.get("full_content") or ""
+        patch_content = file_context.get("patch") or ""
         
         self.logger.info(f"Extracting functions from {file_path} (language: {language})")
         self.logger.info(f"Full content length: {len(full_content)}")
@@ -451,6 +628,170 @@ class AIAgent:
         
         return content[start_pos:end_pos].strip()
 
+    def generate_tests_for_changes(
+        self,
+        changes: List[FunctionChange],
+        output_dir: str = "generated_tests",
+        prompt_strategy: str = "diff-aware"
+    ) -> Dict[str, str]:
+        """Generate tests for functions reported by the watch mode; returns {file::function: test path}"""
+        import difflib
+        from .language_detector import LanguageDetector
+
+        os.makedirs(output_dir, exist_ok=True)
+        written = {}
+        for change in changes:
+            key = f"{change.file_path}::{change.name}"
+            diff_context = "".join(difflib.unified_diff(
+                (change.previous_code or "").splitlines(keepends=True),
+                change.code.splitlines(keepends=True),
+                fromfile=f"a/{change.file_path}",
+                tofile=f"b/{change.file_path}",
+            ))
+            with metrics.labels(file=change.file_path, function=change.name, language=change.language):
+                test_code = self._reusable_test(change.file_path, change.name, change.code, change.language,
+                                                prompt_strategy)
+                if test_code is None:
+                    test_code = self.test_generator.generate_tests_for_function(
+                        function_code=change.code,
+                        function_name=change.name,
+                        diff_context=diff_context,
+                        prompt_strategy=prompt_strategy,
+                        language=change.language
+                    )
+                    if not test_code or not test_code.strip() or test_code.startswith("# Error generating test"):
+                        self.logger.error(f"No test generated for {key}")
+                        continue
+                    self._remember_fingerprint(change.file_path, change.name, change.code, change.language,
+                                               prompt_strategy, test_code)
+
+                self.memory.store_test_pattern(
+                    function_name=change.name,
+                    function_signature=change.code.split("\n")[0],
+                    test_code=test_code,
+                    file_path=change.file_path,
+                )
+                extension = LanguageDetector.get_file_extension_for_language(change.language, change.file_path)
+                test_path = os.path.join(output_dir, f"test_{Path(change.file_path).stem}_{change.name}{extension}")
+                with metrics.span("file_save"):
+                    with open(test_path, "w", encoding="utf-8") as f:
+                        f.write(test_code)
+            self.logger.info(f"Regenerated test for {key}: {test_path}")
+            written[key] = test_path
+        return written
+
+    def _python_sources(self, enhanced_context: EnhancedContextLoader) -> Dict[str, str]:
+        """The PR's Python files as {relative path: content}, for running tests against"""
+        sources = {}
+        for file_path in enhanced_context.get_source_files():
+            if not file_path.endswith(".py"):
+                continue
+            content = enhanced_context.get_file_context(file_path).get("full_content")
+            if content:
+                sources[file_path] = content
+        return sources
+
+    def execute_generated_tests(
+        self,
+        test_files: List[str],
+        prompt_strategy: str,
+        sources: Optional[Dict[str, str]] = None,
+        file_strategies: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Run saved Python tests in the sandboxed executor and feed the scores back into memory"""
+        from .executor import TestExecutor, summarize_results
+
+        python_tests = [path for path in test_files if path.endswith(".py") and os.path.exists(path)]
+        if not python_tests:
+            return {"results": {}, "summary": summarize_results({})}
+
+        executor = TestExecutor(
+            timeout=float(os.environ.get("AI_AGENT_TEST_TIMEOUT", 30)),
+            memory_mb=int(os.environ.get("AI_AGENT_TEST_MEMORY_MB", 1024)),
+        )
+        with metrics.span("execution", files=len(python_tests)):
+            results = executor.run_files(python_tests, sources)
+
+        for path, result in results.items():
+            self.memory.store_prompt_effectiveness(
+                prompt_strategy=(file_strategies or {}).get(path, prompt_strategy),
+                function_type="python",
+                quality_score=result["pass_rate"],
+                coverage_score=result["coverage"],
+            )
+            self.logger.info(f"Executed {path}: {result['status']} ({result['passed']} passed, "
+                             f"{result['failed']} failed, {result['errors']} errors, "
+                             f"coverage {result['coverage']:.0%}, {result['duration_s']:.2f}s)")
+        return {"results": results, "summary": summarize_results(results)}
+
+    @property
+    def strategy_bandit(self) -> StrategyBandit:
+        if self._strategy_bandit is None:
+            self._strategy_bandit = StrategyBandit(self.memory)
+        return self._strategy_bandit
+
+    def _resolve_strategy(self, prompt_strategy: str, language: str, function_code: str) -> Tuple[str, str]:
+        """The strategy to run for one function; "adaptive" asks the bandit"""
+        kind = function_type(function_code, language)
+        if prompt_strategy != ADAPTIVE:
+            return prompt_strategy, kind
+        strategy = self.strategy_bandit.choose(language, kind)
+        self.logger.info(f"Adaptive strategy for {language}/{kind} function: {strategy}")
+        return strategy, kind
+
+    def _record_strategy_outcome(self, strategy: str, language: str, kind: str, test_code: str, seconds: float,
+                                 mutation_score: Optional[float], local_modules) -> None:
+        # The mutation score is the better quality signal; otherwise use the static candidate score
+        quality = mutation_score if mutation_score is not None else score_candidate(
+            test_code, language, local_modules).score
+        reward = self.strategy_bandit.record(strategy, language, kind, quality, seconds)
+        self.logger.info(f"Strategy {strategy} on {language}/{kind}: quality {quality:.2f} in {seconds:.1f}s "
+                         f"(reward {reward:.3f}/s)")
+
+    def _mutation_score(self, sources: Dict[str, str], file_path: str, function_name: str, function_code: str,
+                        test_code: str) -> Optional[float]:
+        from .mutation import MutationTester
+
+        result = MutationTester(memory=self.memory).run(
+            sources, file_path, function_name, test_code,
+            function_code=function_code, test_name=f"test_{Path(file_path).stem}.py"
+        )
+        if not result:
+            return None
+        if result["score"] is None:
+            self.logger.info(f"No mutation score for {function_name}: test {result['baseline_status']} on the original code")
+        else:
+            self.logger.info(f"Mutation score for {function_name}: {result['score']:.2f} "
+                             f"({result['killed']}/{result['mutants']} killed"
+                             f"{', cached' if result['cached'] else ''})")
+        return result["score"]
+
+    def _reusable_test(self, file_path: str, function_name: str, function_code: str, language: str,
+                       prompt_strategy: str) -> Optional[str]:
+        """The stored test for this function if its normalized body is unchanged since it was generated"""
+        if not self.reuse_unchanged:
+            return None
+        record = self.memory.get_function_fingerprint(file_path, function_name, prompt_strategy, self.model_name)
+        if not record or not record.get("test_code"):
+            return None
+        if record["fingerprint"] != function_fingerprint(function_code, language):
+            return None
+        metrics.increment("fingerprint_reuse")
+        self.logger.info(f"{file_path}::{function_name} unchanged since its last test was generated; reusing it")
+        return record["test_code"]
+
+    def _remember_fingerprint(self, file_path: str, function_name: str, function_code: str, language: str,
+                              prompt_strategy: str, test_code: str):
+        self.memory.store_function_fingerprint(
+            file_path=file_path,
+            function_name=function_name,
+            prompt_strategy=prompt_strategy,
+            model_name=self.model_name,
+            fingerprint=function_fingerprint(function_code, language),
+            language=language,
+            test_code=test_code,
+        )
+
     def compare_prompt_strategies(
         self, diff_file_path: str, output_dir: str = "prompt_comparison"
     ) -> Dict[str, Any]:
@@ -513,7 +854,7 @@ Provide specific, actionable suggestions for improving test coverage, readabilit
 
     def _process_enhanced_context(self, pr_data_path: str, strategy: str) -> None:
         try:
-            enhanced_context = EnhancedContextLoader(pr_data_path)
+            enhanced_context = self._get_context_loader(pr_data_path)
             source_files = enhanced_context.get_source_files()
             
             if not source_files:
@@ -615,7 +956,11 @@ This is automatically generated fallback documentation. Please review and enhanc
         enhanced_context: EnhancedContextLoader
     ) -> str:
         try:
-            context_data = enhanced_context.get_full_context_for_prompt(file_path)
+            context_data = enhanced_context.get_full_context_for_prompt(
+                file_path,
+                function_code=function_code,
+                sections=EnhancedContextLoader.PROMPT_SECTIONS
+            )
             
             logging.info(f"Context data keys: {list(context_data.keys())}")
             logging.info(f"Function code length: {len(function_code)}")
@@ -660,7 +1005,10 @@ This is automatically generated fallback documentation. Please review and enhanc
             logging.info(f"Generated prompt length: {len(prompt)}")
             
             if hasattr(self.llm, 'generate'):
-                test_code = self.llm.generate([{"role": "user", "content": prompt}], max_new_tokens=3072, max_retries=3)
+                test_code = self.llm.generate(
+                    [{"role": "user", "content": prompt}], max_new_tokens=3072, max_retries=3,
+                    **code_language_kwargs(self.llm.generate, language)
+                )
             else:
                 logging.error("LLM does not have generate method")
                 return ""
@@ -673,7 +1021,9 @@ This is automatically generated fallback documentation. Please review and enhanc
             
             logging.info(f"Generated test code length: {len(test_code)}")
             
-            test_code = self._clean_and_validate_test(test_code, language)
+            test_code = self._clean_and_validate_test(
+                test_code, language, constrained=getattr(self.llm, "last_output_constrained", False)
+            )
             
             if not self._is_test_valid(test_code, language):
                 error_msg = self._get_syntax_error(test_code, language)
@@ -720,14 +1070,17 @@ GENERATE THE COMPLETE TEST FILE NOW - NO EXCUSES, NO EXPLANATIONS, ONLY COMPLETE
                         try:
                             generated_test = self.llm.generate(
                                 [{"role": "user", "content": strict_prompt}],
-                                max_new_tokens=3072
+                                max_new_tokens=3072,
+                                **code_language_kwargs(self.llm.generate, language)
                             )
                             
                             # DISABLED: Save raw retry output to prevent nested directories
                             # self._save_raw_test_file(file_path, language, generated_test, strategy, enhanced_context, suffix=f"-repair{attempt}-raw")
                             
                             # Clean and validate the retry
-                            cleaned_test = self._clean_and_validate_test(generated_test, language)
+                            cleaned_test = self._clean_and_validate_test(
+                                generated_test, language, constrained=getattr(self.llm, "last_output_constrained", False)
+                            )
                             
                             if cleaned_test and self._is_test_valid(cleaned_test, language):
                                 logging.info(f"Retry {attempt + 1} successful - generated valid test code")
@@ -748,14 +1101,17 @@ GENERATE THE COMPLETE TEST FILE NOW - NO EXCUSES, NO EXPLANATIONS, ONLY COMPLETE
                         try:
                             generated_test = self.llm.generate(
                                 [{"role": "user", "content": prompt}],
-                                max_new_tokens=3072
+                                max_new_tokens=3072,
+                                **code_language_kwargs(self.llm.generate, language)
                             )
                             
                             # DISABLED: Save raw output to prevent nested directories
                             # self._save_raw_test_file(file_path, language, generated_test, strategy, enhanced_context, suffix="-raw")
                             
                             # Clean and validate
-                            cleaned_test = self._clean_and_validate_test(generated_test, language)
+                            cleaned_test = self._clean_and_validate_test(
+                                generated_test, language, constrained=getattr(self.llm, "last_output_constrained", False)
+                            )
                             
                             if cleaned_test and self._is_test_valid(cleaned_test, language):
                                 logging.info(f"First attempt successful - generated valid test code")
@@ -780,7 +1136,7 @@ GENERATE THE COMPLETE TEST FILE NOW - NO EXCUSES, NO EXPLANATIONS, ONLY COMPLETE
             logging.error(f"Error generating test with {strategy} strategy: {e}")
             return ""
     
-    def _save_test_file(self, file_path: str, language: str, test_code: str, strategy: str, enhanced_context: EnhancedContextLoader) -> None:
+    def _save_test_file(self, file_path: str, language: str, test_code: str, strategy: str, enhanced_context: EnhancedContextLoader) -> Optional[str]:
         try:
             # Validate strategy parameter - only allow valid strategy names
             valid_strategies = ["naive", "few-shot", "cot", "diff-aware"]
@@ -814,11 +1170,15 @@ GENERATE THE COMPLETE TEST FILE NOW - NO EXCUSES, NO EXPLANATIONS, ONLY COMPLETE
             
             with open(test_file_path, 'w', encoding='utf-8') as f:
                 f.write(test_code)
+            # A new test file on disk can change the repository's test patterns
+            enhanced_context.invalidate_cache("existing_test_patterns", language)
             
             logging.info(f"Saved test file: {test_file_path}")
+            return str(test_file_path)
             
         except Exception as e:
             logging.error(f"Error saving test file: {e}")
+        return None
 
     def _save_raw_test_file(self, file_path: str, language: str, test_code: str, strategy: str, enhanced_context: EnhancedContextLoader, suffix: str = "-raw") -> None:
         try:
@@ -883,25 +1243,32 @@ GENERATE THE COMPLETE TEST FILE NOW - NO EXCUSES, NO EXPLANATIONS, ONLY COMPLETE
         except Exception as e:
             logging.error(f"Error saving documentation file: {e}")
 
-    def _clean_and_validate_test(self, generated_text: str, language: str) -> str:
-        """Clean and validate generated test code to ensure it's complete and error-free"""
+    def _clean_and_validate_test(self, generated_text: str, language: str, constrained: bool = False) -> str:
+        """Clean and validate generated test code to ensure it's complete and error-free.
+
+        Output from constrained decoding is already bare code, so only the
+        structure and syntax checks run for it.
+        """
         if not generated_text or not generated_text.strip():
             return ""
         
-        # Step 1: Remove all markdown formatting and backticks
-        cleaned = self._strip_fenced_code_blocks(generated_text)
-        
-        # Step 2: Remove all English text, comments, and explanations
-        cleaned = self._strip_comments_and_prose(cleaned)
-        
-        # Step 3: Remove any remaining unwanted patterns
-        cleaned = self._remove_unwanted_patterns(cleaned)
+        cleaned = generated_text
+        if not constrained:
+            # Step 1: Remove all markdown formatting and backticks
+            cleaned = self._strip_fenced_code_blocks(cleaned)
+            
+            # Step 2: Remove all English text, comments, and explanations
+            cleaned = self._strip_comments_and_prose(cleaned)
+            
+            # Step 3: Remove any remaining unwanted patterns
+            cleaned = self._remove_unwanted_patterns(cleaned)
         
         # Step 4: Ensure proper file structure
         cleaned = self._ensure_complete_file_structure(cleaned, language)
         
-        # Step 5: Final cleanup - remove any remaining backticks or markdown
-        cleaned = cleaned.replace('```', '').replace('`', '')
+        if not constrained:
+            # Step 5: Final cleanup - remove any remaining backticks or markdown
+            cleaned = cleaned.replace('```', '').replace('`', '')
         
         # Step 6: Validate syntax
         if language == "python":
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from typing import Callable, Iterable, List, Optional, Sequence, Union
+
+import requests
+
+from .resilience import CircuitBreaker, CircuitOpenError
+
+
+class OllamaEndpoint:
+    """One Ollama server and its routing state"""
+
+    def __init__(self, url: str, breaker: CircuitBreaker):
+        self.url = url.rstrip("/")
+        self.breaker = breaker
+        self.healthy = False
+        self.outstanding = 0
+        self.models: List[str] = []
+        self.last_checked: Optional[float] = None
+        self.completed = 0
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and not self.breaker.is_open
+
+    def __repr__(self) -> str:
+        return f"OllamaEndpoint({self.url}, healthy={self.healthy}, outstanding={self.outstanding})"
+
+
+class OllamaEndpointPool:
+    """Routes requests across several Ollama servers by least outstanding requests.
+
+    Endpoints are health-checked through ``/api/tags``. An endpoint that fails
+    a health check or drops a connection is drained (no new requests) until a
+    later re-check, done lazily at most every ``health_interval`` seconds,
+    finds it healthy again. Repeated request failures on a healthy-looking
+    endpoint trip its own circuit breaker. The pool is thread-safe so
+    concurrent callers spread across nodes.
+    """
+
+    def __init__(self, urls: Union[str, Sequence[str]], health_interval: float = 30.0,
+                 health_timeout: float = 5.0, failure_threshold: int = 5, recovery_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.endpoints = [
+            OllamaEndpoint(url, CircuitBreaker(url, failure_threshold, recovery_timeout, clock=clock))
+            for url in self.parse_urls(urls)
+        ]
+        if not self.endpoints:
+            raise ValueError("At least one Ollama endpoint is required")
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+
+    @staticmethod
+    def parse_urls(urls: Union[str, Sequence[str]]) -> List[str]:
+        """Accept a list or a comma/whitespace separated string such as ``OLLAMA_URL``"""
+        if isinstance(urls, str):
+            urls = urls.replace(",", " ").split()
+        seen = []
+        for url in urls:
+            url = url.strip().rstrip("/")
+            if url and url not in seen:
+                seen.append(url)
+        return seen
+
+    def check_health(self, endpoint: OllamaEndpoint) -> bool:
+        try:
+            response = requests.get(f"{endpoint.url}/api/tags", timeout=self.health_timeout)
+            healthy = response.status_code == 200
+            if healthy:
+                endpoint.models = [m.get("name", "unknown") for m in response.json().get("models", [])]
+        except Exception as e:
+            logging.debug(f"Health check failed for {endpoint.url}: {e}")
+            healthy = False
+        with self._lock:
+            if healthy and not endpoint.healthy:
+                logging.info(f"Ollama endpoint {endpoint.url} is healthy")
+            elif not healthy and (endpoint.healthy or endpoint.last_checked is None):
+                logging.warning(f"Ollama endpoint {endpoint.url} failed its health check and is drained")
+            endpoint.healthy = healthy
+            endpoint.last_checked = self.clock()
+        return healthy
+
+    def check_all(self) -> List[OllamaEndpoint]:
+        """Health-check every endpoint and return the healthy ones"""
+        return [endpoint for endpoint in self.endpoints if self.check_health(endpoint)]
+
+    def _recheck_drained(self):
+        now = self.clock()
+        with self._lock:
+            due = [
+                endpoint for endpoint in self.endpoints
+                if not endpoint.healthy
+                and (endpoint.last_checked is None or now - endpoint.last_checked >= self.health_interval)
+            ]
+            for endpoint in due:
+                # Claim the re-check so concurrent callers don't probe the same node
+                endpoint.last_checked = now
+        for endpoint in due:
+            self.check_health(endpoint)
+
+    def acquire(self, exclude: Iterable[OllamaEndpoint] = ()) -> OllamaEndpoint:
+        """Reserve the available endpoint with the fewest in-flight requests.
+
+        Endpoints in ``exclude`` are only used when nothing else is available.
+        Raises ``CircuitOpenError`` when every endpoint is drained or open.
+        """
+        self._recheck_drained()
+        excluded = set(id(endpoint) for endpoint in exclude)
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.available and id(e) not in excluded]
+            if not candidates:
+                candidates = [e for e in self.endpoints if e.available]
+            # Rotate the starting point so ties spread across nodes
+            start = self._next % len(self.endpoints)
+            self._next += 1
+            candidates.sort(key=lambda e: (e.outstanding, (self.endpoints.index(e) - start) % len(self.endpoints)))
+            for endpoint in candidates:
+                try:
+                    endpoint.breaker.before_request()
+                except CircuitOpenError:
+                    continue
+                endpoint.outstanding += 1
+                return endpoint
+        raise CircuitOpenError(
+            "No healthy Ollama endpoints: " + ", ".join(f"{e.url} ({'open' if e.breaker.is_open else 'drained'})"
+                                                        for e in self.endpoints)
+        )
+
+    def release(self, endpoint: OllamaEndpoint, success: bool, drain: bool = False):
+        """Return an endpoint after a request; ``drain`` takes it out of rotation until re-checked"""
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            if success:
+                endpoint.completed += 1
+            if drain and endpoint.healthy:
+                logging.warning(f"Draining Ollama endpoint {endpoint.url}")
+                endpoint.healthy = False
+                endpoint.last_checked = self.clock()
+        if success:
+            endpoint.breaker.record_success()
+        else:
+            endpoint.breaker.record_failure()
+
+    def status(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    "url": e.url,
+                    "healthy": e.healthy,
+                    "circuit": e.breaker.state,
+                    "outstanding": e.outstanding,
+                    "completed": e.completed,
+                }
+                for e in self.endpoints
+            ]
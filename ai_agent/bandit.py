@@ -0,0 +1,107 @@
+import math
+import os
+import random
+import re
+from typing import Dict, List, Optional, Sequence
+
+STRATEGIES = ["naive", "diff-aware", "few-shot", "cot"]
+ADAPTIVE = "adaptive"
+ALGORITHMS = ("thompson", "ucb")
+
+# Generation faster than this is clamped so near-instant runs (cache hits, stubs) don't dominate
+MIN_SECONDS = 0.1
+
+
+def function_type(function_code: str, language: str) -> str:
+    """Coarse kind of a function, the second half of the bandit context"""
+    lines = [line.strip() for line in (function_code or "").split("\n") if line.strip()]
+    header = next((line for line in lines if not line.startswith("@")), "")
+    language = (language or "").lower()
+    if re.match(r"(?:export\s+)?(?:abstract\s+|public\s+|final\s+)*(?:class|struct|interface|impl)\b", header):
+        return "class"
+    if re.search(r"\basync\b", header):
+        return "async"
+    if language in ("python", "py") and re.search(r"\(\s*(?:self|cls)\b", header):
+        return "method"
+    if language == "go" and re.match(r"func\s*\(", header):
+        return "method"
+    if re.search(r"&?\bself\b", header) and language == "rust":
+        return "method"
+    return "function"
+
+
+def quality_per_second(quality: float, seconds: float) -> float:
+    return max(quality, 0.0) / max(seconds, MIN_SECONDS)
+
+
+class StrategyBandit:
+    """Online choice of a prompt strategy per (language, function type).
+
+    Each strategy is an arm. Its reward is the generated test's quality
+    divided by the seconds spent generating it. The running
+    mean and variance of those rewards are kept in MemoryModule, so the
+    choice improves across runs. Arms that were never tried are played
+    first. After that, Thompson sampling draws from a normal posterior
+    of each arm's mean reward, while UCB1 adds an exploration bonus
+    to the normalized mean.
+    """
+
+    def __init__(self, memory, strategies: Optional[Sequence[str]] = None, algorithm: Optional[str] = None,
+                 exploration: float = 1.0, seed: Optional[int] = None):
+        self.memory = memory
+        self.strategies = list(strategies or STRATEGIES)
+        self.algorithm = (algorithm or os.environ.get("AI_AGENT_BANDIT", "thompson")).lower()
+        if self.algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown bandit algorithm '{self.algorithm}', expected one of {ALGORITHMS}")
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+
+    @staticmethod
+    def context_key(language: str, kind: str) -> str:
+        return f"{(language or 'unknown').lower()}:{kind}"
+
+    def choose(self, language: str, kind: str) -> str:
+        stats = self.memory.get_strategy_stats(self.context_key(language, kind))
+        untried = [s for s in self.strategies if not stats.get(s, {}).get("count")]
+        if untried:
+            return self.rng.choice(untried)
+        if self.algorithm == "ucb":
+            return self._ucb(stats)
+        return self._thompson(stats)
+
+    def record(self, strategy: str, language: str, kind: str, quality: float, seconds: float) -> float:
+        """Feed one outcome back; returns the reward that was recorded"""
+        reward = quality_per_second(quality, seconds)
+        self.memory.record_strategy_outcome(self.context_key(language, kind), strategy, reward, quality, seconds)
+        return reward
+
+    def _thompson(self, stats: Dict[str, Dict[str, float]]) -> str:
+        arms = [stats[s] for s in self.strategies]
+        # Arms seen once borrow the pooled variance of the context
+        pooled = [a["m2"] / (a["count"] - 1) for a in arms if a["count"] > 1]
+        prior_var = sum(pooled) / len(pooled) if pooled else max(a["mean"] for a in arms) ** 2 or 1.0
+        samples = []
+        for strategy, arm in zip(self.strategies, arms):
+            var = arm["m2"] / (arm["count"] - 1) if arm["count"] > 1 else prior_var
+            samples.append((self.rng.gauss(arm["mean"], math.sqrt(var / arm["count"])), strategy))
+        return max(samples)[1]
+
+    def _ucb(self, stats: Dict[str, Dict[str, float]]) -> str:
+        arms = [stats[s] for s in self.strategies]
+        total = sum(a["count"] for a in arms)
+        # UCB1 assumes rewards in [0, 1]; quality per second is unbounded
+        scale = max(a["mean"] for a in arms) or 1.0
+        bounds = [
+            (a["mean"] / scale + self.exploration * math.sqrt(2 * math.log(total) / a["count"]), strategy)
+            for strategy, a in zip(self.strategies, arms)
+        ]
+        return max(bounds)[1]
+
+    def summary(self) -> Dict[str, List[Dict[str, float]]]:
+        """Per context, strategies ordered by mean reward"""
+        result = {}
+        for context, arms in self.memory.get_all_strategy_stats().items():
+            result[context] = sorted(
+                ({"strategy": s, **a} for s, a in arms.items()), key=lambda a: a["mean"], reverse=True
+            )
+        return result
@@ -0,0 +1,118 @@
+import ast
+import importlib.util
+import re
+import sys
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Set, Tuple
+
+# Assertion styles across the supported test frameworks
+_ASSERTION = re.compile(
+    r"\bassert\w*\s*[\(!]|\bassert\b|\bexpect\s*\(|\bEXPECT_\w+\s*\(|\bASSERT_\w+\s*\(|\bt\.(?:Error|Fatal|Fail)\w*\s*\("
+    r"|\brequire\.\w+\s*\(|\bshould\w*\s*\(|\bverify\s*\(|\btoBe\w*\s*\(|\btoEqual\s*\(|\bassertThat\s*\("
+)
+_TEST_DEFINITION = re.compile(
+    r"^\s*(?:async\s+)?def\s+test\w*\s*\(|@Test\b|^\s*func\s+Test\w+\s*\(|\b(?:it|test)\s*\(\s*['\"`]"
+    r"|^\s*TEST(?:_F|_P)?\s*\(",
+    re.MULTILINE,
+)
+_BRACKETS = {")": "(", "]": "[", "}": "{"}
+
+
+class CandidateScore(NamedTuple):
+    syntax_ok: bool
+    import_ratio: float
+    assertions: int
+    tests: int
+    assertion_density: float
+    score: float
+
+
+@lru_cache(maxsize=1024)
+def _module_available(name: str) -> bool:
+    if name in sys.builtin_module_names:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def _python_imports(tree: ast.AST) -> List[str]:
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module.split(".")[0])
+    return modules
+
+
+def _brackets_balanced(code: str) -> bool:
+    # Cheap stand-in for a parser: strings and line comments are skipped
+    stack = []
+    code = re.sub(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*', "", code)
+    for char in code:
+        if char in "([{":
+            stack.append(char)
+        elif char in _BRACKETS:
+            if not stack or stack.pop() != _BRACKETS[char]:
+                return False
+    return not stack
+
+
+def score_candidate(code: str, language: str, local_modules: Optional[Set[str]] = None) -> CandidateScore:
+    """Static quality signals for one generated test file, cheapest checks only (no execution).
+
+    * syntax: Python is parsed; other languages get a bracket-balance check
+    * import resolvability (Python): share of imported top-level modules that
+      are installed or belong to the project under test (``local_modules``)
+    * assertion density: assertions per test function, saturating at 3
+    """
+    code = code or ""
+    language = (language or "").lower()
+    local_modules = local_modules or set()
+    import_ratio = 1.0
+    if language in ("python", "py"):
+        try:
+            tree = ast.parse(code)
+            syntax_ok = True
+        except (SyntaxError, ValueError):
+            tree, syntax_ok = None, False
+        if tree is not None:
+            modules = _python_imports(tree)
+            if modules:
+                resolved = sum(1 for m in modules if m in local_modules or _module_available(m))
+                import_ratio = resolved / len(modules)
+    else:
+        syntax_ok = bool(code.strip()) and _brackets_balanced(code)
+
+    assertions = len(_ASSERTION.findall(code))
+    tests = len(_TEST_DEFINITION.findall(code))
+    density = assertions / max(tests, 1)
+    if not syntax_ok or not tests:
+        # Unusable as a test file; assertions only break ties between broken candidates
+        score = 0.1 * min(density / 3, 1.0)
+    else:
+        score = 0.4 + 0.3 * import_ratio + 0.3 * min(density / 3, 1.0)
+    return CandidateScore(syntax_ok, import_ratio, assertions, tests, density, round(score, 4))
+
+
+def rank_candidates(candidates: Iterable[str], language: str,
+                    local_modules: Optional[Set[str]] = None) -> List[Tuple[CandidateScore, str]]:
+    """Candidates best first; ties keep generation order"""
+    scored = [(score_candidate(code, language, local_modules), index, code) for index, code in enumerate(candidates)]
+    scored.sort(key=lambda item: (-item[0].score, item[1]))
+    return [(score, code) for score, _, code in scored]
+
+
+def local_modules_for(source_files: Iterable[str]) -> Set[str]:
+    """Top-level Python module names a PR's source files can be imported as"""
+    modules = set()
+    for path in source_files:
+        if path.endswith(".py"):
+            parts = path.replace("\\", "/").split("/")
+            # src/ layouts import from below src
+            if parts[0] == "src" and len(parts) > 1:
+                parts = parts[1:]
+            modules.add(parts[0][:-3] if len(parts) == 1 else parts[0])
+    return modules
@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+VALID_STRATEGIES = ["naive", "diff-aware", "few-shot", "cot", "adaptive"]
+
+
+def pr_info_for(pr_dir: Path) -> Dict[str, Any]:
+    """The PR record ``process_diff_files`` works on, for a ``<repo>/<PR>`` directory"""
+    pr_dir = Path(pr_dir)
+    repo_name, pr_id = pr_dir.parent.name, pr_dir.name
+    return {
+        'repo': repo_name,
+        'pr': pr_id,
+        'path': pr_dir,
+        'diff_file': pr_dir / "diff.patch",
+        'full_name': f"{repo_name}/PR_{pr_id}",
+    }
+
+
+def load_manifest(manifest_path: str, default_strategies: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """PRs and strategies to run from a manifest file.
+
+    JSON manifests look like ``{"strategies": [...], "prs": [...]}``, where each
+    PR is a directory path or ``{"path": ..., "strategies": [...]}``. A plain
+    text manifest has one PR directory per line, optionally followed by a
+    comma-separated list of strategies. Blank lines and ``#`` comments are
+    ignored. Relative paths resolve against the manifest's directory.
+    """
+    path = Path(manifest_path)
+    base = path.parent
+    text = path.read_text(encoding="utf-8")
+    default_strategies = list(default_strategies or ["diff-aware"])
+
+    entries: List[Tuple[str, Optional[List[str]]]] = []
+    if path.suffix == ".json" or text.lstrip().startswith(("{", "[")):
+        data = json.loads(text)
+        if isinstance(data, list):
+            data = {"prs": data}
+        default_strategies = list(data.get("strategies") or default_strategies)
+        for item in data.get("prs", []):
+            if isinstance(item, str):
+                entries.append((item, None))
+            else:
+                entries.append((item["path"], item.get("strategies")))
+    else:
+        for line in text.splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            pr_path, _, strategies = line.replace("\t", " ").partition(" ")
+            strategies = [s.strip() for s in strategies.replace(" ", ",").split(",") if s.strip()]
+            entries.append((pr_path, strategies or None))
+
+    prs = []
+    for pr_path, strategies in entries:
+        pr_dir = Path(pr_path) if Path(pr_path).is_absolute() else base / pr_path
+        strategies = list(strategies or default_strategies)
+        unknown = [s for s in strategies if s not in VALID_STRATEGIES]
+        if unknown:
+            raise ValueError(f"{manifest_path}: unknown strategies {unknown} for {pr_path}")
+        info = pr_info_for(pr_dir)
+        info['strategies'] = strategies
+        prs.append(info)
+    return prs
+
+
+class CheckpointJournal:
+    """Append-only JSONL record of finished PR × strategy × model runs.
+
+    Each run appends one line as soon as it finishes, flushed and
+    fsynced, so a crash loses at most the run in progress. On load, the
+    latest record for each (PR, strategy, model) wins. A torn final line
+    from a crash mid-write is ignored. Only "done" runs are complete;
+    "partial" (some functions failed or were skipped) and "failed" runs
+    are redone on resume.
+    """
+
+    def __init__(self, path: str, resume: bool = True):
+        self.path = path
+        self.records: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        # After a torn write the next record must start on a fresh line
+        self._needs_newline = False
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+            self._needs_newline = bool(content) and not content.endswith("\n")
+            # Without resume the journal is only appended to, so every run stays on record
+            for line_number, line in enumerate(content.splitlines() if resume else [], 1):
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                        self.records[(record["pr"], record["strategy"], record.get("model", ""))] = record
+                    except (ValueError, KeyError):
+                        logging.warning(f"Ignoring unreadable checkpoint line {line_number} in {path}")
+
+    def is_done(self, pr_name: str, strategy: str, model: str = "") -> bool:
+        return self.records.get((pr_name, strategy, model), {}).get("status") == "done"
+
+    def record(self, pr_name: str, strategy: str, status: str, attempts: int = 1, model: str = "", **details):
+        record = {
+            "pr": pr_name,
+            "strategy": strategy,
+            "model": model,
+            "status": status,
+            "attempts": attempts,
+            **details,
+            "finished_at": datetime.now().isoformat(),
+        }
+        self.records[(pr_name, strategy, model)] = record
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(("\n" if self._needs_newline else "") + json.dumps(record, default=str) + "\n")
+            self._needs_newline = False
+            f.flush()
+            os.fsync(f.fileno())
+
+    def summary(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for record in self.records.values():
+            counts[record["status"]] = counts.get(record["status"], 0) + 1
+        return counts
@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional
+
+import regex
+import torch
+
+# What a top-level (unindented, outside brackets and strings) line may start with.
+# Prose such as "Here is the test" fails because an identifier must be followed
+# by an operator or call, and fences are impossible because backticks are banned.
+_PYTHON_LINE = (
+    r"(?:import|from|def|class|async\s+def|if\s+__name__|try|except|finally|with|pytestmark)\b.*"
+    r"|@.*|#.*|[)\]}].*|\"\"\".*|'''.*"
+    r"|[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*(?:\[[^\]\n]*\])*\s*(?:=|\+=|-=|\().*"
+)
+
+_C_FAMILY_LINE = (
+    r"(?:import|package|public|private|protected|class|interface|enum|final|abstract|static|"
+    r"func|type|var|const|let|export|function|async|describe|it|test|beforeEach|afterEach|"
+    r"beforeAll|afterAll|module|require|namespace|using|template|struct|typedef|extern|int|void|"
+    r"bool|auto|char|double|float|long|unsigned|std|TEST|TEST_F|TEST_P)\b.*"
+    r"|@.*|#(?:include|define|pragma|if|ifdef|ifndef|endif|else|undef)\b.*|//.*|/\*.*|\*.*|[)\]};].*"
+    r"|[A-Za-z_]\w*(?:(?:\.|::)[A-Za-z_]\w*)*(?:<[^>\n]*>)?\s*(?:=|\(|\{).*"
+)
+
+_LINE_PATTERNS = {
+    "python": _PYTHON_LINE,
+}
+
+_PYTHON_ALIASES = {"python", "py"}
+
+
+class TokenVocabulary:
+    """Decoded text of every token, built once per tokenizer.
+
+    Tokens are decoded after an anchor token so leading spaces survive for both
+    SentencePiece ("▁def") and byte-level BPE ("Ġdef") vocabularies.
+    """
+
+    def __init__(self, tokenizer):
+        anchor = tokenizer.encode("a", add_special_tokens=False)[-1:]
+        anchor_text = tokenizer.decode(anchor)
+        self.texts: List[str] = []
+        for token_id in range(len(tokenizer)):
+            text = tokenizer.decode(anchor + [token_id])
+            self.texts.append(text[len(anchor_text):] if text.startswith(anchor_text) else text)
+        self.banned_ids = torch.tensor(
+            [token_id for token_id, text in enumerate(self.texts) if "`" in text], dtype=torch.long
+        )
+        eos = tokenizer.eos_token_id
+        self.eos_ids = [eos] if isinstance(eos, int) else list(eos or [])
+
+
+class _LineState:
+    """Incremental view of the generated text: current line, bracket depth, open triple quote"""
+
+    def __init__(self, python: bool):
+        self.python = python
+        self.length = 0
+        self.line = ""
+        self.depth = 0
+        self.in_triple: Optional[str] = None
+        self.tail = ""
+
+    def feed(self, text: str):
+        for char in text:
+            self.tail = (self.tail + char)[-3:]
+            if self.python and self.tail in ('"""', "'''"):
+                if self.in_triple is None:
+                    self.in_triple = self.tail
+                elif self.in_triple == self.tail:
+                    self.in_triple = None
+                self.tail = ""
+            if self.in_triple is None:
+                if char in "([{":
+                    self.depth += 1
+                elif char in ")]}":
+                    self.depth = max(0, self.depth - 1)
+            self.line = "" if char == "\n" else self.line + char
+
+
+class CodeOnlyLogitsProcessor:
+    """Logits processor that keeps local generation to bare source code.
+
+    Backtick tokens are always banned, so markdown fences cannot start. At
+    the start of every top-level line (including the very first one) only
+    tokens that keep the line a viable prefix of a code line for the
+    language are allowed, which rules out preambles like "Sure, here is" and
+    trailing explanations. Indented lines, bracketed continuations and
+    docstrings are left alone. EOS is always allowed.
+    """
+
+    def __init__(self, vocabulary: TokenVocabulary, language: str, prompt_length: int, top_k: int = 64):
+        self.vocabulary = vocabulary
+        self.python = (language or "").lower() in _PYTHON_ALIASES
+        line_pattern = _LINE_PATTERNS.get("python" if self.python else "", _C_FAMILY_LINE)
+        self.line_pattern = regex.compile(f"(?:{line_pattern})")
+        self.prompt_length = prompt_length
+        self.top_k = top_k
+        self.blocked_tokens = 0
+        self._states: Dict[int, _LineState] = {}
+
+    def _state_for(self, row: int, input_ids) -> _LineState:
+        length = input_ids.shape[-1]
+        state = self._states.get(row)
+        if state is None or state.length > length:
+            # New sequence, or assisted decoding rolled back rejected draft tokens
+            state = _LineState(self.python)
+            state.length = self.prompt_length
+            self._states[row] = state
+        texts = self.vocabulary.texts
+        for token_id in input_ids[state.length:length].tolist():
+            if token_id < len(texts):
+                state.feed(texts[token_id])
+        state.length = length
+        return state
+
+    def _constrained(self, state: _LineState) -> bool:
+        if state.depth or state.in_triple or state.line[:1] in (" ", "\t"):
+            return False
+        # Once the line has committed to a code construct any continuation is fine
+        return not (state.line and self.line_pattern.fullmatch(state.line))
+
+    def _viable(self, line: str, token_text: str) -> bool:
+        if not line and token_text[:1] in (" ", "\t"):
+            return True
+        segment, newline, _ = token_text.partition("\n")
+        candidate = line + segment
+        if newline:
+            return candidate.strip() == "" or bool(self.line_pattern.fullmatch(candidate))
+        return bool(self.line_pattern.fullmatch(candidate, partial=True))
+
+    def __call__(self, input_ids, scores):
+        banned = self.vocabulary.banned_ids.to(scores.device)
+        if banned.numel():
+            self.blocked_tokens += int(torch.isin(scores.argmax(dim=-1), banned).sum())
+            scores[:, banned] = float("-inf")
+
+        for row in range(scores.shape[0]):
+            state = self._state_for(row, input_ids[row])
+            if not self._constrained(state):
+                continue
+
+            # Only the most likely candidates are checked; widen once if none is viable
+            allowed = []
+            for k in (self.top_k, 16 * self.top_k):
+                top = torch.topk(scores[row], min(k, scores.shape[-1])).indices.tolist()
+                allowed = [token_id for token_id in top
+                           if token_id < len(self.vocabulary.texts)
+                           and self._viable(state.line, self.vocabulary.texts[token_id])]
+                if allowed:
+                    break
+            if top and top[0] not in allowed:
+                self.blocked_tokens += 1
+            allowed.extend(self.vocabulary.eos_ids)
+
+            mask = torch.full_like(scores[row], float("-inf"))
+            index = torch.tensor(allowed, dtype=torch.long, device=scores.device)
+            mask[index] = scores[row, index]
+            scores[row] = mask
+        return scores
+
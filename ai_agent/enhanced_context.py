@@ -1,11 +1,24 @@
+import copy
 import os
 import json
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Iterable
 from pathlib import Path
 import logging
 
+from .relevance import RelevanceScorer
+from .symbol_index import SymbolIndex
+from .metrics import metrics
+
 class EnhancedContextLoader:
     """Loads enhanced context data from the new extraction format"""
+
+    # Sections read by the prompt templates; prompt builders request only these
+    PROMPT_SECTIONS = (
+        'pr_title', 'language', 'imports', 'full_content', 'patch', 'file_patch',
+        'diff_patch', 'context_summary', 'test_patterns', 'test_frameworks', 'related_files'
+    )
+    DEFAULT_TOP_K = 5
+    SNIPPET_CHARS = 4000
     
     def __init__(self, pr_data_path: str):
         self.pr_data_path = Path(pr_data_path)
@@ -16,6 +29,8 @@ class EnhancedContextLoader:
         self.pr_metadata = {}
         self.file_list = []
         self.diff_patch = ""
+        # PR-level derived context, keyed by (section, language)
+        self._derived_cache: Dict[Tuple[str, Optional[str]], Any] = {}
         
         self._load_all_context()
     
@@ -67,6 +82,31 @@ class EnhancedContextLoader:
         except Exception as e:
             print(f"Error loading enhanced context: {e}")
     
+    def invalidate_cache(self, section: Optional[str] = None, language: Optional[str] = None):
+        """Drop memoized PR-level context so it is recomputed on next use.
+
+        With no arguments everything is dropped; ``section`` and ``language``
+        narrow the invalidation (e.g. after new test files land on disk).
+        """
+        for key in list(self._derived_cache):
+            cached_section, cached_language = key
+            if section is not None and cached_section != section:
+                continue
+            if language is not None and cached_language != language:
+                continue
+            del self._derived_cache[key]
+
+    def _memoized(self, section: str, language: Optional[str], compute):
+        key = (section, language)
+        if key not in self._derived_cache:
+            metrics.increment("context_cache_miss")
+            self._derived_cache[key] = compute()
+        else:
+            metrics.increment("context_cache_hit")
+        value = self._derived_cache[key]
+        # Callers get their own copy of plain data, so mutating a result cannot leak into later prompts
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+    
     def get_source_files(self) -> List[str]:
         """Get source files (non-test files that were changed)"""
         source_files = []
@@ -109,67 +149,112 @@ class EnhancedContextLoader:
         file_context = self.get_file_context(file_path)
         return file_context.get('imports', [])
     
-    def get_full_context_for_prompt(self, file_path: str) -> Dict[str, Any]:
-        """Get comprehensive context data for prompt generation"""
+    def get_symbol_index(self) -> SymbolIndex:
+        """Get the PR's symbol index (persisted under context/, memoized per loader)"""
+        return self._memoized("symbol_index", None, lambda: SymbolIndex.for_pr(self))
+    
+    def get_full_context_for_prompt(
+        self,
+        file_path: str,
+        function_code: str = "",
+        sections: Optional[Iterable[str]] = None,
+        top_k: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Get context data for prompt generation.
+
+        Only the requested ``sections`` are computed (all of them when omitted).
+        When ``function_code`` is given, related files and existing test patterns
+        are ranked by BM25 relevance against it and only the ``top_k`` best are kept.
+        """
         file_context = self.get_file_context(file_path)
         language = file_context.get('language', 'unknown')
-        
-        # Get repository structure and dependencies
-        repo_structure = self._get_repository_structure()
-        dependencies = self._get_dependencies_for_language(language)
-        related_files = self._get_related_files(file_path, language)
-        
-        # Get actual file contents and imports
-        actual_file_content = self._get_actual_file_content(file_path)
-        actual_imports = self._extract_actual_imports(actual_file_content, language)
-        
-        # PRIORITIZE imports from enhanced_patches.json over extracted imports
-        # This ensures we use the exact imports that were detected during the PR analysis
-        enhanced_imports = file_context.get('imports', [])
-        if enhanced_imports:
-            # Use the imports from enhanced_patches.json as they are more accurate
-            final_imports = enhanced_imports
-        else:
-            # Fallback to extracted imports if enhanced_patches.json doesn't have imports
-            final_imports = actual_imports
-        
-        # Get test framework information
-        test_frameworks = self._get_test_frameworks_for_language(language)
-        
-        # Get build and environment info
-        build_config = self._get_build_configuration()
-        environment_info = self._get_environment_info(language)
-        
-        # Get existing test patterns from the repository
-        test_patterns = self._get_existing_test_patterns(language)
-        
-        return {
-            'pr_title': self.get_pr_title(),
-            'pr_description': self.pr_metadata.get('description', ''),
-            'file_path': file_path,
-            'language': language,
-            'imports': final_imports,  # Use prioritized imports
+        if top_k is None:
+            top_k = self._default_top_k()
+        scorer = RelevanceScorer(function_code) if function_code else None
+
+        file_content_cache: List[str] = []
+
+        def actual_file_content() -> str:
+            if not file_content_cache:
+                file_content_cache.append(self._get_actual_file_content(file_path))
+            return file_content_cache[0]
+
+        def prioritized_imports() -> List[str]:
+            # PRIORITIZE imports from enhanced_patches.json over extracted imports
+            # This ensures we use the exact imports that were detected during the PR analysis
+            enhanced_imports = file_context.get('imports', [])
+            if enhanced_imports:
+                return enhanced_imports
+            return self._extract_actual_imports(actual_file_content(), language)
+
+        def related_files() -> List[str]:
+            related = self._get_related_files(file_path, language)
+            if scorer is None:
+                return related
+            candidates = [(name, self._get_snippet_text(name)) for name in related]
+            return scorer.rank(candidates, top_k)
+
+        def test_patterns() -> List[Dict[str, Any]]:
+            patterns = self._get_existing_test_patterns(language)
+            if scorer is None:
+                return patterns
+            candidates = [(pattern, pattern.get('content', '')) for pattern in patterns]
+            return scorer.rank(candidates, top_k)
+
+        builders = {
+            'pr_title': self.get_pr_title,
+            'pr_description': lambda: self.pr_metadata.get('description', ''),
+            'file_path': lambda: file_path,
+            'language': lambda: language,
+            'imports': prioritized_imports,
             'full_content': actual_file_content,
-            'patch': file_context.get('patch', ''),
-            'file_patch': file_context.get('file_patch', ''),
-            'diff_patch': self.diff_patch,
-            'context_summary': self.context_summary,
-            'all_file_patches': self.file_patches,
+            'patch': lambda: file_context.get('patch') or '',
+            'file_patch': lambda: file_context.get('file_patch') or '',
+            'diff_patch': lambda: self.diff_patch,
+            'context_summary': lambda: self.context_summary,
+            'all_file_patches': lambda: self.file_patches,
             'test_patterns': test_patterns,
-            'repository_structure': repo_structure,
-            'dependencies': dependencies,
+            'repository_structure': self._get_repository_structure,
+            'dependencies': lambda: self._get_dependencies_for_language(language),
             'related_files': related_files,
-            'test_frameworks': test_frameworks,
-            'build_config': build_config,
-            'environment_info': environment_info,
+            'test_frameworks': lambda: self._get_test_frameworks_for_language(language),
+            'build_config': self._get_build_configuration,
+            'environment_info': lambda: self._get_environment_info(language),
             'actual_file_content': actual_file_content,
-            'working_directory': self._get_working_directory(),
-            'package_manager': self._get_package_manager(language),
-            'test_command': self._get_test_command(language),
-            'import_paths': self._get_import_paths(file_path, language)
+            'working_directory': self._get_working_directory,
+            'package_manager': lambda: self._get_package_manager(language),
+            'test_command': lambda: self._get_test_command(language),
+            'import_paths': lambda: self._get_import_paths(file_path, language)
         }
+
+        wanted = builders.keys() if sections is None else [s for s in builders if s in set(sections)]
+        return {name: builders[name]() for name in wanted}
+
+    def _default_top_k(self) -> int:
+        """AI_AGENT_CONTEXT_TOP_K, or DEFAULT_TOP_K when it is unset or not an integer"""
+        value = os.environ.get("AI_AGENT_CONTEXT_TOP_K")
+        if not value:
+            return self.DEFAULT_TOP_K
+        try:
+            return max(0, int(value))
+        except ValueError:
+            logging.warning(f"Ignoring AI_AGENT_CONTEXT_TOP_K={value!r}: not an integer, using {self.DEFAULT_TOP_K}")
+            return self.DEFAULT_TOP_K
+
+    def _get_snippet_text(self, file_path: str) -> str:
+        """Text used to score a changed file's relevance (path, patch and leading content)"""
+        file_context = self.get_file_context(file_path)
+        return "\n".join([
+            file_path,
+            file_context.get('patch') or '',
+            (file_context.get('full_content') or '')[:self.SNIPPET_CHARS]
+        ])
     
     def _get_repository_structure(self) -> Dict[str, Any]:
+        """Memoized per loader; see invalidate_cache()"""
+        return self._memoized("repository_structure", None, self._compute_repository_structure)
+
+    def _compute_repository_structure(self) -> Dict[str, Any]:
         """Get repository structure information"""
         structure = {
             'root_files': [],
@@ -199,6 +284,10 @@ class EnhancedContextLoader:
         return structure
     
     def _get_dependencies_for_language(self, language: str) -> Dict[str, Any]:
+        """Memoized per loader and language; see invalidate_cache()"""
+        return self._memoized("dependencies_for_language", language, lambda: self._compute_dependencies_for_language(language))
+
+    def _compute_dependencies_for_language(self, language: str) -> Dict[str, Any]:
         """Get dependencies for a specific language"""
         dependencies = {
             'packages': [],
@@ -294,6 +383,10 @@ class EnhancedContextLoader:
         return LanguageDetector.get_test_frameworks_for_language(language)
     
     def _get_build_configuration(self) -> Dict[str, Any]:
+        """Memoized per loader; see invalidate_cache()"""
+        return self._memoized("build_configuration", None, self._compute_build_configuration)
+
+    def _compute_build_configuration(self) -> Dict[str, Any]:
         """Get build configuration information"""
         config = {
             'build_tools': [],
@@ -336,7 +429,7 @@ class EnhancedContextLoader:
             
             # Fallback to enhanced context
             file_context = self.get_file_context(file_path)
-            return file_context.get('full_content', '')
+            return file_context.get('full_content') or ''
         except Exception as e:
             logging.warning(f"Could not read actual file content for {file_path}: {e}")
             return ""
@@ -414,9 +507,15 @@ class EnhancedContextLoader:
         if not file_path:
             return []
         
+        import_paths = []
+        
+        # Module path resolved by the symbol index (e.g. package.module for Python)
+        module_path = self.get_symbol_index().module_for_file(file_path)
+        if module_path:
+            import_paths.append(module_path)
+        
         # Extract directory structure
         dir_parts = file_path.split('/')
-        import_paths = []
         
         # Build relative import paths
         for i in range(len(dir_parts) - 1):
@@ -431,6 +530,10 @@ class EnhancedContextLoader:
         return import_paths
 
     def _get_existing_test_patterns(self, language: str) -> List[Dict[str, Any]]:
+        """Memoized per loader and language; see invalidate_cache()"""
+        return self._memoized("existing_test_patterns", language, lambda: self._compute_existing_test_patterns(language))
+
+    def _compute_existing_test_patterns(self, language: str) -> List[Dict[str, Any]]:
         """Get existing test patterns for a specific language from the repository"""
         try:
             # Look for existing test files in the repository
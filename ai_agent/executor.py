@@ -0,0 +1,257 @@
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+
+from .metrics import metrics
+
+# Environment variables passed through to test subprocesses; everything else (API tokens included) is dropped
+_ENV_ALLOWLIST = ("PATH", "HOME", "LANG", "LC_ALL", "TMPDIR", "SYSTEMROOT")
+
+# Runs inside the sandbox: applies the resource limits, traces line coverage of the
+# PR sources under src/ and runs pytest on one file, then writes a JSON report.
+_RUNNER = r'''
+import dis, json, os, sys, threading, time
+config = json.loads(sys.argv[1])
+try:
+    import resource
+    cpu = config["cpu_seconds"]
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    if config["memory_bytes"]:
+        resource.setrlimit(resource.RLIMIT_AS, (config["memory_bytes"], config["memory_bytes"]))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (config["file_bytes"], config["file_bytes"]))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+except (ImportError, ValueError, OSError):
+    pass
+
+src = os.path.abspath(config["src"]) + os.sep
+sys.path[:0] = [config["src"], os.path.dirname(config["test"])]
+executed = {}
+
+def _local(frame, event, arg):
+    if event == "line":
+        executed[frame.f_code.co_filename].add(frame.f_lineno)
+    return _local
+
+def _global(frame, event, arg):
+    filename = frame.f_code.co_filename
+    if filename.startswith(src):
+        executed.setdefault(filename, set()).add(frame.f_lineno)
+        return _local
+    return None
+
+def _executable_lines(path):
+    with open(path, "rb") as f:
+        code = compile(f.read(), path, "exec")
+    lines, stack = set(), [code]
+    while stack:
+        co = stack.pop()
+        lines.update(line for _, line in dis.findlinestarts(co) if line)
+        stack.extend(c for c in co.co_consts if hasattr(c, "co_code"))
+    return lines
+
+counts = {"passed": 0, "failed": 0, "errors": 0, "skipped": 0}
+
+class Collector:
+    def pytest_runtest_logreport(self, report):
+        if report.failed:
+            counts["failed" if report.when == "call" else "errors"] += 1
+        elif report.skipped:
+            counts["skipped"] += 1
+        elif report.when == "call":
+            counts["passed"] += 1
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            counts["errors"] += 1
+
+import pytest
+started = time.perf_counter()
+threading.settrace(_global)
+sys.settrace(_global)
+try:
+    args = [config["test"], "-q", "-p", "no:cacheprovider"] + (["-x"] if config["fail_fast"] else [])
+    exit_code = int(pytest.main(args, plugins=[Collector()]))
+finally:
+    sys.settrace(None)
+    threading.settrace(None)
+duration = time.perf_counter() - started
+
+files = {}
+for path in sorted(executed):
+    # Only modules the test actually imported count towards its coverage
+    if not os.path.exists(path):
+        continue
+    try:
+        lines = _executable_lines(path)
+    except (SyntaxError, ValueError):
+        continue
+    if lines:
+        files[os.path.relpath(path, src)] = {"covered": len(lines & executed[path]), "lines": len(lines)}
+
+with open(config["report"], "w") as f:
+    json.dump({"exit_code": exit_code, "counts": counts, "duration_s": duration, "files": files}, f)
+'''
+
+# pytest exit codes: 0 all passed, 1 some failed, 2 interrupted, 3 internal error, 4 usage error, 5 no tests
+_STATUS_BY_EXIT_CODE = {0: "passed", 1: "failed", 5: "no_tests"}
+
+
+class TestExecutor:
+    """Runs generated Python tests with pytest in parallel, isolated subprocesses.
+
+    Each test file gets its own temporary directory holding a copy of the
+    PR sources (``src/``, put on ``sys.path``) and the test itself. It runs
+    in a fresh interpreter with a scrubbed environment, limits on CPU time,
+    address space and written file size, and a wall-clock timeout that kills
+    the whole process group. Results carry pass/fail counts, the runtime and
+    line coverage of the source modules the test imported. Coverage is
+    traced in-process with ``sys.settrace``, so ``coverage.py`` is not needed.
+    """
+
+    # Not a pytest test class, despite the name
+    __test__ = False
+
+    def __init__(self, max_workers: Optional[int] = None, timeout: float = 30.0, memory_mb: int = 1024,
+                 fail_fast: bool = False):
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.fail_fast = fail_fast
+
+    def _environment(self, sandbox: str) -> Dict[str, str]:
+        env = {key: os.environ[key] for key in _ENV_ALLOWLIST if key in os.environ}
+        env.update(HOME=sandbox, TMPDIR=sandbox, PYTHONDONTWRITEBYTECODE="1", PYTHONHASHSEED="0")
+        return env
+
+    def run_test(self, name: str, test_code: str, sources: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Run one test file (given as code) against ``sources`` ({relative path: content})"""
+        sandbox = tempfile.mkdtemp(prefix="ai_agent_exec_")
+        started = time.perf_counter()
+        try:
+            src_dir = os.path.join(sandbox, "src")
+            os.makedirs(src_dir)
+            for relative_path, content in (sources or {}).items():
+                target = os.path.normpath(os.path.join(src_dir, relative_path))
+                if not target.startswith(src_dir + os.sep):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "w", encoding="utf-8") as f:
+                    f.write(content)
+
+            test_dir = os.path.join(sandbox, "tests")
+            os.makedirs(test_dir)
+            test_path = os.path.join(test_dir, os.path.basename(name))
+            with open(test_path, "w", encoding="utf-8") as f:
+                f.write(test_code)
+            runner_path = os.path.join(sandbox, "_runner.py")
+            with open(runner_path, "w", encoding="utf-8") as f:
+                f.write(_RUNNER)
+
+            report_path = os.path.join(sandbox, "report.json")
+            config = {
+                "src": src_dir,
+                "test": test_path,
+                "report": report_path,
+                "cpu_seconds": max(1, int(self.timeout) + 1),
+                "memory_bytes": self.memory_mb * 1024 * 1024 if self.memory_mb else 0,
+                "file_bytes": 64 * 1024 * 1024,
+                "fail_fast": self.fail_fast,
+            }
+            process = subprocess.Popen(
+                [sys.executable, runner_path, json.dumps(config)],
+                cwd=sandbox, env=self._environment(sandbox), stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True,
+            )
+            try:
+                output, _ = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+                output, _ = process.communicate()
+                return self._result(name, "timeout", started, output=output)
+
+            if not os.path.exists(report_path):
+                # Killed by a resource limit or crashed before pytest finished
+                return self._result(name, "crashed", started, output=output, exit_code=process.returncode)
+            with open(report_path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+            status = _STATUS_BY_EXIT_CODE.get(report["exit_code"], "error")
+            return self._result(name, status, started, output=output, exit_code=report["exit_code"],
+                                counts=report["counts"], files=report["files"])
+        except Exception as e:
+            logging.error(f"Error executing {name}: {e}")
+            return self._result(name, "error", started, output=str(e).encode())
+        finally:
+            shutil.rmtree(sandbox, ignore_errors=True)
+
+    def _kill(self, process: subprocess.Popen):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, ProcessLookupError, PermissionError):
+            process.kill()
+
+    def _result(self, name: str, status: str, started: float, output: bytes = b"", exit_code: Optional[int] = None,
+                counts: Optional[Dict[str, int]] = None, files: Optional[Dict[str, Dict[str, int]]] = None
+                ) -> Dict[str, Any]:
+        counts = counts or {"passed": 0, "failed": 0, "errors": 0, "skipped": 0}
+        files = files or {}
+        lines = sum(f["lines"] for f in files.values())
+        covered = sum(f["covered"] for f in files.values())
+        executed = counts["passed"] + counts["failed"] + counts["errors"]
+        return {
+            "test": name,
+            "status": status,
+            "exit_code": exit_code,
+            **counts,
+            "pass_rate": counts["passed"] / executed if executed else 0.0,
+            "coverage": covered / lines if lines else 0.0,
+            "covered_lines": covered,
+            "total_lines": lines,
+            "files": files,
+            "duration_s": time.perf_counter() - started,
+            "output_tail": (output or b"").decode("utf-8", errors="replace")[-2000:],
+        }
+
+    def run_tests(self, tests: Dict[str, str], sources: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Run ``tests`` ({file name: code}) concurrently and return results keyed by file name"""
+        if not tests:
+            return {}
+
+        def run(item):
+            name, code = item
+            with metrics.span("test_execution", test=name) as span:
+                result = self.run_test(name, code, sources)
+                span.update(status=result["status"], passed=result["passed"], failed=result["failed"],
+                            coverage=round(result["coverage"], 4))
+            return name, result
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return dict(pool.map(run, tests.items()))
+
+    def run_files(self, paths: Iterable[str], sources: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+        tests = {}
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                tests[path] = f.read()
+        return self.run_tests(tests, sources)
+
+
+def summarize_results(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals over a set of executed test files"""
+    summary = {"files": len(results), "passed": 0, "failed": 0, "errors": 0, "skipped": 0,
+               "covered_lines": 0, "total_lines": 0, "statuses": {}}
+    for result in results.values():
+        for key in ("passed", "failed", "errors", "skipped", "covered_lines", "total_lines"):
+            summary[key] += result[key]
+        summary["statuses"][result["status"]] = summary["statuses"].get(result["status"], 0) + 1
+    executed = summary["passed"] + summary["failed"] + summary["errors"]
+    summary["pass_rate"] = summary["passed"] / executed if executed else 0.0
+    summary["coverage"] = summary["covered_lines"] / summary["total_lines"] if summary["total_lines"] else 0.0
+    return summary
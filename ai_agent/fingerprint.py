@@ -0,0 +1,96 @@
+import ast
+import hashlib
+import re
+import textwrap
+from functools import lru_cache
+
+FINGERPRINT_VERSION = 2
+
+# Short codes (enhanced_patches.json, file extensions) mapped to the names used below
+_LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python", "pyi": "python",
+    "js": "javascript", "jsx": "javascript", "mjs": "javascript", "cjs": "javascript", "node": "javascript",
+    "ts": "typescript", "tsx": "typescript",
+    "rb": "ruby", "pl": "perl", "sh": "bash", "shell": "bash", "zsh": "bash",
+    "ps1": "powershell", "yml": "yaml", "golang": "go", "rs": "rust", "kt": "kotlin",
+    "cs": "csharp", "c#": "csharp", "c++": "cpp", "cc": "cpp", "cxx": "cpp", "hpp": "cpp", "h": "c",
+}
+
+# Languages whose line comments start with '#'; C-style '//' and '/* */' are stripped for the rest
+_HASH_COMMENT_LANGUAGES = {"python", "ruby", "perl", "bash", "r", "powershell", "yaml", "php",
+                           "makefile", "cmake", "dockerfile"}
+_SLASH_COMMENT_FREE_LANGUAGES = {"python", "ruby", "perl", "bash", "r", "powershell", "yaml",
+                                 "makefile", "cmake", "dockerfile", "sql"}
+
+# String literals come first so comment markers inside strings are left alone
+_STRING = r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`'
+_TOKEN = r"[A-Za-z_$][\w$]*|\d[\w.]*|\S"
+
+
+@lru_cache(maxsize=None)
+def _token_pattern(language: str) -> "re.Pattern":
+    comments = []
+    if language not in _SLASH_COMMENT_FREE_LANGUAGES:
+        comments += [r"//[^\n]*", r"/\*[\s\S]*?\*/"]
+    if language in _HASH_COMMENT_LANGUAGES:
+        comments.append(r"#[^\n]*")
+    if language == "sql":
+        comments.append(r"--[^\n]*")
+    alternatives = [f"(?P<string>{_STRING})"]
+    if comments:
+        alternatives.append(f"(?P<comment>{'|'.join(comments)})")
+    alternatives.append(f"(?P<token>{_TOKEN})")
+    return re.compile("|".join(alternatives))
+
+
+def _normalize_tokens(code: str, language: str) -> str:
+    """Comment-free token stream joined by single spaces (string literals kept verbatim)"""
+    tokens = []
+    for match in _token_pattern(language).finditer(code):
+        if match.lastgroup != "comment":
+            tokens.append(match.group())
+    return " ".join(tokens)
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            body = node.body
+            if (body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant)
+                    and isinstance(body[0].value.value, str)):
+                node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def _normalize_python(code: str) -> str:
+    """AST dump without positions or docstrings; raises SyntaxError for fragments"""
+    tree = ast.parse(textwrap.dedent(code))
+    return ast.dump(_strip_docstrings(tree), annotate_fields=False, include_attributes=False)
+
+
+def canonical_language(language: str) -> str:
+    """One name per language, whether given as a short code, an extension or a full name"""
+    language = (language or "").lower().lstrip(".")
+    return _LANGUAGE_ALIASES.get(language, language)
+
+
+def normalize_function(code: str, language: str) -> str:
+    """Semantic form of a function: whitespace, comments and (for Python) docstrings removed.
+
+    Python is compared by AST so formatting changes do not matter; code that
+    does not parse (e.g. a fragment cut out of a diff) and other languages
+    are compared as comment-free token streams.
+    """
+    language = canonical_language(language)
+    if language == "python":
+        try:
+            return "ast:" + _normalize_python(code)
+        except (SyntaxError, ValueError):
+            pass
+    return "tokens:" + _normalize_tokens(code, language)
+
+
+def function_fingerprint(code: str, language: str) -> str:
+    """Stable hash of :func:`normalize_function`, safe to persist across runs"""
+    normalized = f"v{FINGERPRINT_VERSION}:{normalize_function(code, language)}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
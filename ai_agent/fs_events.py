@@ -0,0 +1,185 @@
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Directories that never contain code worth watching
+DEFAULT_IGNORED_DIRS = frozenset({
+    ".git", ".hg", ".svn", "__pycache__", "node_modules", ".venv", "venv", "env",
+    ".mypy_cache", ".pytest_cache", ".tox", ".idea", ".vscode", "build", "dist", "target",
+})
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileEvent(NamedTuple):
+    """``kind`` is "changed", "deleted" or "rescan" (events were lost; re-check everything)"""
+    kind: str
+    path: Optional[str]
+
+
+class InotifyWatcher:
+    """Recursive working-tree watcher on Linux inotify, through ctypes (no extra dependency).
+
+    Files are reported when they are closed after writing or renamed into
+    place, which covers both in-place saves and the write-then-rename saves
+    most editors do, so half-written files are never read. Directories
+    created later are watched as they appear.
+    """
+
+    def __init__(self, root: str, ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS):
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self.root = os.path.abspath(root)
+        self.ignored_dirs = frozenset(ignored_dirs)
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths: Dict[int, str] = {}
+        try:
+            self._add_tree(self.root)
+        except OSError:
+            self.close()
+            raise
+
+    def _ignored(self, path: str) -> bool:
+        return os.path.basename(path) in self.ignored_dirs
+
+    def _add_watch(self, directory: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error == errno.ENOSPC:
+                raise OSError(error, "inotify watch limit reached (fs.inotify.max_user_watches)")
+            logging.debug(f"Could not watch {directory}: {os.strerror(error)}")
+            return
+        self._paths[wd] = directory
+
+    def _add_tree(self, top: str):
+        for directory, subdirs, _ in os.walk(top):
+            subdirs[:] = [d for d in subdirs if d not in self.ignored_dirs]
+            self._add_watch(directory)
+
+    def read_events(self, timeout: float) -> List[FileEvent]:
+        """Wait up to ``timeout`` seconds and return the events that arrived"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events: List[FileEvent] = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append(FileEvent("rescan", None))
+                continue
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name) if name else directory
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._ignored(path):
+                    # Files written before the watch was added would be missed, so report a rescan
+                    try:
+                        self._add_tree(path)
+                    except OSError as e:
+                        logging.warning(f"Not watching new directory {path}: {e}")
+                    events.append(FileEvent("rescan", path))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    events.append(FileEvent("deleted", path))
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                events.append(FileEvent("changed", path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append(FileEvent("deleted", path))
+        return events
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingWatcher:
+    """Portable fallback: rescans the tree every ``interval`` seconds and compares mtime/size"""
+
+    def __init__(self, root: str, ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS, interval: float = 1.0):
+        self.root = os.path.abspath(root)
+        self.ignored_dirs = frozenset(ignored_dirs)
+        self.interval = interval
+        self._state = self._scan()
+        self._last_scan = time.monotonic()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if d not in self.ignored_dirs]
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def read_events(self, timeout: float) -> List[FileEvent]:
+        wait = self._last_scan + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        current = self._scan()
+        self._last_scan = time.monotonic()
+        events = [FileEvent("changed", path) for path, signature in current.items()
+                  if self._state.get(path) != signature]
+        events.extend(FileEvent("deleted", path) for path in self._state if path not in current)
+        self._state = current
+        return events
+
+    def close(self):
+        pass
+
+
+def create_watcher(root: str, ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS, polling: bool = False,
+                   poll_interval: float = 1.0):
+    """inotify where available, polling otherwise (or when ``polling`` is set)"""
+    if not polling:
+        try:
+            return InotifyWatcher(root, ignored_dirs)
+        except OSError as e:
+            logging.warning(f"inotify unavailable ({e}); falling back to polling every {poll_interval}s")
+    return PollingWatcher(root, ignored_dirs, interval=poll_interval)
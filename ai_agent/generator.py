@@ -1,15 +1,23 @@
 import os
 import re
 from typing import Dict, List, Tuple, Optional
-from .llm import PhindCodeLlamaLLM
+from .llm import PhindCodeLlamaLLM, code_language_kwargs
 from .language_detector import LanguageDetector
 from .enhanced_context import EnhancedContextLoader
+from .metrics import metrics
+from .candidate_ranking import rank_candidates, local_modules_for
 import logging
 
 class TestGenerator:
-    def __init__(self, llm: PhindCodeLlamaLLM):
+    def __init__(self, llm: PhindCodeLlamaLLM, num_candidates: Optional[int] = None):
         self.llm = llm
         self.prompt_strategies = ["naive", "diff-aware", "few-shot", "cot"]
+        # Best-of-N: sample this many tests per prompt and keep the best-ranked one
+        if num_candidates is None:
+            num_candidates = int(os.environ.get("AI_AGENT_CANDIDATES", "1"))
+        self.num_candidates = max(1, num_candidates)
+        # Why the last enhanced-context generation fell back to a template test, if it did
+        self.last_fallback_error: Optional[str] = None
     
     def extract_functions_from_diff(self, diff_content: str) -> List[Tuple[str, str, str, str]]:
         functions = []
@@ -273,35 +281,68 @@ class TestGenerator:
     ) -> str:
         """Generate tests using enhanced context for complete, runnable output"""
         
+        self.last_fallback_error = None
         try:
             # Use the strategy-specific prompt based on prompt_strategy
-            prompt = self._create_strategy_specific_prompt(
-                function_code, enhanced_context, file_path, language, prompt_strategy
-            )
+            with metrics.span("prompt_build", strategy=prompt_strategy) as span:
+                prompt = self._create_strategy_specific_prompt(
+                    function_code, enhanced_context, file_path, language, prompt_strategy
+                )
+                span["prompt_chars"] = len(prompt)
             
             # Generate test using LLM
-            test_code = self.llm.generate(prompt)
-            
-            # Clean up the generated test to remove any intro text
-            test_code = self._clean_generated_test(test_code, language)
+            if self.num_candidates > 1 and hasattr(self.llm, "generate_candidates"):
+                outputs = self.llm.generate_candidates(
+                    prompt, n=self.num_candidates, **code_language_kwargs(self.llm.generate_candidates, language)
+                )
+            else:
+                outputs = [self.llm.generate(prompt, **code_language_kwargs(self.llm.generate, language))]
             
-            # Additional aggressive cleaning to remove any trailing explanatory text
-            test_code = self._remove_trailing_explanations(test_code, language)
+            with metrics.span("cleaning") as span:
+                candidates = []
+                for test_code in outputs:
+                    if getattr(self.llm, "last_output_constrained", False):
+                        # Constrained decoding already produced bare code
+                        span["constrained"] = True
+                        test_code = test_code.strip()
+                    else:
+                        # Clean up the generated test to remove any intro text
+                        test_code = self._clean_generated_test(test_code, language)
+                        
+                        # Additional aggressive cleaning to remove any trailing explanatory text
+                        test_code = self._remove_trailing_explanations(test_code, language)
+                        
+                        # Final safety check: remove any remaining explanatory text patterns
+                        test_code = self._final_cleanup_explanatory_text(test_code, language)
+                    candidates.append(test_code)
             
-            # Final safety check: remove any remaining explanatory text patterns
-            test_code = self._final_cleanup_explanatory_text(test_code, language)
+            test_code = candidates[0]
+            if len(candidates) > 1:
+                with metrics.span("candidate_ranking", candidates=len(candidates)) as span:
+                    ranked = rank_candidates(
+                        candidates, language, local_modules_for(enhanced_context.get_source_files())
+                    )
+                    best, test_code = ranked[0]
+                    span.update(best_score=best.score, scores=[score.score for score, _ in ranked])
+                logging.info(f"Best of {len(candidates)} candidates scored {best.score:.2f} "
+                             f"(syntax ok: {best.syntax_ok}, imports resolved: {best.import_ratio:.0%}, "
+                             f"{best.assertions} assertions in {best.tests} tests)")
             
             # Validate the generated test
-            if not self._validate_generated_test(test_code, language):
+            with metrics.span("validation") as span:
+                span["valid"] = self._validate_generated_test(test_code, language)
+            if not span["valid"]:
                 logging.warning(f"Generated test failed validation, regenerating...")
-                test_code = self._regenerate_if_invalid(test_code, function_code, language, enhanced_context, file_path, prompt_strategy)
+                with metrics.span("regeneration"):
+                    test_code = self._regenerate_if_invalid(test_code, function_code, language, enhanced_context, file_path, prompt_strategy)
                 
                 # Final validation
             if not test_code or not test_code.strip():
                 raise RuntimeError("Empty test generation after validation")
             
             # Ensure proper imports are included
-            test_code = self._ensure_proper_imports(test_code, enhanced_context, file_path, language)
+            with metrics.span("import_fixup"):
+                test_code = self._ensure_proper_imports(test_code, enhanced_context, file_path, language)
             
             # C++ specific post-processing to fix placeholder comments
             if language.lower() == 'cpp':
@@ -311,6 +352,7 @@ class TestGenerator:
             
         except Exception as e:
             logging.error(f"Error generating test with enhanced context: {e}")
+            self.last_fallback_error = str(e)
             # Fallback to basic generation
             return self._generate_fallback_test(function_code, language)
     
@@ -324,8 +366,12 @@ class TestGenerator:
     ) -> str:
         """Create a strategy-specific prompt using enhanced context"""
         
-        # Get comprehensive context data for the prompt
-        context_data = enhanced_context.get_full_context_for_prompt(file_path)
+        # Get the prompt sections, with snippets ranked against the function under test
+        context_data = enhanced_context.get_full_context_for_prompt(
+            file_path,
+            function_code=function_code,
+            sections=EnhancedContextLoader.PROMPT_SECTIONS
+        )
         
         # Use the appropriate strategy-specific prompt template
         from .prompts import PromptStrategy
@@ -364,11 +410,16 @@ class TestGenerator:
         primary_framework = test_frameworks[0] if test_frameworks else "standard"
         
         # Get comprehensive context
-        context_data = enhanced_context.get_full_context_for_prompt(file_path)
+        context_data = enhanced_context.get_full_context_for_prompt(
+            file_path,
+            function_code=function_code,
+            sections=EnhancedContextLoader.PROMPT_SECTIONS
+        )
         imports = context_data.get('imports', [])
         test_patterns = context_data.get('test_patterns', [])
         pr_title = context_data.get('pr_title', '')
         patch = context_data.get('patch', '')
+        related_files = context_data.get('related_files', [])
         
         prompt = f"""CRITICAL: Generate a COMPLETE, RUNNABLE test file with NO TODO comments, NO placeholders, NO assumptions.
 
@@ -391,6 +442,9 @@ IMPORT REQUIREMENTS:
 Patch changes (what was fixed):
 {patch}
 
+Related files changed in this PR (most relevant first):
+{chr(10).join(related_files) if related_files else "None"}
+
 Existing test patterns:"""
 
         if test_patterns:
@@ -453,9 +507,6 @@ Generate the complete test file now:"""
         """Ensure the test code has proper imports"""
         required_imports = enhanced_context.get_imports_for_file(file_path)
         
-        if not required_imports:
-            return test_code
-        
         # Check if imports are already present
         existing_imports = self._extract_existing_imports(test_code, language)
         
@@ -465,6 +516,14 @@ Generate the complete test file now:"""
             if not any(self._import_matches(imp, existing) for existing in existing_imports):
                 missing_imports.append(imp)
         
+        # Resolve symbols the test uses but never imports through the PR's symbol index
+        try:
+            for imp in enhanced_context.get_symbol_index().missing_imports(test_code, language):
+                if imp not in missing_imports:
+                    missing_imports.append(imp)
+        except Exception as e:
+            logging.warning(f"Symbol index lookup failed for {file_path}: {e}")
+        
         if missing_imports:
             # Add missing imports at the top
             import_lines = '\n'.join(missing_imports)
@@ -481,10 +540,34 @@ Generate the complete test file now:"""
                 lines.insert(import_end, import_lines)
                 test_code = '\n'.join(lines)
             else:
-                # For other languages, add at the top
-                test_code = import_lines + '\n\n' + test_code
+                # For other languages, add after the package declaration and existing imports
+                lines = test_code.split('\n')
+                import_end = self._import_insert_index(lines)
+                lines[import_end:import_end] = [import_lines] + ([''] if import_end == 0 else [])
+                test_code = '\n'.join(lines)
         
         return test_code
+
+    @staticmethod
+    def _import_insert_index(lines: List[str]) -> int:
+        """Line index just past a leading package declaration and import/include block"""
+        import_end = 0
+        in_block = False
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if in_block:
+                # Go ``import (...)`` blocks and multi-line JS/TS ``import {...} from`` statements
+                if stripped.startswith(')') or re.search(r"\bfrom\s+['\"]", stripped):
+                    in_block = False
+                    import_end = i + 1
+                continue
+            if stripped.startswith(('package ', 'import ', 'import(', '#include', 'using ')):
+                import_end = i + 1
+                in_block = (re.match(r'import\s*\($', stripped) is not None
+                            or (stripped.startswith('import {') and 'from' not in stripped))
+            elif stripped and not stripped.startswith(('//', '/*', '*', '#')):
+                break
+        return import_end
     
     def _extract_existing_imports(self, test_code: str, language: str) -> List[str]:
         """Extract existing imports from test code"""
@@ -850,7 +933,7 @@ Language: {language}
 Generate ONLY the test code now. No other text:"""
         
         # Regenerate with stricter prompt
-        new_test_code = self.llm.generate(strict_prompt)
+        new_test_code = self.llm.generate(strict_prompt, **code_language_kwargs(self.llm.generate, language))
         
         # Clean and validate again
         new_test_code = self._clean_generated_test(new_test_code, language)
@@ -889,7 +972,9 @@ Function to test:
 
 Generate ONLY the complete C++ test code now. No other text:"""
             
-            ultra_critical_test = self.llm.generate(ultra_critical_prompt)
+            ultra_critical_test = self.llm.generate(
+                ultra_critical_prompt, **code_language_kwargs(self.llm.generate, language)
+            )
             ultra_critical_test = self._clean_generated_test(ultra_critical_test, language)
             ultra_critical_test = self._remove_trailing_explanations(ultra_critical_test, language)
             ultra_critical_test = self._final_cleanup_explanatory_text(ultra_critical_test, language)
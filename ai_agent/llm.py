@@ -2,28 +2,83 @@ from __future__ import annotations
 
 import os
 import json
+import inspect
 import logging
 import time
 import random
+import threading
 import requests
-from typing import List, Dict, Union, Optional
-
-from huggingface_hub import InferenceClient
+from typing import List, Dict, Union, Optional, Tuple
+
+from .backends import OllamaEndpointPool
+from .metrics import metrics
+from .resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    HedgeBudget,
+    LatencyTracker,
+    hedged_call,
+    retry_delay,
+)
+
+# torch, transformers and huggingface_hub take seconds to import, so they are
+# imported inside the provider that needs them; ollama and CLI-only paths never load them.
+
+def code_language_kwargs(method, language: Optional[str]) -> Dict[str, str]:
+    """``{"code_language": language}`` when ``method`` accepts it, else ``{}``.
+
+    Injected or duck-typed LLMs (``AIAgent(llm=...)``) only need a
+    ``generate(messages)`` method, so the constrained-decoding hint is
+    passed only to implementations that take it.
+    """
+    try:
+        params = inspect.signature(method).parameters.values()
+    except (TypeError, ValueError):
+        return {}
+    if any(p.name == "code_language" or p.kind is p.VAR_KEYWORD for p in params):
+        return {"code_language": language}
+    return {}
 
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
 
 def _env(key: str, default: str = "") -> str:
     """Get environment variable with default"""
     return os.environ.get(key, default)
 
 
+class _FirstTokenTimer:
+    """Generation streamer that only notes when the first new token arrives (end of prefill)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.first_token_at: Optional[float] = None
+
+    def put(self, value):
+        # The first call carries the prompt, the second the first generated token
+        self.calls += 1
+        if self.calls == 2:
+            self.first_token_at = time.monotonic()
+
+    def end(self):
+        pass
+
+
+def _process_rss_bytes() -> int:
+    """Resident memory of this process, used to report model footprint"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
 class PhindCodeLlamaLLM:
     """
     provider:
       - "hf-inference" -> Hugging Face Inference API
       - "local"        -> transformers (CPU by default to avoid MPS crashes)
-      - "ollama"       -> Ollama local models (e.g., deepseek-coder)
+      - "ollama"       -> Ollama local models (e.g., deepseek-coder); pass
+                          ``ollama_urls`` or a comma-separated OLLAMA_URL to
+                          balance requests across several servers
     """
 
     def __init__(
@@ -31,8 +86,11 @@ class PhindCodeLlamaLLM:
         model_name: str = "h2oai/h2ogpt-16k-codellama-13b-python",
         api_token: Optional[str] = None,
         provider: str = "hf-inference",
+        ollama_urls: Optional[List[str]] = None,
     ):
         self.model_name = model_name
+        self.ollama_urls = ollama_urls
+        self._call_state = threading.local()
         self.provider = provider.lower().strip()
         self.api_token = api_token or _env("HF_TOKEN", "")
         os.environ["HF_TOKEN"] = self.api_token
@@ -41,6 +99,24 @@ class PhindCodeLlamaLLM:
         logging.info(f"Using model: {self.model_name}")
         logging.info(f"Using HF_TOKEN: {self.api_token[:10]}...")
 
+        # Timeouts follow observed latency; repeated failures trip the breaker
+        max_timeout = float(_env("AI_AGENT_LLM_TIMEOUT", "600"))
+        self.latency = LatencyTracker(
+            default_timeout=max_timeout,
+            min_timeout=min(max_timeout, float(_env("AI_AGENT_LLM_MIN_TIMEOUT", "30"))),
+            max_timeout=max_timeout,
+        )
+        self.breaker = CircuitBreaker(
+            self.provider,
+            failure_threshold=int(_env("AI_AGENT_BREAKER_THRESHOLD", "5")),
+            recovery_timeout=float(_env("AI_AGENT_BREAKER_COOLDOWN", "60")),
+        )
+
+        # Optional request hedging: duplicate calls still running past the p95 latency
+        self.hedge_budget = None
+        if _env("AI_AGENT_HEDGE", "0").lower() in {"1", "true", "yes"}:
+            self.hedge_budget = HedgeBudget(ratio=float(_env("AI_AGENT_HEDGE_BUDGET", "0.1")))
+
         if self.provider == "local":
             self._init_local()
         elif self.provider == "ollama":
@@ -52,6 +128,8 @@ class PhindCodeLlamaLLM:
     # Remote (HF Inference API)
     # ---------------------------
     def _init_remote(self):
+        from huggingface_hub import InferenceClient
+
         try:
             self.client = InferenceClient(
                 model=self.model_name,
@@ -67,6 +145,25 @@ class PhindCodeLlamaLLM:
     # Local (Transformers)
     # ---------------------------
     def _init_local(self):
+        # AI_AGENT_QUANTIZE: "int8" (dynamic quantization of Linear layers on CPU)
+        # or "gguf"/"int4" (llama.cpp with the file in AI_AGENT_GGUF_PATH). Without
+        # llama-cpp-python or the file, the model loads through transformers instead.
+        self.quantize = _env("AI_AGENT_QUANTIZE", "").lower()
+        self.gguf_model = None
+        rss_before = _process_rss_bytes()
+
+        if self.quantize in {"gguf", "int4"}:
+            try:
+                self._init_gguf()
+                self._report_memory_footprint(rss_before)
+                return
+            except (ImportError, FileNotFoundError) as e:
+                logging.warning(f"{e}; falling back to full-precision transformers weights.")
+                self.quantize = ""
+
+        import torch
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
         # Default to CPU; MPS can crash with 4GB NDArray assertion on Mac.
         wanted = _env("AI_AGENT_DEVICE", "cpu").lower()
         if wanted not in {"cpu", "cuda", "mps"}:
@@ -104,6 +201,18 @@ class PhindCodeLlamaLLM:
         if self.local_device == "cpu":
             self.model.to("cpu")
 
+        self._init_draft_model(dtype)
+
+        if self.quantize == "int8":
+            if self.local_device == "cpu":
+                self.model = self._quantize_int8(self.model)
+                if self.draft_model is not None:
+                    self.draft_model = self._quantize_int8(self.draft_model)
+            else:
+                logging.warning("AI_AGENT_QUANTIZE=int8 is CPU-only; loading full-precision weights.")
+        elif self.quantize:
+            logging.warning(f"Unknown AI_AGENT_QUANTIZE value '{self.quantize}'; expected int8, int4 or gguf.")
+
         # Conservative defaults to constrain memory
         self.gen_defaults = {
             "temperature": 0.2,
@@ -118,35 +227,185 @@ class PhindCodeLlamaLLM:
         # Optional CPU threading
         torch.set_num_threads(int(_env("AI_AGENT_TORCH_THREADS", "4")))
 
+        # Constrain test generation to bare code so post-hoc cleaning can be skipped
+        self.constrained_decoding = _env("AI_AGENT_CONSTRAINED_DECODING", "0").lower() in {"1", "true", "yes"}
+        self._token_vocabulary = None
+
+        self._report_memory_footprint(rss_before)
         logging.info("✅ Local Transformers pipeline initialized.")
 
+    @staticmethod
+    def _quantize_int8(model):
+        """Dynamic int8 quantization: Linear weights are stored as int8, activations quantized on the fly"""
+        import torch
+
+        # In place so the float32 Linear weights are released rather than kept alongside
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        logging.info(f"Quantized {model.__class__.__name__} Linear layers to int8")
+        return quantized
+
+    @staticmethod
+    def _weight_bytes(model) -> int:
+        """Bytes held by a model's weights, counting packed int8 Linear weights"""
+        total = 0
+        for module in model.modules():
+            for tensor in list(module.parameters(recurse=False)) + list(module.buffers(recurse=False)):
+                total += tensor.numel() * tensor.element_size()
+            packed = getattr(module, "_packed_params", None)
+            if packed is not None and callable(getattr(module, "weight", None)):
+                weight = module.weight()
+                total += weight.numel() * weight.element_size()
+                bias = module.bias()
+                if bias is not None:
+                    total += bias.numel() * bias.element_size()
+        return total
+
+    def _init_gguf(self):
+        """Load a GGUF model through llama.cpp (llama-cpp-python) for int4/int8 CPU inference"""
+        try:
+            from llama_cpp import Llama
+        except ImportError as e:
+            raise ImportError(
+                "AI_AGENT_QUANTIZE=gguf requires llama-cpp-python: pip install llama-cpp-python"
+            ) from e
+
+        gguf_path = _env("AI_AGENT_GGUF_PATH", "")
+        if not gguf_path or not os.path.exists(gguf_path):
+            raise FileNotFoundError(f"Set AI_AGENT_GGUF_PATH to a .gguf model file (got '{gguf_path}')")
+
+        self.local_device = "cpu"
+        self.gguf_model = Llama(
+            model_path=gguf_path,
+            n_ctx=int(_env("AI_AGENT_GGUF_CTX", "4096")),
+            n_threads=int(_env("AI_AGENT_TORCH_THREADS", "4")),
+            verbose=False,
+        )
+        self.model_file_bytes = os.path.getsize(gguf_path)
+        logging.info(f"✅ llama.cpp backend initialized from {gguf_path}")
+
+    def _report_memory_footprint(self, rss_before: int):
+        """Log weight size and process RSS growth so quantization modes can be compared"""
+        self.model_memory_bytes = max(0, _process_rss_bytes() - rss_before)
+        if self.gguf_model is not None:
+            self.model_weight_bytes = self.model_file_bytes
+        else:
+            self.model_weight_bytes = self._weight_bytes(self.model)
+            if self.draft_model is not None:
+                self.model_weight_bytes += self._weight_bytes(self.draft_model)
+        label = self.quantize or ("float32" if self.local_device == "cpu" else "float16")
+        logging.info(
+            f"Local model memory footprint ({label}): weights {self.model_weight_bytes / 2**20:.1f} MiB, "
+            f"process RSS +{self.model_memory_bytes / 2**20:.0f} MiB"
+        )
+
+    def _init_draft_model(self, dtype):
+        """Load the small draft model used for speculative (assisted) decoding, if configured"""
+        self.draft_model = None
+        self.draft_tokenizer = None
+        self.draft_shares_vocab = True
+        self.speculative_totals = {"checked_tokens": 0, "accepted_tokens": 0}
+        # Measuring the acceptance rate costs an extra draft forward pass per call, so it is opt-in
+        self.draft_stats = _env("AI_AGENT_DRAFT_STATS", "0").lower() in {"1", "true", "yes"}
+
+        draft_name = _env("AI_AGENT_DRAFT_MODEL", "")
+        if not draft_name:
+            return
+
+        from transformers import AutoTokenizer, AutoModelForCausalLM
+
+        try:
+            self.draft_tokenizer = AutoTokenizer.from_pretrained(
+                draft_name,
+                use_fast=True,
+                trust_remote_code=True,
+            )
+            self.draft_model = AutoModelForCausalLM.from_pretrained(
+                draft_name,
+                torch_dtype=dtype,
+                low_cpu_mem_usage=True,
+                trust_remote_code=True,
+            ).to(self.local_device)
+        except Exception as e:
+            logging.warning(f"Could not load draft model {draft_name}, using plain decoding: {e}")
+            self.draft_model = None
+            self.draft_tokenizer = None
+            return
+
+        # Different vocabularies need transformers' universal assisted decoding,
+        # which re-tokenizes between the draft and target models
+        self.draft_shares_vocab = self.draft_tokenizer.get_vocab() == self.tokenizer.get_vocab()
+        num_tokens = _env("AI_AGENT_DRAFT_TOKENS", "")
+        if num_tokens:
+            self.draft_model.generation_config.num_assistant_tokens = int(num_tokens)
+        logging.info(
+            f"✅ Speculative decoding enabled with draft model {draft_name}"
+            f" ({'shared' if self.draft_shares_vocab else 'different'} vocabulary)"
+        )
+
+    def _estimate_acceptance_rate(self, prompt_ids, generated_ids) -> Optional[float]:
+        """Fraction of generated tokens the draft model predicts greedily.
+
+        transformers does not expose per-call acceptance counts, so this
+        teacher-forces the draft model over the output once and counts the
+        positions where its argmax matches the emitted token, which is the
+        acceptance rate of greedy speculative decoding. Both id tensors must
+        be in the draft model's vocabulary. Only runs with AI_AGENT_DRAFT_STATS=1.
+        """
+        import torch
+
+        if generated_ids.shape[-1] == 0:
+            return None
+
+        input_ids = torch.cat([prompt_ids, generated_ids], dim=-1).to(self.local_device)
+        with torch.no_grad():
+            logits = self.draft_model(input_ids=input_ids).logits
+        start = prompt_ids.shape[-1] - 1
+        predicted = logits[0, start:start + generated_ids.shape[-1]].argmax(dim=-1).cpu()
+        accepted = int((predicted == generated_ids[0].cpu()).sum())
+        checked = int(generated_ids.shape[-1])
+        self.speculative_totals["checked_tokens"] += checked
+        self.speculative_totals["accepted_tokens"] += accepted
+        return accepted / checked
+
+    @property
+    def speculative_acceptance_rate(self) -> Optional[float]:
+        """Acceptance rate across every local generation so far"""
+        totals = getattr(self, "speculative_totals", None)
+        if not totals or not totals["checked_tokens"]:
+            return None
+        return totals["accepted_tokens"] / totals["checked_tokens"]
+
     # ---------------------------
     # Ollama
     # ---------------------------
     def _init_ollama(self):
         try:
-            import requests
-            self.ollama_url = _env("OLLAMA_URL", "http://localhost:11434")
+            # OLLAMA_URL may list several comma-separated hosts; requests are balanced across them
+            self.ollama_pool = OllamaEndpointPool(
+                self.ollama_urls or _env("OLLAMA_URL", "http://localhost:11434"),
+                health_interval=float(_env("AI_AGENT_OLLAMA_HEALTH_INTERVAL", "30")),
+                failure_threshold=int(_env("AI_AGENT_BREAKER_THRESHOLD", "5")),
+                recovery_timeout=float(_env("AI_AGENT_BREAKER_COOLDOWN", "60")),
+            )
             self.ollama_model = self.model_name
             
-            # Test connection to Ollama
-            response = requests.get(f"{self.ollama_url}/api/tags", timeout=30)
-            if response.status_code == 200:
-                logging.info(f"Ollama connection established at {self.ollama_url}")
+            # Test connection to every endpoint
+            healthy = self.ollama_pool.check_all()
+            if not healthy:
+                urls = ", ".join(e.url for e in self.ollama_pool.endpoints)
+                raise Exception(f"No Ollama endpoint responded at {urls}")
+            self.ollama_url = healthy[0].url
+            
+            for endpoint in healthy:
+                logging.info(f"Ollama connection established at {endpoint.url}")
                 logging.info(f"Using model: {self.ollama_model}")
                 
                 # Check if the specific model is available and loaded
-                models_response = requests.get(f"{self.ollama_url}/api/tags", timeout=30)
-                if models_response.status_code == 200:
-                    models = models_response.json().get("models", [])
-                    model_found = any(model.get("name") == self.ollama_model for model in models)
-                    if model_found:
-                        logging.info(f"Model {self.ollama_model} is available")
-                    else:
-                        logging.warning(f"Model {self.ollama_model} not found in available models")
-                        logging.info("Available models: " + ", ".join([m.get("name", "unknown") for m in models]))
+                if self.ollama_model in endpoint.models:
+                    logging.info(f"Model {self.ollama_model} is available on {endpoint.url}")
                 else:
-                    logging.warning("Could not check available models")
+                    logging.warning(f"Model {self.ollama_model} not found in available models on {endpoint.url}")
+                    logging.info("Available models: " + ", ".join(endpoint.models))
                 
                 # Warm up the model with a simple request to ensure it's loaded
                 try:
@@ -157,19 +416,16 @@ class PhindCodeLlamaLLM:
                         "options": {"num_predict": 10}
                     }
                     warmup_response = requests.post(
-                        f"{self.ollama_url}/api/generate",
+                        f"{endpoint.url}/api/generate",
                         json=warmup_payload,
                         timeout=60
                     )
                     if warmup_response.status_code == 200:
-                        logging.info(f"Model {self.ollama_model} is loaded and responding")
+                        logging.info(f"Model {self.ollama_model} is loaded and responding on {endpoint.url}")
                     else:
                         logging.warning(f"Model warm-up failed with status {warmup_response.status_code}")
                 except Exception as warmup_e:
                     logging.warning(f"Model warm-up failed: {warmup_e}")
-                    
-            else:
-                raise Exception(f"Ollama API returned status {response.status_code}")
                 
         except Exception as e:
             logging.error(f"Failed to connect to Ollama: {e}")
@@ -187,16 +443,123 @@ class PhindCodeLlamaLLM:
         max_retries: int = 3,
         temperature: float = 0.2,
         stop: Optional[List[str]] = None,
+        code_language: Optional[str] = None,
     ) -> str:
+        """Generate a completion.
+
+        ``code_language`` marks the output as a source file in that language;
+        with AI_AGENT_CONSTRAINED_DECODING on the local backend decoding is
+        then restricted to code and ``last_output_constrained`` is set.
+        """
         if isinstance(messages, str):
             messages = [{"role": "user", "content": messages}]
+        self.last_output_constrained = False
+        self.last_generation_stats = {}
+
+        with metrics.span("llm_call", provider=self.provider, model=self.model_name) as span:
+            if self.provider == "local" and getattr(self, "gguf_model", None) is not None:
+                text = self._generate_gguf(messages, max_new_tokens, max_retries, temperature)
+            elif self.provider == "local":
+                text = self._generate_local(messages, max_new_tokens, max_retries, temperature, code_language)
+            elif self.provider == "ollama":
+                text = self._generate_ollama(messages, max_new_tokens, max_retries, stop=stop)
+            else:
+                text = self._generate_remote(messages, max_new_tokens, max_retries, temperature)
+            span.update(self.last_generation_stats)
+            span["chars_out"] = len(text or "")
+        return text
 
-        if self.provider == "local":
-            return self._generate_local(messages, max_new_tokens, max_retries, temperature)
-        elif self.provider == "ollama":
-            return self._generate_ollama(messages, max_new_tokens, max_retries, stop=stop)
-        else:
-            return self._generate_remote(messages, max_new_tokens, max_retries, temperature)
+    def generate_candidates(
+        self,
+        messages: Union[str, List[Dict[str, str]]],
+        n: int = 3,
+        max_new_tokens: int = 512,
+        max_retries: int = 3,
+        temperature: float = 0.7,
+        stop: Optional[List[str]] = None,
+        code_language: Optional[str] = None,
+    ) -> List[str]:
+        """Sample ``n`` completions for the same prompt at once (best-of-N).
+
+        Locally this is one batched ``generate`` with ``num_return_sequences``,
+        so the prompt is prefilled once. Ollama gets ``n`` concurrent requests
+        with different seeds, which the endpoint pool spreads across servers.
+        Remote providers get ``n`` concurrent calls. llama.cpp models cannot be
+        shared between threads, so they generate one candidate after another.
+        Failed candidates are dropped; an error is raised only if all fail.
+        """
+        if n <= 1:
+            return [self.generate(messages, max_new_tokens, max_retries, temperature, stop, code_language)]
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        self.last_output_constrained = False
+        self.last_generation_stats = {}
+
+        with metrics.span("llm_call", provider=self.provider, model=self.model_name, candidates=n) as span:
+            if self.provider == "local" and getattr(self, "gguf_model", None) is None:
+                texts = self._generate_local_texts(messages, max_new_tokens, max_retries, temperature,
+                                                   code_language, num_candidates=n)
+                stats = dict(self.last_generation_stats)
+            elif self.provider == "local":
+                texts, stats = [], {"tokens_out": 0}
+                for _ in range(n):
+                    texts.append(self._generate_gguf(messages, max_new_tokens, max_retries, temperature))
+                    stats["tokens_out"] += self.last_generation_stats.get("tokens_out", 0)
+                    stats["tokens_in"] = self.last_generation_stats.get("tokens_in", 0)
+            else:
+                texts, stats = self._generate_concurrently(messages, n, max_new_tokens, max_retries, temperature, stop)
+            self.last_generation_stats = stats
+            span.update(stats)
+            span["chars_out"] = sum(len(text or "") for text in texts)
+        return texts
+
+    def _generate_concurrently(self, messages, n, max_new_tokens, max_retries, temperature, stop):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def one(seed: int) -> Tuple[Optional[str], Dict]:
+            try:
+                if self.provider == "ollama":
+                    text = self._generate_ollama(messages, max_new_tokens, max_retries, stop=stop,
+                                                 sampling={"temperature": temperature, "seed": seed})
+                else:
+                    text = self._generate_remote(messages, max_new_tokens, max_retries, temperature)
+                return text, self.last_generation_stats
+            except Exception as e:
+                logging.warning(f"Candidate {seed + 1}/{n} failed: {e}")
+                return None, {}
+
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            outcomes = list(pool.map(one, range(n)))
+        texts = [text for text, _ in outcomes if text]
+        if not texts:
+            raise RuntimeError(f"All {n} candidate generations failed")
+        stats = {
+            "candidates": len(texts),
+            "tokens_in": sum(int(s.get("tokens_in") or 0) for _, s in outcomes),
+            "tokens_out": sum(int(s.get("tokens_out") or 0) for _, s in outcomes),
+            "attempts": sum(int(s.get("attempts") or 1) for _, s in outcomes if s),
+        }
+        ttfts = [s["ttft_s"] for _, s in outcomes if s.get("ttft_s")]
+        if ttfts:
+            stats["ttft_s"] = min(ttfts)
+        return texts, stats
+
+    # Per-thread so concurrent callers each see the stats of their own call
+    @property
+    def last_generation_stats(self) -> Dict[str, Union[str, int, float]]:
+        return getattr(self._call_state, "stats", {})
+
+    @last_generation_stats.setter
+    def last_generation_stats(self, stats: Dict[str, Union[str, int, float]]):
+        self._call_state.stats = stats
+
+    @property
+    def last_output_constrained(self) -> bool:
+        return getattr(self._call_state, "constrained", False)
+
+    @last_output_constrained.setter
+    def last_output_constrained(self, value: bool):
+        self._call_state.constrained = value
 
     # ---------------------------
     # Remote generation
@@ -209,29 +572,81 @@ class PhindCodeLlamaLLM:
         temperature: float,
     ) -> str:
         last_exc: Optional[Exception] = None
+        prompt_length = sum(len(m.get("content", "")) for m in messages)
         for attempt in range(max_retries):
             try:
-                resp = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    max_tokens=max_new_tokens,
-                    temperature=temperature,
-                )
-                text = resp.choices[0].message.content
+                # Not hedged: a duplicate would go to the same model and endpoint as the slow request
+                text, stats = self._remote_attempt(messages, max_new_tokens, temperature, prompt_length)
+                self.last_generation_stats = dict(stats, attempts=attempt + 1)
                 if text:
                     return text.strip()
+            except CircuitOpenError as e:
+                logging.warning(f"Skipping remote call: {e}")
+                return self._generate_fallback_content(messages)
             except Exception as e:
                 last_exc = e
                 logging.warning(f"Attempt {attempt + 1} failed: {e}")
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.uniform(0, 1)
+                if attempt < max_retries - 1 and not self.breaker.is_open:
+                    wait_time = retry_delay(attempt, e)
                     logging.info(f"Retrying in {wait_time:.2f} seconds...")
                     time.sleep(wait_time)
                 else:
-                    logging.error(f"All {max_retries} attempts failed. Last error: {e}")
+                    logging.error(f"Giving up after {attempt + 1} attempts. Last error: {e}")
                     return self._generate_fallback_content(messages)
         return "Error: All attempts failed"
 
+    def _remote_attempt(
+        self,
+        messages: List[Dict[str, str]],
+        max_new_tokens: int,
+        temperature: float,
+        prompt_length: int,
+    ) -> Tuple[Optional[str], Dict]:
+        """One chat completion call; a hedged duplicate cannot be cancelled, only ignored"""
+        self.breaker.before_request()
+        try:
+            client = self._request_client(self.latency.timeout_for(prompt_length))
+            started = time.monotonic()
+            resp = client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                max_tokens=max_new_tokens,
+                temperature=temperature,
+            )
+            text = resp.choices[0].message.content
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        elapsed = time.monotonic() - started
+        self.latency.record(prompt_length, elapsed)
+        usage = getattr(resp, "usage", None)
+        stats = {
+            "tokens_in": getattr(usage, "prompt_tokens", 0) or 0,
+            "tokens_out": getattr(usage, "completion_tokens", 0) or 0,
+            "seconds": round(elapsed, 3),
+        }
+        return text, stats
+
+    def _request_client(self, timeout: float):
+        """A client bound to one request's timeout; the shared client is never mutated, so
+        concurrent calls each keep the deadline computed for their own prompt"""
+        if hasattr(self.client, "with_options"):
+            return self.client.with_options(timeout=timeout)
+        from huggingface_hub import InferenceClient
+        return InferenceClient(model=self.model_name, token=self.api_token, provider="hf-inference", timeout=timeout)
+
+    def _hedged(self, call, prompt_length: int, has_alternate: bool):
+        """Run ``call(cancel_event)``, hedging it once it exceeds the p95 latency for this prompt size.
+
+        Only hedges when ``has_alternate`` says a second target can take the
+        duplicate; hedging onto the backend that is already slow only adds load.
+        """
+        hedge_after = None
+        if self.hedge_budget is not None and has_alternate:
+            hedge_after = self.latency.latency_percentile(prompt_length, 95)
+        return hedged_call(call, hedge_after, self.hedge_budget)
+
     # ---------------------------
     # Local generation
     # ---------------------------
@@ -241,7 +656,25 @@ class PhindCodeLlamaLLM:
         max_new_tokens: int,
         max_retries: int,
         temperature: float,
+        code_language: Optional[str] = None,
     ) -> str:
+        return self._generate_local_texts(messages, max_new_tokens, max_retries, temperature, code_language)[0]
+
+    def _generate_local_texts(
+        self,
+        messages: List[Dict[str, str]],
+        max_new_tokens: int,
+        max_retries: int,
+        temperature: float,
+        code_language: Optional[str] = None,
+        num_candidates: int = 1,
+    ) -> List[str]:
+        """One ``generate`` call; with ``num_candidates`` > 1 the prompt is prefilled once and
+        that many sequences are sampled as a batch (``num_return_sequences``)."""
+        import torch
+        from transformers import LogitsProcessorList
+        from .constrained import CodeOnlyLogitsProcessor, TokenVocabulary
+
         # Build chat prompt using tokenizer's chat template
         try:
             prompt = self.tokenizer.apply_chat_template(
@@ -285,16 +718,84 @@ class PhindCodeLlamaLLM:
                         pad_token_id=self.tokenizer.eos_token_id,
                     )
                 )
-
+                processor = None
+                if code_language and self.constrained_decoding:
+                    if self._token_vocabulary is None:
+                        self._token_vocabulary = TokenVocabulary(self.tokenizer)
+                    processor = CodeOnlyLogitsProcessor(self._token_vocabulary, code_language, input_ids.shape[-1])
+                    gen_kwargs["logits_processor"] = LogitsProcessorList([processor])
+                batched = num_candidates > 1
+                if batched:
+                    # Identical greedy candidates would be pointless, so sample
+                    gen_kwargs.update(num_return_sequences=num_candidates, do_sample=True,
+                                      temperature=max(temperature, 0.7))
+                # Assisted decoding and streamers both require a batch of one
+                if self.draft_model is not None and not batched:
+                    gen_kwargs["assistant_model"] = self.draft_model
+                    if not self.draft_shares_vocab:
+                        gen_kwargs["tokenizer"] = self.tokenizer
+                        gen_kwargs["assistant_tokenizer"] = self.draft_tokenizer
+
+                timer = _FirstTokenTimer()
+                if not batched:
+                    gen_kwargs["streamer"] = timer
+                started = time.monotonic()
                 with torch.no_grad():
                     out_ids = self.model.generate(
                         input_ids=input_ids,
                         **gen_kwargs,
                     )
+                elapsed = time.monotonic() - started
+                prefill = (timer.first_token_at - started) if timer.first_token_at else elapsed
 
                 gen_ids = out_ids[:, input_ids.shape[-1]:]
-                text = self.tokenizer.decode(gen_ids[0], skip_special_tokens=True)
-                return text.strip() if text else ""
+                texts = [self.tokenizer.decode(row, skip_special_tokens=True).strip() for row in gen_ids]
+                text = texts[0]
+
+                if batched:
+                    # Finished rows are padded to the longest one
+                    new_tokens = int((gen_ids != self.tokenizer.eos_token_id).sum())
+                else:
+                    new_tokens = int(gen_ids.shape[-1])
+                self.last_generation_stats = {
+                    "new_tokens": new_tokens,
+                    "tokens_in": int(input_ids.shape[-1]),
+                    "tokens_out": new_tokens,
+                    "prefill_s": round(prefill, 4),
+                    "decode_s": round(elapsed - prefill, 4),
+                    "attempts": attempt + 1,
+                    "seconds": round(elapsed, 3),
+                    "tokens_per_second": round(new_tokens / elapsed, 2) if elapsed > 0 else 0.0,
+                }
+                if batched:
+                    # Without a streamer the prefill/decode split is unknown
+                    del self.last_generation_stats["prefill_s"], self.last_generation_stats["decode_s"]
+                    self.last_generation_stats["candidates"] = num_candidates
+                logging.info(f"Local generation: {new_tokens} tokens at {self.last_generation_stats['tokens_per_second']} tokens/s")
+                if processor is not None:
+                    self.last_output_constrained = True
+                    self.last_generation_stats["blocked_tokens"] = processor.blocked_tokens
+                    logging.info(f"Constrained decoding redirected {processor.blocked_tokens} prose/markdown tokens")
+                if self.draft_model is not None and self.draft_stats and text and not batched:
+                    try:
+                        if self.draft_shares_vocab:
+                            draft_prompt_ids, draft_gen_ids = input_ids, gen_ids
+                        else:
+                            draft_prompt_ids = self.draft_tokenizer(prompt, return_tensors="pt")["input_ids"]
+                            draft_gen_ids = self.draft_tokenizer(
+                                text, return_tensors="pt", add_special_tokens=False
+                            )["input_ids"]
+                        rate = self._estimate_acceptance_rate(draft_prompt_ids, draft_gen_ids)
+                        if rate is not None:
+                            self.last_generation_stats["acceptance_rate"] = round(rate, 3)
+                            logging.info(
+                                f"Speculative decoding: {new_tokens / elapsed:.1f} tokens/s, "
+                                f"acceptance rate {rate:.1%} (run average {self.speculative_acceptance_rate:.1%})"
+                            )
+                    except Exception as e:
+                        logging.warning(f"Could not estimate draft acceptance rate: {e}")
+
+                return texts
 
             except AssertionError as e:
                 last_exc = e
@@ -319,16 +820,60 @@ class PhindCodeLlamaLLM:
                 time.sleep(wait_time)
             else:
                 logging.error(f"All {max_retries} attempts failed locally. Last error: {last_exc}")
-                return self._generate_fallback_content(messages)
+                return [self._generate_fallback_content(messages)]
 
-        return "Error: All attempts failed"
+        return ["Error: All attempts failed"]
+
+    def _generate_gguf(
+        self,
+        messages: List[Dict[str, str]],
+        max_new_tokens: int,
+        max_retries: int,
+        temperature: float,
+    ) -> str:
+        last_exc: Optional[Exception] = None
+        for attempt in range(max_retries):
+            try:
+                started = time.monotonic()
+                result = self.gguf_model.create_chat_completion(
+                    messages=messages,
+                    max_tokens=max_new_tokens,
+                    temperature=temperature,
+                    top_p=0.9,
+                    repeat_penalty=1.05,
+                )
+                elapsed = time.monotonic() - started
+                text = result["choices"][0]["message"]["content"] or ""
+                new_tokens = result.get("usage", {}).get("completion_tokens", 0)
+                self.last_generation_stats = {
+                    "new_tokens": new_tokens,
+                    "tokens_in": result.get("usage", {}).get("prompt_tokens", 0),
+                    "tokens_out": new_tokens,
+                    "attempts": attempt + 1,
+                    "seconds": round(elapsed, 3),
+                    "tokens_per_second": round(new_tokens / elapsed, 2) if elapsed > 0 else 0.0,
+                }
+                logging.info(f"llama.cpp generated {new_tokens} tokens at {new_tokens / max(elapsed, 1e-9):.1f} tokens/s")
+                return text.strip()
+            except Exception as e:
+                last_exc = e
+                logging.warning(f"Attempt {attempt + 1} failed: {e}")
+                if attempt < max_retries - 1:
+                    time.sleep(retry_delay(attempt))
+        logging.error(f"All {max_retries} attempts failed locally. Last error: {last_exc}")
+        return self._generate_fallback_content(messages)
 
     # ---------------------------
     # Ollama generation
     # ---------------------------
-    def _generate_ollama(self, messages, max_new_tokens=2048, max_retries=3, stop=None, num_predict=None):
-        """Generate text using Ollama API with retries and error handling"""
-        if not hasattr(self, 'ollama_url') or not self.ollama_url:
+    def _generate_ollama(self, messages, max_new_tokens=2048, max_retries=3, stop=None, num_predict=None,
+                         sampling=None):
+        """Generate text using Ollama API with retries and error handling.
+
+        ``sampling`` overrides the deterministic options (e.g. temperature and
+        seed for best-of-N candidates).
+        """
+        if not hasattr(self, 'ollama_pool'):
             raise RuntimeError("Ollama not initialized. Call _init_ollama() first.")
         
         # Convert messages to prompt format for Ollama
@@ -349,7 +894,7 @@ class PhindCodeLlamaLLM:
         payload = {
             "model": self.ollama_model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,  # streamed so a losing hedged request can be cancelled
             "options": {
                 "temperature": 0.0,  # User specified: deterministic generation
                 "top_p": 1.0,        # User specified: allow full vocabulary
@@ -358,64 +903,138 @@ class PhindCodeLlamaLLM:
             }
         }
         
+        if sampling:
+            payload["options"].update(sampling)
+        
         # Add stop sequences if provided
         if stop:
             payload["options"]["stop"] = stop
             logging.info(f"Using stop sequences: {stop}")
         
         last_error = None
+        attempts_made = 0
         
+        tried = []
         for attempt in range(max_retries):
+            attempts_made = attempt + 1
             try:
                 logging.info(f"Attempt {attempt + 1}/{max_retries} - Generating with Ollama (temp=0.0, top_p=1.0, max_tokens=3072)")
-                
-                # Make the request with reasonable timeout (10 minutes)
-                response = requests.post(
-                    f"{self.ollama_url}/api/generate",
-                    json=payload,
-                    timeout=600,  # 10 minutes timeout - sufficient for focused prompts
-                    headers={"Content-Type": "application/json"}
+                # Endpoints already serving this request, so the hedge goes to a different one
+                racing = []
+                generated_text, stats = self._hedged(
+                    lambda cancel: self._ollama_attempt(payload, len(prompt), tried, cancel, racing),
+                    len(prompt),
+                    has_alternate=sum(e.available for e in self.ollama_pool.endpoints) > 1,
                 )
+                self.last_generation_stats = dict(stats, attempts=attempt + 1)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    generated_text = result.get('response', '')
-                    
-                    if generated_text and generated_text.strip():
-                        logging.info(f"Successfully generated {len(generated_text)} characters")
-                        return generated_text
-                    else:
-                        logging.warning("Generated text is empty, retrying...")
-                        last_error = "Empty response"
-                        
+                if generated_text and generated_text.strip():
+                    logging.info(f"Successfully generated {len(generated_text)} characters")
+                    return generated_text
                 else:
-                    error_msg = f"status {response.status_code}: {response.text}"
-                    logging.warning(f"Attempt {attempt + 1} failed: {error_msg}")
-                    last_error = error_msg
+                    logging.warning("Generated text is empty, retrying...")
+                    last_error = "Empty response"
                     
-            except requests.exceptions.Timeout:
-                logging.warning(f"Attempt {attempt + 1} failed: timeout after 10 minutes")
-                last_error = "timeout after 10 minutes"
-            except requests.exceptions.RequestException as e:
+            except CircuitOpenError:
+                # Every endpoint is drained or open; fail fast rather than stall the batch
+                raise
+            except requests.exceptions.Timeout as e:
                 logging.warning(f"Attempt {attempt + 1} failed: {e}")
-                last_error = str(e)
+                last_error = f"timeout: {e}"
             except Exception as e:
                 logging.warning(f"Attempt {attempt + 1} failed: {e}")
                 last_error = str(e)
             
-            # Wait before retrying (exponential backoff)
-            if attempt < max_retries - 1:
-                wait_time = 1 + random.random()
+            # Wait before retrying (exponential backoff with jitter); another
+            # healthy node can be tried straight away
+            if attempt < max_retries - 1 and all(e in tried or not e.available for e in self.ollama_pool.endpoints):
+                wait_time = retry_delay(attempt)
                 logging.info(f"Waiting {wait_time:.1f} seconds before retry...")
                 time.sleep(wait_time)
         
-        logging.error(f"All {max_retries} attempts failed. Last error: {last_error}")
+        logging.error(f"All {attempts_made} attempts failed. Last error: {last_error}")
         logging.error("This may indicate:")
         logging.error("1. Ollama server is overloaded or slow")
         logging.error("2. The model is too large for your system")
         logging.error("3. Network connectivity issues")
         logging.error("4. The prompt is too complex (consider reducing context or using a smaller model)")
-        raise RuntimeError(f"Ollama generation failed after {max_retries} attempts. Last error: {last_error}")
+        raise RuntimeError(f"Ollama generation failed after {attempts_made} attempts. Last error: {last_error}")
+
+    def _ollama_attempt(self, payload: Dict, prompt_length: int, tried: List, cancel,
+                        racing: Optional[List] = None) -> Tuple[str, Dict]:
+        """Stream one /api/generate call from the least-loaded endpoint.
+
+        Streaming lets a hedged duplicate that lost the race stop reading and
+        close its connection, which makes Ollama abort that generation.
+        Endpoints that fail are appended to ``tried`` so retries go elsewhere,
+        and endpoints in ``racing`` (copies of the same request) are avoided.
+        Returns the text and the token counts and timings from the final chunk.
+        """
+        racing = racing if racing is not None else []
+        endpoint = self.ollama_pool.acquire(exclude=list(tried) + racing)
+        racing.append(endpoint)
+        timeout = self.latency.timeout_for(prompt_length)
+        started = time.monotonic()
+        success, drain = False, False
+        try:
+            response = requests.post(
+                f"{endpoint.url}/api/generate",
+                json=payload,
+                timeout=timeout,
+                stream=True,
+                headers={"Content-Type": "application/json"}
+            )
+            with response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"{endpoint.url} returned status {response.status_code}: {response.text}")
+                
+                chunks = []
+                final = {}
+                first_token_at = None
+                for line in response.iter_lines():
+                    if cancel.is_set():
+                        logging.info(f"Cancelling hedged request on {endpoint.url}")
+                        success = True
+                        return "", {}
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"{endpoint.url}: {chunk['error']}")
+                    if first_token_at is None and chunk.get("response"):
+                        first_token_at = time.monotonic()
+                    chunks.append(chunk.get("response", ""))
+                    if chunk.get("done"):
+                        final = chunk
+                        break
+                    if time.monotonic() - started > timeout:
+                        raise requests.exceptions.Timeout(f"{endpoint.url} exceeded {timeout:.0f} seconds")
+            
+            success = True
+            elapsed = time.monotonic() - started
+            self.latency.record(prompt_length, elapsed)
+            # Durations in the final chunk are reported in nanoseconds
+            stats = {
+                "endpoint": endpoint.url,
+                "tokens_in": final.get("prompt_eval_count", 0),
+                "tokens_out": final.get("eval_count", 0),
+                "prefill_s": round(final.get("prompt_eval_duration", 0) / 1e9, 4),
+                "decode_s": round(final.get("eval_duration", 0) / 1e9, 4),
+                "ttft_s": round(first_token_at - started, 4) if first_token_at else None,
+                "seconds": round(elapsed, 3),
+            }
+            return "".join(chunks), stats
+        except requests.exceptions.Timeout:
+            # A timeout is a lower bound on latency; recording it lets the timeout grow
+            self.latency.record(prompt_length, timeout)
+            raise
+        except requests.exceptions.ConnectionError:
+            drain = True
+            raise
+        finally:
+            if not success:
+                tried.append(endpoint)
+            self.ollama_pool.release(endpoint, success, drain=drain)
 
     # ---------------------------
     # Helper: messages -> prompt
@@ -691,191 +1310,3 @@ This is automatically generated documentation. Please review and enhance as need
             parts.append(f"{role.upper()}: {content}")
         prompt = "\n".join(parts) + "\nASSISTANT:"
         return prompt
-
-
-
-
-
-                
-
-
-
-
-
-    def _convert_messages_to_ollama_prompt(self, messages: List[Dict[str, str]]) -> str:
-
-        """Convert chat messages to Ollama prompt format."""
-
-        prompt_parts = []
-
-        
-
-        for message in messages:
-
-            role = message.get("role", "user")
-
-            content = message.get("content", "")
-
-            
-
-            if role == "system":
-
-                prompt_parts.append(f"System: {content}")
-
-            elif role == "user":
-
-                prompt_parts.append(f"User: {content}")
-
-            elif role == "assistant":
-
-                prompt_parts.append(f"Assistant: {content}")
-
-        
-
-        return "\n\n".join(prompt_parts) + "\n\nAssistant:"
-
-
-
-    def _clean_response(self, response: str) -> str:
-
-        """Clean verbose responses to extract only the code/documentation."""
-
-        if not response:
-
-            return response
-
-        
-
-        # Remove common verbose prefixes
-
-        verbose_prefixes = [
-
-            "Sure, I can provide you with",
-
-            "Here's a comprehensive",
-
-            "I'll help you create",
-
-            "Let me write",
-
-            "This is a simple example",
-
-            "Here's how you can",
-
-            "I'll generate",
-
-            "Sure, here's",
-
-            "Here's the",
-
-            "I can help you",
-
-            "Let me help you",
-
-            "I'll create",
-
-            "Here's what you need",
-
-            "This function",
-
-            "The function",
-
-            "Based on the code",
-
-            "Looking at the function",
-
-            "For this function",
-
-            "To test this function",
-
-            "To document this function"
-
-        ]
-
-        
-
-        cleaned = response
-
-        for prefix in verbose_prefixes:
-
-            if cleaned.startswith(prefix):
-
-                # Find the first line that looks like code (starts with import, def, class, etc.)
-
-                lines = cleaned.split('\n')
-
-                for i, line in enumerate(lines):
-
-                    if line.strip().startswith(('import ', 'from ', 'def ', 'class ', 'test_', 'describe(', 'it(', 'expect(', 'assert ', '#')):
-
-                        cleaned = '\n'.join(lines[i:])
-
-                        break
-
-        
-
-        # Remove trailing explanations
-
-        if '```' in cleaned:
-
-            # Extract content between code blocks
-
-            start = cleaned.find('```')
-
-            if start != -1:
-
-                end = cleaned.rfind('```')
-
-                if end > start:
-
-                    cleaned = cleaned[start+3:end].strip()
-
-        
-
-        return cleaned.strip()
-
-
-
-    # ---------------------------
-
-    # Fallback content
-
-    # ---------------------------
-
-    def _generate_fallback_content(self, messages: Union[str, List[Dict[str, str]]]) -> str:
-
-        try:
-
-            user_message = ""
-
-            if isinstance(messages, str):
-
-                user_message = messages
-
-            else:
-
-                for msg in reversed(messages):
-
-                    if msg.get("role") == "user":
-
-                        user_message = msg.get("content", "")
-
-                        break
-
-            return f"[Placeholder response due to generation failure]\n{user_message}"
-
-        except Exception:
-
-            return "[Placeholder response due to generation failure]"
-
-
-
-    # ---------------------------
-
-    # Convenience wrappers
-
-    # ---------------------------
-
-
-
-
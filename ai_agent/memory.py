@@ -1,20 +1,100 @@
+import atexit
+import hashlib
 import json
 import os
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+import re
+from typing import Dict, List, Any, Optional, Tuple, Union
+from datetime import datetime, timedelta
 import logging
 
+from .memory_store import SQLiteMemoryStore, is_sqlite_location, merge_records, write_json_atomic
+
+# Categories keyed by function/diff/test that grow with use; the rest hold small aggregates
+DEFAULT_MAX_ENTRIES = {
+    "test_patterns": 2000,
+    "function_contexts": 1000,
+    "diff_patterns": 500,
+    "coverage_gaps": 500,
+    "function_fingerprints": 5000,
+    "mutation_results": 5000,
+}
+
+
+def _update_aggregate(aggregate: Dict[str, Any], value: float):
+    """Welford's running count, mean and M2 (sum of squared deviations)"""
+    aggregate["count"] = aggregate.get("count", 0) + 1
+    delta = value - aggregate.get("mean", 0.0)
+    aggregate["mean"] = aggregate.get("mean", 0.0) + delta / aggregate["count"]
+    aggregate["m2"] = aggregate.get("m2", 0.0) + delta * (value - aggregate["mean"])
+
+
+def _aggregate_of(values: List[float]) -> Dict[str, Any]:
+    aggregate = {"count": 0, "mean": 0.0, "m2": 0.0}
+    for value in values:
+        if value is not None:
+            _update_aggregate(aggregate, value)
+    return aggregate
+
+
+def test_pattern_key(function_name: str, function_signature: str, file_path: Optional[str] = None) -> str:
+    """Stable key for a test pattern: a digest of file, name and whitespace-normalized signature"""
+    # Whitespace only matters between two identifiers: ``f( x,  y )`` and ``f(x, y)`` are the same
+    signature = re.sub(r" (?=\W)|(?<=\W) ", "", " ".join((function_signature or "").split()))
+    normalized = f"{file_path or ''}::{function_name}::{signature}"
+    return f"{function_name}_{hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]}"
+
+
 class MemoryModule:
+    """Agent memory with bounded retention.
+
+    ``memory_file`` (default ``AI_AGENT_MEMORY`` or ``agent_memory.json``)
+    is either a JSON file owned by one process, or a SQLite database
+    (``*.db``/``*.sqlite`` or a ``sqlite:///path`` URL) that many agents
+    can share. With SQLite, writes are batched, and the rows other workers
+    commit or delete are pulled into the in-memory copy before lookups.
+
+    Entries in the growing categories expire after ``ttl_days`` without
+    being stored or read (``AI_AGENT_MEMORY_TTL_DAYS``, default 90, 0
+    disables). Each category also keeps at most ``max_entries`` records
+    (``AI_AGENT_MEMORY_MAX_ENTRIES`` caps every category), evicting the
+    least recently used. Dict order is the LRU order: storing or reading
+    an entry moves it to the end. Expired entries are compacted away
+    on load and at most daily while saving.
+    """
     
-    def __init__(self, memory_file: str = "agent_memory.json"):
-        self.memory_file = memory_file
+    def __init__(self, memory_file: Optional[str] = None, ttl_days: Optional[float] = None,
+                 max_entries: Optional[Union[int, Dict[str, int]]] = None):
+        self.memory_file = memory_file or os.environ.get("AI_AGENT_MEMORY", "agent_memory.json")
+        self.store = SQLiteMemoryStore(self.memory_file) if is_sqlite_location(self.memory_file) else None
+        if self.store is not None:
+            atexit.register(self.close)
+        if ttl_days is None:
+            ttl_days = float(os.environ.get("AI_AGENT_MEMORY_TTL_DAYS", 90))
+        self.ttl = timedelta(days=ttl_days) if ttl_days > 0 else None
+        if max_entries is None and os.environ.get("AI_AGENT_MEMORY_MAX_ENTRIES"):
+            max_entries = int(os.environ["AI_AGENT_MEMORY_MAX_ENTRIES"])
+        if isinstance(max_entries, int):
+            max_entries = {category: max_entries for category in DEFAULT_MAX_ENTRIES}
+        self.max_entries = {**DEFAULT_MAX_ENTRIES, **(max_entries or {})}
         self.memory = self._load_memory()
+        self._compacted_at = datetime.now()
+        self.compact()
     
     def _load_memory(self) -> Dict[str, Any]:
+        if self.store is not None:
+            memory = self.store.load()
+            for key, value in self._create_default_memory().items():
+                memory.setdefault(key, value)
+            return memory
         if os.path.exists(self.memory_file):
             try:
                 with open(self.memory_file, 'r') as f:
-                    return json.load(f)
+                    memory = json.load(f)
+                # Files written by older versions lack the newer categories
+                for key, value in self._create_default_memory().items():
+                    memory.setdefault(key, value)
+                self._migrate(memory)
+                return memory
             except Exception as e:
                 logging.error(f"Error loading memory: {e}")
                 return self._create_default_memory()
@@ -28,43 +108,208 @@ class MemoryModule:
             "diff_patterns": {},
             "coverage_gaps": {},
             "prompt_effectiveness": {},
+            "function_fingerprints": {},
+            "mutation_results": {},
+            "strategy_bandit": {},
             "last_updated": datetime.now().isoformat()
         }
     
+    def _migrate(self, memory: Dict[str, Any]):
+        # Older files kept every score in unbounded lists
+        for data in memory["prompt_effectiveness"].values():
+            if "quality_scores" in data:
+                data["quality"] = _aggregate_of(data.pop("quality_scores"))
+                data["coverage"] = _aggregate_of(data.pop("coverage_scores", []))
+    
+    def _entry_time(self, entry: Dict[str, Any]) -> Optional[datetime]:
+        for field in ("last_accessed", "updated_at", "created_at"):
+            if isinstance(entry, dict) and entry.get(field):
+                try:
+                    return datetime.fromisoformat(entry[field])
+                except (TypeError, ValueError):
+                    continue
+        return None
+    
+    def _put(self, category: str, key: str, entry: Dict[str, Any]):
+        entries = self.memory[category]
+        entries.pop(key, None)
+        entry.setdefault("last_accessed", datetime.now().isoformat())
+        entries[key] = entry
+        if self.store is not None:
+            self.store.put(category, key, entry)
+        self._evict(category)
+    
+    def _evict(self, category: str):
+        entries = self.memory[category]
+        limit = self.max_entries.get(category)
+        if limit is not None:
+            # Oldest-first order, so the front of the dict is least recently used
+            while len(entries) > limit:
+                del entries[next(iter(entries))]
+    
+    def _touch(self, category: str, key: str) -> Optional[Dict[str, Any]]:
+        self._refresh()
+        entries = self.memory[category]
+        entry = entries.pop(key, None)
+        if entry is None:
+            return None
+        entry["last_accessed"] = datetime.now().isoformat()
+        entries[key] = entry
+        if self.store is not None:
+            self.store.touch(category, key, entry["last_accessed"])
+        return entry
+    
+    def _merge(self, category: str, key: str, delta: Dict[str, Any]):
+        """Fold an aggregate update into an entry; shared stores merge it again on commit"""
+        self.memory[category][key] = merge_records(self.memory[category].get(key), delta)
+        if self.store is not None:
+            self.store.merge(category, key, delta)
+    
+    def _apply_merged(self, merged: Dict[Any, Any]):
+        # Committed aggregates include other workers' updates
+        for (category, key), value in merged.items():
+            self.memory.setdefault(category, {})[key] = value
+    
+    def _refresh(self):
+        """Pull entries that other agents sharing the store have committed"""
+        if self.store is None:
+            return
+        for category, key, value in self.store.pull():
+            if self.store.has_pending_put(category, key):
+                continue
+            pending = self.store.pending_merge(category, key)
+            entries = self.memory.setdefault(category, {})
+            entries.pop(key, None)
+            if value is None and not pending:
+                # Another agent deleted, trimmed or expired the entry
+                continue
+            entries[key] = merge_records(value or {}, pending) if pending else value
+            if category in self.max_entries:
+                self._evict(category)
+    
+    def _dedupe_test_patterns(self) -> Tuple[int, int]:
+        """Re-key test patterns to their stable key and merge duplicates; returns (merged, re-keyed)"""
+        entries = self.memory["test_patterns"]
+        rebuilt: Dict[str, Dict[str, Any]] = {}
+        rekeyed = 0
+        # Oldest first, so the most recently used duplicate wins
+        for key, entry in entries.items():
+            stable = test_pattern_key(entry.get("function_name", ""), entry.get("function_signature", ""),
+                                      entry.get("file_path"))
+            if stable in rebuilt:
+                previous = rebuilt.pop(stable)
+                entry = dict(entry,
+                             usage_count=previous.get("usage_count", 0) + entry.get("usage_count", 0),
+                             created_at=min(previous.get("created_at") or "", entry.get("created_at") or "")
+                             or entry.get("created_at"))
+            rebuilt[stable] = entry
+            if key != stable:
+                rekeyed += 1
+                if self.store is not None:
+                    self.store.delete("test_patterns", key)
+        if not rekeyed:
+            return 0, 0
+        if self.store is not None:
+            for stable, entry in rebuilt.items():
+                self.store.put("test_patterns", stable, entry)
+        self.memory["test_patterns"] = rebuilt
+        return len(entries) - len(rebuilt), rekeyed
+    
+    def compact(self, save: bool = True) -> Dict[str, int]:
+        """Merge duplicate test patterns, drop expired entries and trim categories to their limits.
+
+        Returns the number of entries removed per category.
+        """
+        removed = {}
+        merged, rekeyed = self._dedupe_test_patterns()
+        if merged:
+            removed["test_patterns"] = merged
+        self._compacted_at = datetime.now()
+        cutoff = self._compacted_at - self.ttl if self.ttl else None
+        for category, limit in self.max_entries.items():
+            entries = self.memory.get(category, {})
+            before = len(entries)
+            if cutoff is not None:
+                for key in [k for k, e in entries.items() if (self._entry_time(e) or cutoff) < cutoff]:
+                    del entries[key]
+            for key in list(entries)[:max(len(entries) - limit, 0)]:
+                del entries[key]
+            if len(entries) != before:
+                removed[category] = removed.get(category, 0) + before - len(entries)
+        if self.store is not None:
+            self.store.expire(self.max_entries, cutoff)
+        if removed or rekeyed:
+            logging.info(f"Compacted memory: removed {removed}, re-keyed {rekeyed} test patterns")
+            if save:
+                self._save_memory()
+        return removed
+    
     def _save_memory(self):
         try:
+            # Long-running processes (watch mode) expire entries without restarting
+            if datetime.now() - self._compacted_at > timedelta(days=1):
+                self.compact(save=False)
             self.memory["last_updated"] = datetime.now().isoformat()
-            with open(self.memory_file, 'w') as f:
-                json.dump(self.memory, f, indent=2)
+            if self.store is not None:
+                self._apply_merged(self.store.flush_if_due(self.max_entries))
+            else:
+                write_json_atomic(self.memory_file, self.memory)
         except Exception as e:
             logging.error(f"Error saving memory: {e}")
     
+    def flush(self):
+        """Write everything buffered so far (shared stores batch writes)"""
+        if self.store is None:
+            self._save_memory()
+            return
+        try:
+            self._apply_merged(self.store.flush(self.max_entries))
+        except Exception as e:
+            logging.error(f"Error flushing memory: {e}")
+    
+    def close(self):
+        if self.store is not None:
+            self.flush()
+    
     def store_test_pattern(self, function_name: str, function_signature: str, 
                           test_code: str, coverage_score: float = None, 
-                          mutation_score: float = None):
-        pattern_key = f"{function_name}_{hash(function_signature) % 10000}"
+                          mutation_score: float = None, file_path: Optional[str] = None):
+        """Insert or update the pattern for a function; its history (created_at, usage_count) is kept"""
+        self._refresh()
+        pattern_key = test_pattern_key(function_name, function_signature, file_path)
+        existing = self.memory["test_patterns"].get(pattern_key) or {}
+        now = datetime.now().isoformat()
         
-        self.memory["test_patterns"][pattern_key] = {
+        self._put("test_patterns", pattern_key, {
             "function_name": function_name,
             "function_signature": function_signature,
+            "file_path": file_path,
             "test_code": test_code,
             "coverage_score": coverage_score,
             "mutation_score": mutation_score,
-            "created_at": datetime.now().isoformat(),
-            "usage_count": 0
-        }
+            "created_at": existing.get("created_at", now),
+            "updated_at": now,
+            "last_accessed": now,
+            "usage_count": existing.get("usage_count", 0)
+        })
         self._save_memory()
     
     def get_similar_test_patterns(self, function_signature: str, limit: int = 3) -> List[Dict[str, Any]]:
+        self._refresh()
         similar_patterns = []
         
         for pattern_key, pattern in self.memory["test_patterns"].items():
             if self._calculate_signature_similarity(function_signature, pattern["function_signature"]) > 0.5:
-                similar_patterns.append(pattern)
+                similar_patterns.append((pattern_key, pattern))
         
-        similar_patterns.sort(key=lambda x: (x.get("usage_count", 0), x.get("coverage_score", 0)), reverse=True)
+        similar_patterns.sort(key=lambda x: (x[1].get("usage_count", 0), x[1].get("coverage_score") or 0), reverse=True)
         
-        return similar_patterns[:limit]
+        # Patterns that get reused are kept longest
+        for pattern_key, pattern in similar_patterns[:limit]:
+            pattern["usage_count"] = pattern.get("usage_count", 0) + 1
+            pattern["last_accessed"] = datetime.now().isoformat()
+            self._put("test_patterns", pattern_key, pattern)
+        return [pattern for _, pattern in similar_patterns[:limit]]
     
     def _calculate_signature_similarity(self, sig1: str, sig2: str) -> float:
         params1 = self._extract_parameter_types(sig1)
@@ -89,37 +334,76 @@ class MemoryModule:
     
     def store_function_context(self, function_name: str, file_path: str, 
                               diff_context: str, module_context: str = ""):
-        self.memory["function_contexts"][function_name] = {
+        self._put("function_contexts", function_name, {
             "file_path": file_path,
             "diff_context": diff_context,
             "module_context": module_context,
             "created_at": datetime.now().isoformat(),
             "last_accessed": datetime.now().isoformat()
-        }
+        })
         self._save_memory()
     
     def get_function_context(self, function_name: str) -> Optional[Dict[str, Any]]:
-        return self.memory["function_contexts"].get(function_name)
+        return self._touch("function_contexts", function_name)
+    
+    def _fingerprint_key(self, file_path: str, function_name: str, prompt_strategy: str, model_name: str) -> str:
+        return f"{model_name}:{prompt_strategy}:{file_path}::{function_name}"
+    
+    def store_function_fingerprint(self, file_path: str, function_name: str, prompt_strategy: str,
+                                   model_name: str, fingerprint: str, language: str, test_code: str):
+        """Remember the normalized fingerprint a function had when its test was generated"""
+        key = self._fingerprint_key(file_path, function_name, prompt_strategy, model_name)
+        self._put("function_fingerprints", key, {
+            "file_path": file_path,
+            "function_name": function_name,
+            "prompt_strategy": prompt_strategy,
+            "model_name": model_name,
+            "fingerprint": fingerprint,
+            "language": language,
+            "test_code": test_code,
+            "updated_at": datetime.now().isoformat()
+        })
+        self._save_memory()
+    
+    def get_function_fingerprint(self, file_path: str, function_name: str, prompt_strategy: str,
+                                 model_name: str) -> Optional[Dict[str, Any]]:
+        key = self._fingerprint_key(file_path, function_name, prompt_strategy, model_name)
+        return self._touch("function_fingerprints", key)
+    
+    def store_mutation_result(self, cache_key: str, result: Dict[str, Any]):
+        """Cache a mutation-testing outcome keyed by function fingerprint and test hash"""
+        self._put("mutation_results", cache_key, {
+            **{k: v for k, v in result.items() if k not in ("cached", "last_accessed")},
+            "created_at": datetime.now().isoformat()
+        })
+        self._save_memory()
+    
+    def get_mutation_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        result = self._touch("mutation_results", cache_key)
+        return {k: v for k, v in result.items() if k != "last_accessed"} if result else None
     
     def store_diff_pattern(self, diff_hash: str, diff_content: str, 
                           affected_functions: List[str], test_quality_score: float = None):
-        self.memory["diff_patterns"][diff_hash] = {
+        self._put("diff_patterns", diff_hash, {
             "diff_content": diff_content,
             "affected_functions": affected_functions,
             "test_quality_score": test_quality_score,
             "created_at": datetime.now().isoformat()
-        }
+        })
         self._save_memory()
     
     def get_similar_diff_patterns(self, diff_content: str, limit: int = 2) -> List[Dict[str, Any]]:
+        self._refresh()
         similar_patterns = []
         
         for diff_hash, pattern in self.memory["diff_patterns"].items():
             similarity = self._calculate_diff_similarity(diff_content, pattern["diff_content"])
             if similarity > 0.3:
-                similar_patterns.append({**pattern, "similarity": similarity})
+                similar_patterns.append({**pattern, "similarity": similarity, "diff_hash": diff_hash})
         
         similar_patterns.sort(key=lambda x: x["similarity"], reverse=True)
+        for pattern in similar_patterns[:limit]:
+            self._touch("diff_patterns", pattern.pop("diff_hash"))
         return similar_patterns[:limit]
     
     def _calculate_diff_similarity(self, diff1: str, diff2: str) -> float:
@@ -138,47 +422,59 @@ class MemoryModule:
     
     def store_coverage_gap(self, function_name: str, missing_coverage: List[str], 
                           test_suggestions: List[str]):
-        self.memory["coverage_gaps"][function_name] = {
+        self._put("coverage_gaps", function_name, {
             "missing_coverage": missing_coverage,
             "test_suggestions": test_suggestions,
             "created_at": datetime.now().isoformat(),
             "resolved": False
-        }
+        })
         self._save_memory()
     
     def get_coverage_gaps(self, function_name: str) -> Optional[Dict[str, Any]]:
-        return self.memory["coverage_gaps"].get(function_name)
+        return self._touch("coverage_gaps", function_name)
     
     def store_prompt_effectiveness(self, prompt_strategy: str, function_type: str, 
                                   quality_score: float, coverage_score: float):
         key = f"{prompt_strategy}_{function_type}"
         
-        if key not in self.memory["prompt_effectiveness"]:
-            self.memory["prompt_effectiveness"][key] = {
-                "quality_scores": [],
-                "coverage_scores": [],
-                "usage_count": 0
-            }
-        
-        self.memory["prompt_effectiveness"][key]["quality_scores"].append(quality_score)
-        self.memory["prompt_effectiveness"][key]["coverage_scores"].append(coverage_score)
-        self.memory["prompt_effectiveness"][key]["usage_count"] += 1
+        self._merge("prompt_effectiveness", key, {
+            "quality": _aggregate_of([quality_score]),
+            "coverage": _aggregate_of([coverage_score]),
+            "usage_count": 1
+        })
         
         self._save_memory()
     
     def get_best_prompt_strategy(self, function_type: str) -> str:
+        self._refresh()
         best_strategy = "diff-aware"
         best_score = 0.0
         
         for key, data in self.memory["prompt_effectiveness"].items():
-            if key.endswith(f"_{function_type}") and data["quality_scores"]:
-                avg_quality = sum(data["quality_scores"]) / len(data["quality_scores"])
+            if key.endswith(f"_{function_type}") and data["quality"]["count"]:
+                avg_quality = data["quality"]["mean"]
                 if avg_quality > best_score:
                     best_score = avg_quality
                     best_strategy = key.split("_")[0]
         
         return best_strategy
     
+    def record_strategy_outcome(self, context: str, strategy: str, reward: float, quality: float, seconds: float):
+        """Add one outcome to a strategy's running reward statistics for one bandit context"""
+        self._merge("strategy_bandit", context, {strategy: {
+            "count": 1, "mean": reward, "m2": 0.0, "quality_mean": quality, "seconds_mean": seconds,
+            "updated_at": datetime.now().isoformat()
+        }})
+        self._save_memory()
+    
+    def get_strategy_stats(self, context: str) -> Dict[str, Dict[str, Any]]:
+        self._refresh()
+        return self.memory["strategy_bandit"].get(context, {})
+    
+    def get_all_strategy_stats(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        self._refresh()
+        return self.memory["strategy_bandit"]
+    
     def get_insights(self) -> Dict[str, Any]:
         summary = self.get_memory_summary()
         
@@ -189,9 +485,9 @@ class MemoryModule:
         }
         
         for key, data in self.memory["prompt_effectiveness"].items():
-            if data["quality_scores"] and data["coverage_scores"]:
-                avg_quality = sum(data["quality_scores"]) / len(data["quality_scores"])
-                avg_coverage = sum(data["coverage_scores"]) / len(data["coverage_scores"])
+            if data["quality"]["count"] and data["coverage"]["count"]:
+                avg_quality = data["quality"]["mean"]
+                avg_coverage = data["coverage"]["mean"]
                 
                 strategy, function_type = key.split("_", 1)
                 if function_type not in insights["best_strategies"]:
@@ -206,15 +502,20 @@ class MemoryModule:
         return insights
     
     def get_memory_summary(self) -> Dict[str, Any]:
+        self._refresh()
         return {
             "total_test_patterns": len(self.memory["test_patterns"]),
             "total_function_contexts": len(self.memory["function_contexts"]),
             "total_diff_patterns": len(self.memory["diff_patterns"]),
             "total_coverage_gaps": len(self.memory["coverage_gaps"]),
             "total_prompt_strategies": len(self.memory["prompt_effectiveness"]),
+            "total_function_fingerprints": len(self.memory["function_fingerprints"]),
+            "total_bandit_contexts": len(self.memory["strategy_bandit"]),
             "last_updated": self.memory["last_updated"]
         }
     
     def clear(self):
         self.memory = self._create_default_memory()
+        if self.store is not None:
+            self.store.clear()
         self._save_memory()
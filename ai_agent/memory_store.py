@@ -0,0 +1,331 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+
+def merge_records(base: Any, delta: Any) -> Any:
+    """Fold ``delta`` into ``base``.
+
+    Dicts with ``count``/``mean``/``m2`` are running aggregates, combined
+    with Chan et al.'s parallel algorithm. Other ``*_mean`` fields next to
+    them are count-weighted. ``usage_count`` adds up. Nested dicts merge
+    recursively, and any other value in ``delta`` replaces the one in ``base``.
+    Merging is associative, so deltas from several writers can be
+    combined in any order.
+    """
+    if not isinstance(base, dict) or not isinstance(delta, dict):
+        return json.loads(json.dumps(delta))
+    result = dict(base)
+    if "count" in delta and "mean" in delta:
+        n_a, n_b = base.get("count", 0), delta["count"]
+        n = n_a + n_b
+        if n_b:
+            mean_a, mean_b = base.get("mean", 0.0), delta["mean"]
+            diff = mean_b - mean_a
+            result["mean"] = mean_a + diff * n_b / n
+            result["m2"] = base.get("m2", 0.0) + delta.get("m2", 0.0) + diff * diff * n_a * n_b / n
+            for key, value in delta.items():
+                if key.endswith("_mean"):
+                    result[key] = (n_a * base.get(key, 0.0) + n_b * value) / n
+                elif key not in ("count", "mean", "m2"):
+                    result[key] = value
+        result["count"] = n
+        return result
+    for key, value in delta.items():
+        if key == "usage_count":
+            result[key] = base.get(key, 0) + value
+        elif isinstance(value, dict):
+            result[key] = merge_records(base.get(key), value)
+        else:
+            result[key] = value
+    return result
+
+
+def is_sqlite_location(location: str) -> bool:
+    return location.startswith("sqlite://") or location.lower().endswith(SQLITE_SUFFIXES)
+
+
+def write_json_atomic(path: str, data: Dict[str, Any]):
+    """Replace ``path`` in one rename so a concurrent reader never sees a half-written file"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".memory-", suffix=".json", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class SQLiteMemoryStore:
+    """A memory file that many agent processes can share.
+
+    Each entry is one row ``(category, key, value JSON)``. The database
+    runs in WAL mode, so readers never block the single writer, and
+    ``busy_timeout`` queues writers. Writes are buffered and committed in
+    batches of ``batch_size`` operations, or after ``flush_interval``
+    seconds. Every commit takes a new sequence number, which lets each
+    agent pull only the rows other workers changed since its last sync.
+    Deleted, trimmed and expired rows leave a tombstone in ``deleted`` at
+    the sequence number that removed them, so pulls propagate removals
+    too; tombstones are dropped once older than the expiry cutoff.
+    Aggregates are queued as deltas and merged with ``merge_records``
+    inside the write transaction, so concurrent counters are never lost.
+    """
+
+    shared = True
+
+    def __init__(self, location: str, batch_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 sync_interval: Optional[float] = None, busy_timeout_ms: int = 30000):
+        self.path = location[len("sqlite:///"):] if location.startswith("sqlite:///") else location
+        self.batch_size = batch_size or int(os.environ.get("AI_AGENT_MEMORY_BATCH", 32))
+        self.flush_interval = (flush_interval if flush_interval is not None
+                               else float(os.environ.get("AI_AGENT_MEMORY_FLUSH_S", 2.0)))
+        self.sync_interval = (sync_interval if sync_interval is not None
+                              else float(os.environ.get("AI_AGENT_MEMORY_SYNC_S", 1.0)))
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, timeout=busy_timeout_ms / 1000, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                category TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                last_accessed TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                PRIMARY KEY (category, key)
+            );
+            CREATE INDEX IF NOT EXISTS entries_lru ON entries (category, last_accessed);
+            CREATE INDEX IF NOT EXISTS entries_seq ON entries (seq);
+            CREATE TABLE IF NOT EXISTS deleted (
+                category TEXT NOT NULL,
+                key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                deleted_at TEXT NOT NULL,
+                PRIMARY KEY (category, key)
+            );
+            CREATE INDEX IF NOT EXISTS deleted_seq ON deleted (seq);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO meta (name, value) VALUES ('seq', 0);
+        """)
+        self._puts: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._merges: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._touches: Dict[Tuple[str, str], str] = {}
+        self._deletes: Set[Tuple[str, str]] = set()
+        self._seen_seq = 0
+        self._last_flush = time.monotonic()
+        self._last_sync = time.monotonic()
+
+    def _operations(self) -> int:
+        return len(self._puts) + len(self._merges) + len(self._touches) + len(self._deletes)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            # One read transaction, so the rows and the sequence number are the same snapshot
+            self._conn.execute("BEGIN")
+            try:
+                rows = self._conn.execute(
+                    "SELECT category, key, value FROM entries ORDER BY category, last_accessed"
+                ).fetchall()
+                self._seen_seq = self._conn.execute("SELECT value FROM meta WHERE name = 'seq'").fetchone()[0]
+            finally:
+                self._conn.execute("COMMIT")
+        memory: Dict[str, Dict[str, Any]] = {}
+        for category, key, value in rows:
+            memory.setdefault(category, {})[key] = json.loads(value)
+        self._last_sync = time.monotonic()
+        return memory
+
+    def put(self, category: str, key: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._puts[(category, key)] = entry
+            self._touches.pop((category, key), None)
+            self._deletes.discard((category, key))
+
+    def delete(self, category: str, key: str):
+        with self._lock:
+            self._puts.pop((category, key), None)
+            self._touches.pop((category, key), None)
+            self._deletes.add((category, key))
+
+    def merge(self, category: str, key: str, delta: Dict[str, Any]):
+        with self._lock:
+            self._merges[(category, key)] = merge_records(self._merges.get((category, key), {}), delta)
+
+    def touch(self, category: str, key: str, accessed_at: str):
+        with self._lock:
+            if (category, key) not in self._puts:
+                self._touches[(category, key)] = accessed_at
+
+    def pending_merge(self, category: str, key: str) -> Optional[Dict[str, Any]]:
+        return self._merges.get((category, key))
+
+    def has_pending_put(self, category: str, key: str) -> bool:
+        return (category, key) in self._puts
+
+    def flush_if_due(self, limits: Dict[str, int]) -> Dict[Tuple[str, str], Any]:
+        if (self._operations() >= self.batch_size
+                or (self._operations() and time.monotonic() - self._last_flush >= self.flush_interval)):
+            return self.flush(limits)
+        return {}
+
+    def flush(self, limits: Optional[Dict[str, int]] = None) -> Dict[Tuple[str, str], Any]:
+        """Commit buffered writes in one transaction; returns the merged aggregate values"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._operations():
+                return {}
+            now = datetime.now().isoformat()
+            merged = {}
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._next_seq()
+                for category, key in self._deletes:
+                    self._remove("category = ? AND key = ?", (category, key), seq, now)
+                for (category, key), entry in self._puts.items():
+                    self._upsert(category, key, entry, seq, now)
+                for (category, key), delta in self._merges.items():
+                    row = conn.execute("SELECT value FROM entries WHERE category = ? AND key = ?",
+                                       (category, key)).fetchone()
+                    value = merge_records(json.loads(row[0]) if row else {}, delta)
+                    self._upsert(category, key, value, seq, now)
+                    merged[(category, key)] = value
+                conn.executemany(
+                    "UPDATE entries SET last_accessed = ? WHERE category = ? AND key = ?",
+                    [(accessed_at, category, key) for (category, key), accessed_at in self._touches.items()],
+                )
+                for category in {category for category, _ in self._puts}:
+                    if limits and category in limits:
+                        self._trim(category, limits[category], seq, now)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._committed(seq)
+            self._puts.clear()
+            self._merges.clear()
+            self._touches.clear()
+            self._deletes.clear()
+            return merged
+
+    def _upsert(self, category: str, key: str, value: Dict[str, Any], seq: int, now: str):
+        accessed = value.get("last_accessed") or value.get("updated_at") or value.get("created_at") or now
+        self._conn.execute(
+            "INSERT INTO entries (category, key, value, last_accessed, seq) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (category, key) DO UPDATE SET value = excluded.value, "
+            "last_accessed = excluded.last_accessed, seq = excluded.seq",
+            (category, key, json.dumps(value), accessed, seq),
+        )
+        self._conn.execute("DELETE FROM deleted WHERE category = ? AND key = ?", (category, key))
+
+    def _next_seq(self) -> int:
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'seq'")
+        return self._conn.execute("SELECT value FROM meta WHERE name = 'seq'").fetchone()[0]
+
+    def _committed(self, seq: int):
+        # Skip our own commit on the next pull, unless another writer committed since our last sync
+        if seq == self._seen_seq + 1:
+            self._seen_seq = seq
+
+    def _remove(self, where: str, params: Tuple, seq: int, now: str) -> int:
+        """Delete the matching entries and leave tombstones for other agents to pull"""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO deleted (category, key, seq, deleted_at) "
+            f"SELECT category, key, ?, ? FROM entries WHERE {where}", (seq, now, *params),
+        )
+        return self._conn.execute(f"DELETE FROM entries WHERE {where}", params).rowcount
+
+    def _trim(self, category: str, limit: int, seq: int, now: str) -> int:
+        return self._remove(
+            "category = ? AND key IN ("
+            "SELECT key FROM entries WHERE category = ? ORDER BY last_accessed DESC LIMIT -1 OFFSET ?)",
+            (category, category, limit), seq, now,
+        )
+
+    def pull(self, force: bool = False) -> List[Tuple[str, str, Optional[Dict[str, Any]]]]:
+        """Rows other writers committed since the last sync (rate-limited to ``sync_interval``).
+
+        Deleted rows come back with a value of None.
+        """
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return []
+        with self._lock:
+            self._last_sync = time.monotonic()
+            rows = self._conn.execute(
+                "SELECT category, key, value, seq FROM entries WHERE seq > ? "
+                "UNION ALL SELECT category, key, NULL, seq FROM deleted WHERE seq > ? ORDER BY seq",
+                (self._seen_seq, self._seen_seq),
+            ).fetchall()
+        changes = []
+        for category, key, value, seq in rows:
+            self._seen_seq = max(self._seen_seq, seq)
+            changes.append((category, key, json.loads(value) if value is not None else None))
+        return changes
+
+    def expire(self, limits: Dict[str, int], cutoff: Optional[datetime]) -> int:
+        """Drop entries older than ``cutoff`` and beyond each category's limit"""
+        now = datetime.now().isoformat()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._next_seq()
+                removed = 0
+                for category, limit in limits.items():
+                    if cutoff is not None:
+                        removed += self._remove("category = ? AND last_accessed < ?",
+                                                (category, cutoff.isoformat()), seq, now)
+                    removed += self._trim(category, limit, seq, now)
+                pruned = 0
+                if cutoff is not None:
+                    pruned = self._conn.execute("DELETE FROM deleted WHERE deleted_at < ?",
+                                                (cutoff.isoformat(),)).rowcount
+                # A no-op pass gives its sequence number back, so it does not look like another writer's commit
+                self._conn.execute("COMMIT" if removed or pruned else "ROLLBACK")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            if removed or pruned:
+                self._committed(seq)
+        if removed:
+            logging.info(f"Expired {removed} shared memory entries in {self.path}")
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._puts.clear()
+            self._merges.clear()
+            self._touches.clear()
+            self._deletes.clear()
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = self._next_seq()
+                self._remove("1", (), seq, datetime.now().isoformat())
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._committed(seq)
+
+    def close(self):
+        with self._lock:
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error(f"Error flushing memory to {self.path}: {e}")
+            self._conn.close()
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .resilience import percentile
+
+# Span attributes that are summed in the summary table
+_TOKEN_FIELDS = ("tokens_in", "tokens_out")
+
+# Spans kept in memory for inspection; every span still goes to the JSONL file
+MAX_SPANS = 10000
+# Recent durations per stage used for the p95 column
+PERCENTILE_WINDOW = 1000
+
+
+class MetricsRecorder:
+    """Records timed pipeline stages as structured spans and writes them as JSONL.
+
+    Each span carries the stage name, its duration, any attributes (token
+    counts, retry counts, sizes) and the labels active on the current thread,
+    e.g. ``pr``, ``strategy``, ``file`` and ``function``::
+
+        with metrics.labels(pr="fastapi/PR_1", strategy="naive"):
+            with metrics.span("prompt_build") as span:
+                span["prompt_chars"] = len(prompt)
+
+    Only the latest ``max_spans`` spans stay in memory so long watch and batch
+    runs do not grow without bound; the summary table is built from running
+    per-stage totals and stays exact.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_spans: int = MAX_SPANS):
+        self.path = path
+        self.spans: Deque[Dict[str, Any]] = deque(maxlen=max_spans)
+        self._stages: Dict[str, Dict[str, Any]] = {}
+        self.counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], int] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def configure(self, path: Optional[str]):
+        """Start writing spans to ``path`` (appending); None keeps them in memory only"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.path = path
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._file = open(path, "a", encoding="utf-8")
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self._stages = {}
+            self.counters = {}
+
+    def _labels(self) -> Dict[str, Any]:
+        merged: Dict[str, Any] = {}
+        for labels in getattr(self._local, "stack", []):
+            merged.update(labels)
+        return merged
+
+    @contextmanager
+    def labels(self, **labels) -> Iterator[None]:
+        """Attach labels to every span recorded on this thread inside the block"""
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append({k: v for k, v in labels.items() if v is not None})
+        try:
+            yield
+        finally:
+            stack.pop()
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[Dict[str, Any]]:
+        """Time a stage; the yielded dict can be filled with attributes while it runs"""
+        started = time.monotonic()
+        error = None
+        try:
+            yield attrs
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if error:
+                attrs["error"] = error[:200]
+            self.record(stage, time.monotonic() - started, **attrs)
+
+    def record(self, stage: str, duration: float, **attrs):
+        """Record an already-timed stage (e.g. prefill time reported by the backend)"""
+        span = {"ts": round(time.time(), 3), "stage": stage, "duration_s": round(duration, 4)}
+        span.update(self._labels())
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+            self._aggregate(span)
+            if self._file is not None:
+                self._file.write(json.dumps(span, default=str) + "\n")
+                self._file.flush()
+
+    def _aggregate(self, span: Dict[str, Any]):
+        stage = self._stages.get(span["stage"])
+        if stage is None:
+            stage = self._stages[span["stage"]] = {
+                "count": 0, "total_s": 0.0, "errors": 0, "durations": deque(maxlen=PERCENTILE_WINDOW),
+                **{field: 0 for field in _TOKEN_FIELDS},
+            }
+        stage["count"] += 1
+        stage["total_s"] += span["duration_s"]
+        stage["durations"].append(span["duration_s"])
+        stage["errors"] += "error" in span
+        for field in _TOKEN_FIELDS:
+            try:
+                stage[field] += int(span.get(field) or 0)
+            except (TypeError, ValueError):
+                pass
+
+    def increment(self, name: str, amount: int = 1):
+        """Bump a counter (e.g. cache hits) under the labels active on this thread"""
+        key = (name, tuple(sorted((k, str(v)) for k, v in self._labels().items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def counter(self, name: str, **labels) -> int:
+        """Total of a counter over every label set that includes ``labels``"""
+        wanted = {(k, str(v)) for k, v in labels.items()}
+        with self._lock:
+            return sum(count for (counter_name, key_labels), count in self.counters.items()
+                       if counter_name == name and wanted.issubset(key_labels))
+
+    def spans_for(self, stage: str, **labels) -> List[Dict[str, Any]]:
+        """Recorded spans of one stage whose labels/attributes match ``labels``"""
+        with self._lock:
+            return [span for span in self.spans
+                    if span["stage"] == stage and all(span.get(k) == v for k, v in labels.items())]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-stage totals, ordered by total time spent; p95 covers the latest PERCENTILE_WINDOW spans"""
+        rows = []
+        with self._lock:
+            for stage, totals in self._stages.items():
+                row = {
+                    "stage": stage,
+                    "count": totals["count"],
+                    "total_s": round(totals["total_s"], 3),
+                    "mean_s": round(totals["total_s"] / totals["count"], 4),
+                    "p95_s": round(percentile(list(totals["durations"]), 95), 4),
+                    "errors": totals["errors"],
+                }
+                for field in _TOKEN_FIELDS:
+                    row[field] = totals[field]
+                rows.append(row)
+        return sorted(rows, key=lambda row: -row["total_s"])
+
+    def format_summary(self) -> str:
+        rows = self.summary()
+        if not rows:
+            return "No metrics recorded."
+        header = f"{'Stage':<22}{'Count':>7}{'Total s':>10}{'Mean s':>10}{'p95 s':>10}{'Tok in':>10}{'Tok out':>10}{'Errors':>8}"
+        lines = [header, "-" * len(header)]
+        for row in rows:
+            lines.append(
+                f"{row['stage']:<22}{row['count']:>7}{row['total_s']:>10.2f}{row['mean_s']:>10.3f}"
+                f"{row['p95_s']:>10.3f}{row['tokens_in']:>10}{row['tokens_out']:>10}{row['errors']:>8}"
+            )
+        return "\n".join(lines)
+
+
+# Shared recorder used by the agent, generator and LLM wrappers
+metrics = MetricsRecorder()
+metrics.configure(os.environ.get("AI_AGENT_METRICS_FILE") or None)
@@ -0,0 +1,210 @@
+import ast
+import copy
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .executor import TestExecutor
+from .fingerprint import function_fingerprint
+from .metrics import metrics
+
+MUTATION_VERSION = 1
+
+_BINOP_SWAPS = {
+    ast.Add: ast.Sub, ast.Sub: ast.Add, ast.Mult: ast.Div, ast.Div: ast.Mult, ast.FloorDiv: ast.Mult,
+    ast.Mod: ast.FloorDiv, ast.Pow: ast.Mult, ast.BitAnd: ast.BitOr, ast.BitOr: ast.BitAnd,
+    ast.LShift: ast.RShift, ast.RShift: ast.LShift,
+}
+_COMPARE_SWAPS = {
+    ast.Lt: ast.GtE, ast.GtE: ast.Lt, ast.Gt: ast.LtE, ast.LtE: ast.Gt, ast.Eq: ast.NotEq, ast.NotEq: ast.Eq,
+    ast.Is: ast.IsNot, ast.IsNot: ast.Is, ast.In: ast.NotIn, ast.NotIn: ast.In,
+}
+# Off-by-one boundary mutations
+_BOUNDARY_SWAPS = {ast.Lt: ast.LtE, ast.LtE: ast.Lt, ast.Gt: ast.GtE, ast.GtE: ast.Gt}
+
+
+class Mutant(NamedTuple):
+    description: str
+    lineno: int
+    source: str
+
+
+def _mutations(node: ast.AST, parent: Optional[ast.AST]) -> List[Tuple[str, Callable[[], None]]]:
+    """(description, apply) pairs for one node; ``apply`` edits the node in place"""
+    found = []
+    if isinstance(node, (ast.BinOp, ast.AugAssign)) and type(node.op) in _BINOP_SWAPS:
+        new_op = _BINOP_SWAPS[type(node.op)]
+        found.append((f"{type(node.op).__name__} -> {new_op.__name__}", lambda: setattr(node, "op", new_op())))
+    elif isinstance(node, ast.Compare):
+        for i, op in enumerate(node.ops):
+            for swaps in (_COMPARE_SWAPS, _BOUNDARY_SWAPS):
+                if type(op) in swaps:
+                    new_op = swaps[type(op)]
+                    found.append((f"{type(op).__name__} -> {new_op.__name__}",
+                                  lambda i=i, new_op=new_op: node.ops.__setitem__(i, new_op())))
+    elif isinstance(node, ast.BoolOp):
+        new_op = ast.Or if isinstance(node.op, ast.And) else ast.And
+        found.append((f"{type(node.op).__name__} -> {new_op.__name__}", lambda: setattr(node, "op", new_op())))
+    elif isinstance(node, (ast.If, ast.While)):
+        found.append(("negate condition", lambda: setattr(node, "test", ast.UnaryOp(op=ast.Not(), operand=node.test))))
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        found.append(("remove not", lambda: _replace_not(node)))
+    elif isinstance(node, ast.Return) and node.value is not None and not (
+            isinstance(node.value, ast.Constant) and node.value.value is None):
+        found.append(("return None", lambda: setattr(node, "value", ast.Constant(value=None))))
+    elif isinstance(node, ast.Constant) and not isinstance(parent, ast.Expr):
+        value = node.value
+        if isinstance(value, bool):
+            found.append((f"{value} -> {not value}", lambda: setattr(node, "value", not value)))
+        elif isinstance(value, (int, float)):
+            found.append((f"{value!r} -> {value + 1!r}", lambda: setattr(node, "value", value + 1)))
+        elif isinstance(value, str) and value:
+            found.append(("string -> ''", lambda: setattr(node, "value", "")))
+    return found
+
+
+def _replace_not(node: ast.UnaryOp):
+    # ``not x`` -> ``bool(x)``; keeps the node in place so no parent rewiring is needed
+    node.op = ast.UAdd()
+    node.operand = ast.Call(func=ast.Name(id="bool", ctx=ast.Load()), args=[node.operand], keywords=[])
+
+
+def _find_function(tree: ast.AST, function_name: str) -> Optional[ast.AST]:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == function_name:
+            return node
+    return None
+
+
+def _mutation_points(function_node: ast.AST) -> List[Tuple[int, int, str, int]]:
+    """(node index, mutation index, description, line) for every mutation inside the function body"""
+    parents = {child: node for node in ast.walk(function_node) for child in ast.iter_child_nodes(node)}
+    points = []
+    for index, node in enumerate(ast.walk(function_node)):
+        # Decorators, defaults and annotations run at import time, not when the function is called
+        if node is not function_node and _inside_signature(node, function_node, parents):
+            continue
+        for mutation_index, (description, _) in enumerate(_mutations(node, parents.get(node))):
+            points.append((index, mutation_index, description, getattr(node, "lineno", 0)))
+    return points
+
+
+def _inside_signature(node: ast.AST, function_node: ast.AST, parents: Dict[ast.AST, ast.AST]) -> bool:
+    body = set(map(id, function_node.body))
+    while node in parents:
+        if id(node) in body:
+            return False
+        node = parents[node]
+    return True
+
+
+def generate_mutants(source: str, function_name: str, max_mutants: Optional[int] = None) -> List[Mutant]:
+    """Single-mutation variants of ``source`` with ``function_name`` mutated (evenly sampled if capped)"""
+    tree = ast.parse(source)
+    function_node = _find_function(tree, function_name)
+    if function_node is None:
+        return []
+    points = _mutation_points(function_node)
+    if max_mutants and len(points) > max_mutants:
+        step = len(points) / max_mutants
+        points = [points[int(i * step)] for i in range(max_mutants)]
+
+    mutants = []
+    for node_index, mutation_index, description, lineno in points:
+        mutated_tree = copy.deepcopy(tree)
+        node = list(ast.walk(_find_function(mutated_tree, function_name)))[node_index]
+        parents = {child: parent for parent in ast.walk(mutated_tree) for child in ast.iter_child_nodes(parent)}
+        _mutations(node, parents.get(node))[mutation_index][1]()
+        try:
+            mutated = ast.unparse(ast.fix_missing_locations(mutated_tree))
+        except Exception as e:
+            logging.debug(f"Skipping mutant '{description}' at line {lineno}: {e}")
+            continue
+        mutants.append(Mutant(description, lineno, mutated))
+    return mutants
+
+
+class MutationTester:
+    """Mutation score of a generated test for one Python function.
+
+    Mutants of the function (one AST edit each: swapped operators and
+    comparisons, negated conditions, changed constants, ``return None``)
+    are run against the test in parallel with the sandboxed executor's
+    subprocesses. Each run stops at the first failing test, since one
+    failure is enough to kill a mutant. The test must pass on the
+    unmutated source first, otherwise no score is given. Results are
+    cached in memory under the function fingerprint plus a hash of the
+    test, so unchanged pairs are never re-run.
+    """
+
+    def __init__(self, memory=None, max_mutants: Optional[int] = None, max_workers: Optional[int] = None,
+                 timeout: float = 30.0):
+        self.memory = memory
+        self.max_mutants = max_mutants or int(os.environ.get("AI_AGENT_MAX_MUTANTS", 25))
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.timeout = timeout
+
+    @staticmethod
+    def cache_key(function_code: str, test_code: str) -> str:
+        test_hash = hashlib.sha256(test_code.encode("utf-8")).hexdigest()
+        return f"v{MUTATION_VERSION}:{function_fingerprint(function_code, 'python')}:{test_hash}"
+
+    def run(self, sources: Dict[str, str], target_path: str, function_name: str, test_code: str,
+            function_code: Optional[str] = None, test_name: str = "test_generated.py") -> Optional[Dict[str, Any]]:
+        """Mutate ``function_name`` in ``sources[target_path]`` and run ``test_code`` against each mutant"""
+        source = sources.get(target_path)
+        if not source:
+            return None
+        key = self.cache_key(function_code or f"{target_path}::{function_name}\n{source}", test_code)
+        if self.memory is not None:
+            cached = self.memory.get_mutation_result(key)
+            if cached is not None:
+                metrics.increment("mutation_cache_hit")
+                return dict(cached, cached=True)
+
+        with metrics.span("mutation_testing", function=function_name) as span:
+            result = self._run(sources, target_path, function_name, test_code, test_name, source)
+            span.update({k: result[k] for k in ("mutants", "killed", "baseline_status") if k in result})
+        if self.memory is not None and result["baseline_status"] == "passed":
+            self.memory.store_mutation_result(key, result)
+        return dict(result, cached=False)
+
+    def _run(self, sources, target_path, function_name, test_code, test_name, source) -> Dict[str, Any]:
+        baseline = TestExecutor(timeout=self.timeout).run_test(test_name, test_code, sources)
+        result = {"baseline_status": baseline["status"], "score": None, "mutants": 0, "killed": 0,
+                  "timeouts": 0, "survivors": []}
+        if baseline["status"] != "passed":
+            return result
+
+        try:
+            mutants = generate_mutants(source, function_name, self.max_mutants)
+        except SyntaxError as e:
+            logging.warning(f"Cannot mutate {target_path}: {e}")
+            return result
+        if not mutants:
+            return result
+
+        # Mutants that loop forever are killed by a timeout scaled from the passing run
+        executor = TestExecutor(timeout=min(self.timeout, max(2.0, 3 * baseline["duration_s"] + 1)), fail_fast=True)
+
+        def run_mutant(mutant: Mutant) -> Tuple[Mutant, str]:
+            mutated_sources = dict(sources, **{target_path: mutant.source})
+            return mutant, executor.run_test(test_name, test_code, mutated_sources)["status"]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            outcomes = list(pool.map(run_mutant, mutants))
+
+        for mutant, status in outcomes:
+            if status == "no_tests":
+                continue
+            result["mutants"] += 1
+            if status == "passed":
+                result["survivors"].append(f"line {mutant.lineno}: {mutant.description}")
+            else:
+                result["killed"] += 1
+                result["timeouts"] += status == "timeout"
+        if result["mutants"]:
+            result["score"] = result["killed"] / result["mutants"]
+        return result
@@ -0,0 +1,223 @@
+import cProfile
+import html
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_MODES = ("sample", "cprofile")
+
+Stack = Tuple[str, ...]
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename
+    marker = "site-packages" + os.sep
+    if marker in path:
+        path = path.split(marker, 1)[1]
+    else:
+        try:
+            relative = os.path.relpath(path)
+            if not relative.startswith(".."):
+                path = relative
+        except ValueError:
+            pass
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+class PipelineProfiler:
+    """Profiles a block of work, e.g. one PR/strategy run.
+
+    ``sample`` mode (the default) runs a background thread that snapshots the
+    profiled thread's stack every ``interval`` seconds via
+    ``sys._current_frames``, like py-spy but in-process. It has low overhead
+    and shows where wall-clock time goes, including time spent waiting on the
+    LLM. The samples are written as collapsed stacks (``flamegraph.pl`` /
+    speedscope input) and as a standalone SVG flamegraph. ``cprofile`` mode
+    uses the deterministic profiler and writes a ``.prof`` file for pstats or
+    snakeviz.
+    """
+
+    def __init__(self, mode: str = "sample", interval: float = 0.005, all_threads: bool = False):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}', expected one of {PROFILE_MODES}")
+        self.mode = mode
+        self.interval = interval
+        self.all_threads = all_threads
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.wall_seconds = 0.0
+        self._target_thread: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._started: Optional[float] = None
+
+    def __enter__(self) -> "PipelineProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._started = time.perf_counter()
+        if self.mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            return
+        self._target_thread = threading.get_ident()
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        if self._started is None:
+            return
+        if self.mode == "cprofile":
+            self._cprofile.disable()
+        else:
+            self._stop.set()
+            self._sampler.join()
+        self.wall_seconds = time.perf_counter() - self._started
+        self._started = None
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, frame in frames.items():
+                if thread_id == own or (not self.all_threads and thread_id != self._target_thread):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.reverse()
+                if self.all_threads:
+                    if thread_id not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack.insert(0, f"thread {names.get(thread_id, thread_id)}")
+                self.stacks[tuple(stack)] += 1
+            self.samples += 1
+
+    # ---------------------------
+    # Results
+    # ---------------------------
+    def top_functions(self, n: int = 15) -> List[Dict[str, float]]:
+        """Functions with the most self time, with their inclusive (total) time"""
+        if self.mode == "cprofile":
+            stats = pstats.Stats(self._cprofile)
+            rows = []
+            for (filename, line, name), (_, calls, self_time, total_time, _) in stats.stats.items():
+                rows.append({
+                    "function": f"{name} ({filename}:{line})",
+                    "self_s": self_time,
+                    "total_s": total_time,
+                    "calls": calls,
+                })
+            return sorted(rows, key=lambda row: -row["self_s"])[:n]
+
+        seconds_per_sample = self.wall_seconds / self.samples if self.samples else self.interval
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+        return [
+            {
+                "function": label,
+                "self_s": count * seconds_per_sample,
+                "total_s": total_counts[label] * seconds_per_sample,
+                "self_pct": 100.0 * count / max(self.samples, 1),
+            }
+            for label, count in self_counts.most_common(n)
+        ]
+
+    def format_top(self, n: int = 15) -> str:
+        rows = self.top_functions(n)
+        if not rows:
+            return "No profile samples collected."
+        lines = [f"{'Self s':>9}{'Total s':>9}  Function", "-" * 60]
+        for row in rows:
+            lines.append(f"{row['self_s']:>9.3f}{row['total_s']:>9.3f}  {row['function']}")
+        return "\n".join(lines)
+
+    def write(self, output_dir: str, name: str = "profile", top_n: int = 15) -> List[str]:
+        """Write the profile next to a run's outputs and return the file paths"""
+        os.makedirs(output_dir, exist_ok=True)
+        base = os.path.join(output_dir, name)
+        written = []
+        if self.mode == "cprofile":
+            self._cprofile.dump_stats(f"{base}.prof")
+            written.append(f"{base}.prof")
+        else:
+            with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+                for stack, count in sorted(self.stacks.items()):
+                    f.write(f"{';'.join(stack)} {count}\n")
+            written.append(f"{base}.collapsed")
+            with open(f"{base}.svg", "w", encoding="utf-8") as f:
+                f.write(render_flamegraph(self.stacks, title=f"{name} ({self.wall_seconds:.1f}s, {self.samples} samples)"))
+            written.append(f"{base}.svg")
+        with open(f"{base}_top.txt", "w", encoding="utf-8") as f:
+            f.write(self.format_top(top_n) + "\n")
+        written.append(f"{base}_top.txt")
+        logging.info(f"Profile written to {', '.join(written)}")
+        return written
+
+
+def render_flamegraph(stacks: Dict[Stack, int], title: str = "profile", width: int = 1200,
+                      row_height: int = 16) -> str:
+    """Render collapsed stacks as a standalone SVG flamegraph (root at the bottom)"""
+    tree: Dict = {"count": 0, "children": {}}
+    for stack, count in stacks.items():
+        node = tree
+        node["count"] += count
+        for label in stack:
+            node = node["children"].setdefault(label, {"count": 0, "children": {}})
+            node["count"] += count
+
+    total = tree["count"] or 1
+    depth = _tree_depth(tree)
+    height = (depth + 2) * row_height + 30
+    rects: List[str] = []
+
+    def draw(node: Dict, x: float, level: int):
+        for label, child in sorted(node["children"].items()):
+            w = width * child["count"] / total
+            if w >= 0.5:
+                y = height - (level + 1) * row_height - 10
+                hue = 10 + zlib.crc32(label.encode("utf-8")) % 40
+                pct = 100.0 * child["count"] / total
+                # Roughly 7px per monospace character at this font size
+                chars = int(w / 7)
+                shown = label if len(label) <= chars else (label[:chars - 2] + ".." if chars > 3 else "")
+                rects.append(
+                    f'<g><title>{html.escape(label)} ({child["count"]} samples, {pct:.1f}%)</title>'
+                    f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row_height - 1}" '
+                    f'fill="hsl({hue},85%,60%)" rx="2"/>'
+                    f'<text x="{x + 3:.1f}" y="{y + row_height - 4}">{html.escape(shown)}</text></g>'
+                )
+                draw(child, x, level + 1)
+            x += w
+
+    draw(tree, 0.0, 0)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="monospace" font-size="11">'
+        f'<text x="{width / 2}" y="16" text-anchor="middle" font-size="14">{html.escape(title)}</text>'
+        + "".join(rects) + "</svg>\n"
+    )
+
+
+def _tree_depth(node: Dict) -> int:
+    if not node["children"]:
+        return 0
+    return 1 + max(_tree_depth(child) for child in node["children"].values())
@@ -17,6 +17,7 @@ class PromptTemplates:
         diff_patch = enhanced_context.get('diff_patch', '')
         imports = enhanced_context.get('imports', [])
         full_content = enhanced_context.get('full_content', '')
+        related_files = enhanced_context.get('related_files', [])
         
         # Get primary test framework
         test_frameworks = enhanced_context.get('test_frameworks', [])
@@ -101,6 +102,9 @@ CHANGES MADE (from diff):
 EXACT IMPORTS FROM SOURCE FILE (USE THESE AS BASE):
 {chr(10).join(imports) if imports else 'Standard library imports'}
 
+RELATED FILES CHANGED IN THIS PR (most relevant first):
+{chr(10).join(related_files) if related_files else 'None'}
+
 IMPORT REQUIREMENTS:
 - Start with ALL necessary imports from the source file above
 - Add testing framework imports ({primary_framework})
@@ -716,6 +720,8 @@ class PromptStrategy:
                 context_info = f"\n\nContext: {enhanced_context.get('pr_title', '')}"
                 if enhanced_context.get('diff_patch'):
                     context_info += f"\nChanges: {enhanced_context.get('diff_patch', '')[:200]}..."
+                if enhanced_context.get('related_files'):
+                    context_info += f"\nRelated files: {', '.join(enhanced_context['related_files'])}"
                 
                 # Call the basic strategy function
                 base_prompt = strategy_func(function_code, language)
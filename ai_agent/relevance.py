@@ -0,0 +1,85 @@
+import math
+import re
+from collections import Counter
+from typing import Any, List, Sequence, Tuple
+
+_IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+_CAMEL_CASE_SPLIT = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
+
+# Keywords that appear in almost every snippet and carry no signal for ranking
+_STOPWORDS = {
+    'def', 'class', 'return', 'self', 'cls', 'import', 'from', 'as', 'if', 'else',
+    'elif', 'for', 'while', 'in', 'is', 'not', 'and', 'or', 'none', 'true', 'false',
+    'try', 'except', 'finally', 'with', 'pass', 'raise', 'lambda', 'yield', 'async',
+    'await', 'public', 'private', 'protected', 'static', 'final', 'void', 'int',
+    'string', 'bool', 'new', 'this', 'func', 'package', 'var', 'let', 'const',
+    'function', 'null', 'nil', 'include', 'struct', 'type', 'the', 'a', 'an', 'to',
+    'of', 'py', 'java', 'go', 'js', 'ts', 'cpp'
+}
+
+
+def tokenize_identifiers(text: str) -> List[str]:
+    """Split text into lower-cased identifier tokens.
+
+    Compound identifiers are kept whole and also split on snake_case and camelCase
+    boundaries so that ``parseUnionForm`` matches ``union_form``.
+    """
+    tokens = []
+    for identifier in _IDENTIFIER_PATTERN.findall(text or ""):
+        parts = [identifier]
+        sub_parts = [p for p in re.split(r'_+', identifier) for p in _CAMEL_CASE_SPLIT.split(p)]
+        if len(sub_parts) > 1:
+            parts.extend(sub_parts)
+        for part in parts:
+            token = part.lower()
+            if len(token) > 1 and token not in _STOPWORDS:
+                tokens.append(token)
+    return tokens
+
+
+class RelevanceScorer:
+    """BM25 scorer that ranks context snippets against the function under test"""
+
+    def __init__(self, query: str, k1: float = 1.5, b: float = 0.75):
+        self.query_terms = set(tokenize_identifiers(query))
+        self.k1 = k1
+        self.b = b
+
+    def score(self, documents: Sequence[str]) -> List[float]:
+        """Score each document against the query; IDF is computed over ``documents``"""
+        if not documents or not self.query_terms:
+            return [0.0] * len(documents)
+
+        term_counts = [Counter(tokenize_identifiers(doc)) for doc in documents]
+        lengths = [sum(counts.values()) for counts in term_counts]
+        avg_length = (sum(lengths) / len(lengths)) or 1.0
+
+        doc_freq = Counter()
+        for counts in term_counts:
+            doc_freq.update(term for term in self.query_terms if term in counts)
+
+        total = len(documents)
+        scores = []
+        for counts, length in zip(term_counts, lengths):
+            score = 0.0
+            for term in self.query_terms:
+                tf = counts.get(term, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (total - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+                norm = tf + self.k1 * (1 - self.b + self.b * length / avg_length)
+                score += idf * tf * (self.k1 + 1) / norm
+            scores.append(score)
+        return scores
+
+    def rank(self, candidates: Sequence[Tuple[Any, str]], top_k: int) -> List[Any]:
+        """Return the ``top_k`` candidate items ordered by relevance.
+
+        ``candidates`` is a sequence of ``(item, text)`` pairs; ties keep their
+        original order so unranked input degrades to a simple truncation.
+        """
+        if top_k <= 0 or not candidates:
+            return []
+        scores = self.score([text for _, text in candidates])
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        return [candidates[i][0] for i in order[:top_k]]
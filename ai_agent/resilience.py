@@ -0,0 +1,248 @@
+import bisect
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose circuit breaker is open"""
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (``pct`` in 0-100)"""
+    if not values:
+        raise ValueError("percentile of empty sequence")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyTracker:
+    """Tracks request latency per prompt-length bucket and derives timeouts from it.
+
+    Prompts are bucketed by length on a doubling scale, so a timeout learned
+    from short prompts is not applied to a 30k-character one. The timeout is
+    ``percentile(latencies) * headroom`` for the prompt's bucket, clamped to
+    ``[min_timeout, max_timeout]``. Buckets without enough samples borrow from
+    the nearest populated bucket, scaled by the prompt length ratio; with no
+    samples at all ``default_timeout`` is used.
+    """
+
+    BUCKET_BOUNDS = (512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+    def __init__(self, default_timeout: float = 600.0, min_timeout: float = 30.0,
+                 max_timeout: float = 600.0, pct: float = 95.0, headroom: float = 2.0,
+                 window: int = 50, min_samples: int = 5):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.pct = pct
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self._samples: Dict[int, Deque[Tuple[int, float]]] = {
+            bucket: deque(maxlen=window) for bucket in range(len(self.BUCKET_BOUNDS) + 1)
+        }
+        self._lock = threading.Lock()
+
+    def _bucket(self, prompt_length: int) -> int:
+        return bisect.bisect_left(self.BUCKET_BOUNDS, prompt_length)
+
+    def record(self, prompt_length: int, latency: float):
+        with self._lock:
+            self._samples[self._bucket(prompt_length)].append((prompt_length, latency))
+
+    def sample_count(self) -> int:
+        with self._lock:
+            return sum(len(samples) for samples in self._samples.values())
+
+    def latency_percentile(self, prompt_length: int, pct: Optional[float] = None) -> Optional[float]:
+        """Observed latency percentile for prompts of this length, or None without data"""
+        pct = self.pct if pct is None else pct
+        bucket = self._bucket(prompt_length)
+        with self._lock:
+            samples = list(self._samples[bucket])
+            if len(samples) >= self.min_samples:
+                return percentile([latency for _, latency in samples], pct)
+
+            # Borrow from the nearest populated bucket, scaling by prompt length
+            populated = [b for b, s in self._samples.items() if len(s) >= self.min_samples]
+            if not populated:
+                return None
+            nearest = min(populated, key=lambda b: abs(b - bucket))
+            samples = list(self._samples[nearest])
+
+        mean_length = sum(length for length, _ in samples) / len(samples) or 1
+        scale = max(prompt_length, 1) / mean_length
+        return percentile([latency for _, latency in samples], pct) * scale
+
+    def timeout_for(self, prompt_length: int) -> float:
+        observed = self.latency_percentile(prompt_length)
+        if observed is None:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, observed * self.headroom))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open circuit breaker for one backend.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    ``before_request`` raises ``CircuitOpenError`` immediately. Once
+    ``recovery_timeout`` seconds have passed, a single trial request is let
+    through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.recovery_timeout:
+                    raise CircuitOpenError(
+                        f"Circuit for {self.name} is open after {self.consecutive_failures} consecutive failures"
+                    )
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError(f"Circuit for {self.name} is half-open; trial request in progress")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning(
+                        f"Circuit for {self.name} opened after {self.consecutive_failures} consecutive failures"
+                    )
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and self.clock() - self.opened_at < self.recovery_timeout
+
+
+def retry_delay(attempt: int, error: Optional[Exception] = None, base: float = 1.0, cap: float = 30.0) -> float:
+    """Seconds to wait before retry ``attempt`` (0-based).
+
+    Honours a ``Retry-After`` header on HTTP errors when present, otherwise
+    uses capped exponential backoff with full jitter.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = headers.get("Retry-After") if hasattr(headers, "get") else None
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class HedgeBudget:
+    """Caps hedged (duplicate) requests to a fraction of all requests in a run"""
+
+    def __init__(self, ratio: float = 0.1, burst: int = 1):
+        self.ratio = ratio
+        self.burst = burst
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.hedges < self.ratio * self.requests + self.burst:
+                self.hedges += 1
+                return True
+            return False
+
+    def record_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "hedges": self.hedges, "hedge_wins": self.hedge_wins}
+
+
+def hedged_call(call: Callable[[threading.Event], T], hedge_after: Optional[float],
+                budget: Optional[HedgeBudget]) -> T:
+    """Run ``call`` and race a duplicate if it has not answered after ``hedge_after`` seconds.
+
+    ``call`` receives a ``threading.Event`` that is set once the other copy has
+    won; it should poll it and abandon its request. The first successful
+    result is returned; an exception is raised only if every copy fails.
+    Without a budget or a ``hedge_after`` estimate the call runs inline.
+    """
+    if budget is None:
+        return call(threading.Event())
+    budget.record_request()
+    if hedge_after is None:
+        return call(threading.Event())
+
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+    events = [threading.Event()]
+    futures = {executor.submit(call, events[0]): 0}
+    try:
+        done, _ = wait(futures, timeout=hedge_after)
+        if not done and budget.try_acquire():
+            logging.info(f"No response after {hedge_after:.1f}s, sending hedged request")
+            events.append(threading.Event())
+            futures[executor.submit(call, events[1])] = 1
+
+        pending = set(futures)
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: futures[f]):
+                error = future.exception()
+                if error is not None:
+                    first_error = first_error or error
+                    continue
+                winner = futures[future]
+                for index, event in enumerate(events):
+                    if index != winner:
+                        event.set()
+                if winner == 1:
+                    budget.record_win()
+                return future.result()
+        raise first_error
+    finally:
+        executor.shutdown(wait=False)
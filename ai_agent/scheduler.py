@@ -0,0 +1,126 @@
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _as_int(value: Any) -> int:
+    """enhanced_patches.json stores counts as strings"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class WorkItem:
+    """One function to generate tests for, with the facts used to prioritise it"""
+
+    def __init__(self, file_path: str, language: str, function_name: str, function_code: str,
+                 churn: int = 0, touched_by_patch: bool = False, has_tests: bool = False):
+        self.file_path = file_path
+        self.language = language
+        self.function_name = function_name
+        self.function_code = function_code
+        self.churn = churn
+        self.touched_by_patch = touched_by_patch
+        self.has_tests = has_tests
+        self.score = 0.0
+
+    @property
+    def size(self) -> int:
+        return len([line for line in self.function_code.split('\n') if line.strip()])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file": self.file_path,
+            "function": self.function_name,
+            "language": self.language,
+            "score": round(self.score, 3),
+            "churn": self.churn,
+            "size": self.size,
+            "has_tests": self.has_tests,
+        }
+
+
+class FunctionScheduler:
+    """Orders functions by expected value and stops cleanly when a time budget runs out.
+
+    The score favours functions with high churn in the PR (``additions`` +
+    ``deletions``), functions the patch actually touches, larger bodies, and
+    functions that have no existing tests.
+    """
+
+    def __init__(self, time_budget: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.time_budget = time_budget
+        self.clock = clock
+        self.started_at: Optional[float] = None
+        self.durations: List[float] = []
+
+    @staticmethod
+    def build_item(file_path: str, language: str, function_name: str, function_code: str,
+                   enhanced_context) -> WorkItem:
+        file_context = enhanced_context.get_file_context(file_path)
+        churn = _as_int(file_context.get('additions')) + _as_int(file_context.get('deletions'))
+        patch = file_context.get('patch', '') or ''
+        touched = bool(function_name) and function_name in patch
+        has_tests = FunctionScheduler._has_existing_tests(file_path, function_name, enhanced_context)
+        return WorkItem(file_path, language, function_name, function_code, churn, touched, has_tests)
+
+    @staticmethod
+    def _has_existing_tests(file_path: str, function_name: str, enhanced_context) -> bool:
+        """True if a test file in the PR references the function or its module"""
+        stem = Path(file_path).stem.lower()
+        for test_path, patch_data in enhanced_context.enhanced_patches.items():
+            if not patch_data.get('is_test_file', False):
+                continue
+            if stem and stem in Path(test_path).stem.lower():
+                return True
+            if function_name and function_name in (patch_data.get('full_content') or ''):
+                return True
+        return False
+
+    def score(self, item: WorkItem) -> float:
+        score = math.log1p(item.churn) + 0.5 * math.log1p(item.size)
+        if item.touched_by_patch:
+            score *= 2.0
+        if item.has_tests:
+            score *= 0.5
+        return score
+
+    def order(self, items: List[WorkItem]) -> List[WorkItem]:
+        """Highest-value functions first; ties keep discovery order"""
+        for item in items:
+            item.score = self.score(item)
+        return sorted(items, key=lambda item: -item.score)
+
+    def start(self):
+        self.started_at = self.clock()
+
+    def elapsed(self) -> float:
+        return 0.0 if self.started_at is None else self.clock() - self.started_at
+
+    def remaining(self) -> Optional[float]:
+        if self.time_budget is None:
+            return None
+        return self.time_budget - self.elapsed()
+
+    def record(self, duration: float):
+        self.durations.append(duration)
+
+    def has_time_for_next(self) -> bool:
+        """Whether another item is expected to finish within the budget.
+
+        Uses the mean duration of completed items as the estimate so the run
+        stops before starting work it cannot finish, not after overrunning.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return True
+        expected = sum(self.durations) / len(self.durations) if self.durations else 0.0
+        return remaining > expected
+
+    @staticmethod
+    def budget_from_env() -> Optional[float]:
+        value = os.environ.get("AI_AGENT_TIME_BUDGET")
+        return float(value) if value else None
@@ -0,0 +1,449 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+# enhanced_patches.json stores short language codes; LanguageDetector uses full names
+_LANGUAGE_ALIASES = {
+    'python': 'py',
+    'javascript': 'js',
+    'typescript': 'ts',
+    'golang': 'go',
+    'c++': 'cpp',
+    'jsx': 'js',
+    'tsx': 'ts',
+}
+
+_EXTENSION_LANGUAGES = {
+    '.py': 'py', '.java': 'java', '.go': 'go', '.js': 'js', '.jsx': 'js',
+    '.ts': 'ts', '.tsx': 'ts', '.c': 'c', '.h': 'c', '.cpp': 'cpp',
+    '.cc': 'cpp', '.hpp': 'cpp', '.hh': 'cpp',
+}
+
+_JAVA_SOURCE_ROOTS = ('src/main/java/', 'src/test/java/', 'src/main/kotlin/', 'src/test/kotlin/')
+
+# Comments and string/char literals in C-family languages (Java, Go, JS/TS, C/C++)
+_C_STYLE_NOISE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`[^`]*`', re.DOTALL
+)
+
+
+def normalize_language(language: Optional[str]) -> str:
+    """Map a language name or extension to the short code used in the index"""
+    language = (language or '').lower().lstrip('.')
+    return _LANGUAGE_ALIASES.get(language, language)
+
+
+class SymbolIndex:
+    """Offline index of exported symbols and the import that provides them.
+
+    Built from the PR's changed file contents (authoritative definitions) and the
+    import lines of the saved test files, keyed by language then symbol name, so
+    resolving an import is a single dict lookup.
+    """
+
+    INDEX_FILENAME = "symbol_index.json"
+    # Bump when the stored entries change shape so persisted indexes are rebuilt
+    INDEX_VERSION = 2
+
+    def __init__(self, source_digest: str = "", go_module: str = ""):
+        self.source_digest = source_digest
+        # Go module path from go.mod, used to turn package directories into import paths
+        self.go_module = go_module
+        # language -> symbol -> {"module": ..., "import": ..., "file": ..., "origin": ...}
+        self.symbols: Dict[str, Dict[str, Dict[str, str]]] = {}
+        # file path -> module path
+        self.modules: Dict[str, str] = {}
+
+    # ---------------------------
+    # Construction / persistence
+    # ---------------------------
+    @classmethod
+    def for_pr(cls, enhanced_context) -> "SymbolIndex":
+        """Load the persisted index for a PR, rebuilding it if its inputs changed"""
+        pr_data_path = Path(enhanced_context.pr_data_path)
+        index_path = pr_data_path / "context" / cls.INDEX_FILENAME
+        digest = cls._source_digest(pr_data_path)
+
+        if index_path.exists():
+            try:
+                index = cls.load(index_path)
+                if index.source_digest == digest:
+                    return index
+            except Exception as e:
+                logging.warning(f"Could not load symbol index {index_path}: {e}")
+
+        index = cls.build(enhanced_context, digest)
+        try:
+            index.save(index_path)
+        except Exception as e:
+            logging.warning(f"Could not save symbol index {index_path}: {e}")
+        return index
+
+    @classmethod
+    def build(cls, enhanced_context, source_digest: str = "") -> "SymbolIndex":
+        index = cls(source_digest, cls._go_module(enhanced_context))
+        for file_path, patch_data in enhanced_context.enhanced_patches.items():
+            content = patch_data.get('full_content') or ''
+            language = normalize_language(patch_data.get('language')) or cls._language_for_path(file_path)
+            if not patch_data.get('is_test_file', False):
+                index.add_source(file_path, content, language)
+            index.add_imports(content, language)
+
+        tests_dir = Path(enhanced_context.pr_data_path) / "tests"
+        for test_file in cls._test_files(tests_dir):
+            try:
+                content = test_file.read_text(encoding='utf-8')
+            except Exception as e:
+                logging.warning(f"Could not read test file {test_file}: {e}")
+                continue
+            index.add_imports(content, cls._language_for_path(str(test_file)))
+        return index
+
+    @classmethod
+    def load(cls, path) -> "SymbolIndex":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        index = cls(data.get("source_digest", ""), data.get("go_module", ""))
+        index.symbols = data.get("symbols", {})
+        index.modules = data.get("modules", {})
+        return index
+
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "source_digest": self.source_digest,
+                "go_module": self.go_module,
+                "modules": self.modules,
+                "symbols": self.symbols,
+            }, f, indent=2)
+
+    @staticmethod
+    def _test_files(tests_dir: Path) -> List[Path]:
+        if not tests_dir.exists():
+            return []
+        return sorted(p for p in tests_dir.rglob("*") if p.is_file())
+
+    @classmethod
+    def _source_digest(cls, pr_data_path: Path) -> str:
+        """Cheap fingerprint of the index inputs (patch file and saved tests)"""
+        digest = hashlib.sha256(f"v{cls.INDEX_VERSION}\n".encode())
+        inputs = [pr_data_path / "enhanced_patches.json", *cls._go_mod_paths(pr_data_path)]
+        for path in inputs + cls._test_files(pr_data_path / "tests"):
+            if path.exists():
+                stat = path.stat()
+                digest.update(f"{os.path.relpath(path, pr_data_path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def _go_mod_paths(pr_data_path: Path) -> List[Path]:
+        return [pr_data_path / "go.mod", pr_data_path.parent / "go.mod"]
+
+    @classmethod
+    def _go_module(cls, enhanced_context) -> str:
+        """The Go module path, from go.mod when the PR or its data directory has one.
+
+        Otherwise it is inferred from the repository URL of the changed files and
+        the import paths they use (which carry any ``/vN`` major version suffix).
+        """
+        patches = enhanced_context.enhanced_patches
+        contents = [(patches.get('go.mod') or {}).get('full_content') or '']
+        for path in cls._go_mod_paths(Path(enhanced_context.pr_data_path)):
+            if path.exists():
+                try:
+                    contents.append(path.read_text(encoding='utf-8'))
+                except Exception as e:
+                    logging.warning(f"Could not read {path}: {e}")
+        for content in contents:
+            match = re.search(r'^module\s+"?([^\s"]+)"?', content, re.MULTILINE)
+            if match:
+                return match.group(1)
+
+        go_files = [data for name, data in patches.items() if name.endswith('.go')]
+        for patch_data in go_files:
+            match = re.match(r'https?://([^/]+/[^/]+/[^/]+)/raw/', patch_data.get('raw_url') or '')
+            if not match:
+                continue
+            repository = match.group(1)
+            pattern = re.compile(r'"(' + re.escape(repository) + r'(?:/v\d+)?)(?:/[^"]*)?"')
+            for data in go_files:
+                found = pattern.search(data.get('full_content') or '')
+                if found:
+                    return found.group(1)
+            return repository
+        return ""
+
+    @staticmethod
+    def _language_for_path(file_path: str) -> str:
+        return _EXTENSION_LANGUAGES.get(os.path.splitext(file_path)[1].lower(), '')
+
+    # ---------------------------
+    # Lookups
+    # ---------------------------
+    def lookup(self, symbol: str, language: str) -> Optional[Dict[str, str]]:
+        return self.symbols.get(normalize_language(language), {}).get(symbol)
+
+    def import_for(self, symbol: str, language: str) -> Optional[str]:
+        entry = self.lookup(symbol, language)
+        return entry.get("import") if entry else None
+
+    def module_for_file(self, file_path: str) -> Optional[str]:
+        return self.modules.get(file_path)
+
+    def missing_imports(self, test_code: str, language: str) -> List[str]:
+        """Import statements for indexed symbols the test code uses but never binds.
+
+        Only bare identifiers count as uses (not ``obj.name`` member accesses or
+        words in strings and comments). Symbols from the test's own package and
+        from wildcard-imported modules need no import.
+        """
+        language = normalize_language(language)
+        table = self.symbols.get(language)
+        if not table or not test_code:
+            return []
+
+        covered = set(re.findall(r'^\s*from\s+([\w.]+)\s+import\s+\*', test_code, re.MULTILINE))
+        package = None
+        if language == 'py':
+            used, bound = _python_names(test_code)
+        else:
+            bound, wildcards, package = _bound_names(test_code, language)
+            covered |= wildcards
+            code = _C_STYLE_NOISE.sub(lambda m: re.sub(r'[^\n]', ' ', m.group(0)), test_code)
+            body = '\n'.join(line for line in code.split('\n') if not _is_import_line(line, language))
+            used = _bare_identifiers(body)
+
+        statements = []
+        for symbol in sorted(used - bound):
+            entry = table.get(symbol, {})
+            statement = entry.get("import")
+            if not statement or entry.get("module") in covered or entry.get("module") == package:
+                continue
+            # Go code reaches other packages through their package name, never a bare member
+            if language == 'go' and entry.get("origin") == "definition" and symbol != entry.get("module"):
+                continue
+            if statement not in statements and statement not in test_code:
+                statements.append(statement)
+        return statements
+
+    # ---------------------------
+    # Population
+    # ---------------------------
+    def add_source(self, file_path: str, content: str, language: str):
+        """Index the exported definitions of a changed source file"""
+        language = normalize_language(language)
+        extractor = {
+            'py': self._python_exports,
+            'java': self._java_exports,
+            'go': self._go_exports,
+            'js': self._js_exports,
+            'ts': self._js_exports,
+            'c': self._c_exports,
+            'cpp': self._c_exports,
+        }.get(language)
+        if extractor is None:
+            return
+        try:
+            extractor(file_path, content, language)
+        except Exception as e:
+            logging.warning(f"Could not index symbols in {file_path}: {e}")
+
+    def add_imports(self, content: str, language: str):
+        """Harvest ``symbol -> import line`` pairs from existing import statements"""
+        language = normalize_language(language)
+        for line in (content or '').split('\n'):
+            stripped = line.strip()
+            if language == 'py':
+                match = re.match(r'from\s+([\w.]+)\s+import\s+([\w\s,]+)$', stripped)
+                if match and not match.group(1).startswith('.'):
+                    for name in match.group(2).split(','):
+                        parts = name.split()
+                        if not parts:
+                            continue
+                        alias = parts[-1] if len(parts) == 3 and parts[1] == 'as' else parts[0]
+                        self._add(language, alias, match.group(1), f"from {match.group(1)} import {name.strip()}", "", "import")
+                    continue
+                match = re.match(r'import\s+([\w.]+)(?:\s+as\s+(\w+))?$', stripped)
+                if match:
+                    name = match.group(2) or match.group(1).split('.')[0]
+                    self._add(language, name, match.group(1), stripped, "", "import")
+            elif language == 'java':
+                match = re.match(r'import\s+(static\s+)?([\w.]+)\.(\w+)\s*;$', stripped)
+                if match:
+                    self._add(language, match.group(3), match.group(2), stripped, "", "import")
+            elif language == 'go':
+                match = re.match(r'(?:import\s+)?(?:(\w+)\s+)?"([\w./-]+)"$', stripped)
+                if match:
+                    name = match.group(1) or _go_package_name(match.group(2))
+                    alias = f"{match.group(1)} " if match.group(1) else ""
+                    self._add(language, name, match.group(2), f'import {alias}"{match.group(2)}"', "", "import")
+            elif language in ('js', 'ts'):
+                match = re.match(r'import\s+\{([^}]*)\}\s+from\s+[\'"]([^\'"]+)[\'"]', stripped)
+                if match:
+                    for name in match.group(1).split(','):
+                        name = name.strip().split(' as ')[-1].strip()
+                        if name:
+                            self._add(language, name, match.group(2),
+                                      f"import {{ {name} }} from '{match.group(2)}';", "", "import")
+
+    def _add(self, language: str, symbol: str, module: str, statement: str, file_path: str, origin: str):
+        table = self.symbols.setdefault(language, {})
+        existing = table.get(symbol)
+        # Definitions from the PR's own sources win over harvested imports
+        if existing and (existing.get("origin") == "definition" or origin != "definition"):
+            return
+        table[symbol] = {"module": module, "import": statement, "file": file_path, "origin": origin}
+
+    def _python_exports(self, file_path: str, content: str, language: str):
+        path = file_path[4:] if file_path.startswith('src/') else file_path
+        module = os.path.splitext(path)[0].replace('/', '.')
+        if module.endswith('.__init__'):
+            module = module[:-len('.__init__')]
+        self.modules[file_path] = module
+
+        try:
+            names = []
+            for node in ast.parse(content).body:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    names.append(node.name)
+                elif isinstance(node, ast.Assign):
+                    names.extend(t.id for t in node.targets if isinstance(t, ast.Name))
+        except SyntaxError:
+            # full_content may be truncated mid-statement; fall back to top-level regexes
+            names = re.findall(r'^(?:async\s+)?(?:def|class)\s+(\w+)', content, re.MULTILINE)
+
+        for name in names:
+            if not name.startswith('_'):
+                self._add(language, name, module, f"from {module} import {name}", file_path, "definition")
+
+    def _java_exports(self, file_path: str, content: str, language: str):
+        package_match = re.search(r'^\s*package\s+([\w.]+)\s*;', content, re.MULTILINE)
+        if package_match:
+            package = package_match.group(1)
+        else:
+            path = file_path
+            for root in _JAVA_SOURCE_ROOTS:
+                if root in path:
+                    path = path.split(root, 1)[1]
+            package = os.path.dirname(path).replace('/', '.')
+        class_name = os.path.splitext(os.path.basename(file_path))[0]
+        qualified = f"{package}.{class_name}" if package else class_name
+        self.modules[file_path] = qualified
+
+        for name in re.findall(r'\bpublic\s+(?:final\s+|abstract\s+|sealed\s+)*(?:class|interface|enum|record)\s+(\w+)', content):
+            target = qualified if name == class_name else f"{qualified}.{name}"
+            self._add(language, name, package, f"import {target};", file_path, "definition")
+        for name in re.findall(r'\bpublic\s+static\s+(?:final\s+)?(?:<[^>]+>\s+)?[\w<>\[\],.? ]+\s+(\w+)\s*\(', content):
+            self._add(language, name, qualified, f"import static {qualified}.{name};", file_path, "definition")
+
+    def _go_exports(self, file_path: str, content: str, language: str):
+        directory = os.path.dirname(file_path)
+        package_match = re.search(r'^package\s+(\w+)', content, re.MULTILINE)
+        package = package_match.group(1) if package_match else os.path.basename(directory)
+        import_path = '/'.join(part for part in (self.go_module, directory) if part)
+        self.modules[file_path] = import_path or package
+        # A directory path alone is not importable; without a module path add no import
+        statement = f'import "{import_path}"' if self.go_module else ""
+
+        # Other packages use these through the package name, so index that too
+        self._add(language, package, package, statement, file_path, "definition")
+        names = re.findall(r'^func\s+(?:\([^)]*\)\s*)?([A-Z]\w*)\s*[\[(]', content, re.MULTILINE)
+        names += re.findall(r'^type\s+([A-Z]\w*)\s', content, re.MULTILINE)
+        for name in names:
+            self._add(language, name, package, statement, file_path, "definition")
+
+    def _js_exports(self, file_path: str, content: str, language: str):
+        module = os.path.splitext(file_path)[0]
+        self.modules[file_path] = module
+        for name in re.findall(r'^export\s+(?:default\s+)?(?:async\s+)?(?:function\*?|class|const|let|var)\s+(\w+)', content, re.MULTILINE):
+            self._add(language, name, module, f"import {{ {name} }} from '{module}';", file_path, "definition")
+
+    def _c_exports(self, file_path: str, content: str, language: str):
+        self.modules[file_path] = file_path
+        statement = f'#include "{file_path}"'
+        names = re.findall(r'^(?:class|struct)\s+(\w+)', content, re.MULTILINE)
+        names += re.findall(r'^[\w:<>*&\s]+?\b(\w+)\s*\([^;{]*\)\s*(?:const\s*)?\{', content, re.MULTILINE)
+        for name in names:
+            if name not in ('if', 'for', 'while', 'switch', 'main'):
+                self._add(language, name, file_path, statement, file_path, "definition")
+
+
+def _is_import_line(line: str, language: str) -> bool:
+    stripped = line.strip()
+    if language in ('c', 'cpp'):
+        return stripped.startswith('#include')
+    return stripped.startswith(('import ', 'from ', 'package '))
+
+
+def _bound_names(code: str, language: str):
+    """Return (bound names, wildcard-imported modules, declared package) for non-Python code"""
+    bound: Set[str] = set()
+    wildcards: Set[str] = set()
+    package_match = re.search(r'^\s*package\s+([\w.]+)', code, re.MULTILINE)
+    package = package_match.group(1) if package_match else None
+
+    if language == 'go':
+        specs = re.findall(r'^\s*import\s*\((.*?)\)', code, re.MULTILINE | re.DOTALL)
+        specs += re.findall(r'^\s*import\s+((?:[\w.]+\s+)?"[^"]+")', code, re.MULTILINE)
+        for alias, path in re.findall(r'(?:([\w.]+)\s+)?"([^"]+)"', '\n'.join(specs)):
+            if alias == '.':
+                wildcards.add(_go_package_name(path))
+            elif alias != '_':
+                bound.add(alias or _go_package_name(path))
+        return bound, wildcards, package
+
+    for line in code.split('\n'):
+        if not _is_import_line(line, language) or line.strip().startswith('package '):
+            continue
+        wildcard = re.match(r'\s*import\s+(?:static\s+)?([\w.]+)\.\*\s*;', line)
+        if wildcard:
+            wildcards.add(wildcard.group(1))
+        else:
+            bound.update(re.findall(r'[A-Za-z_]\w*', _C_STYLE_NOISE.sub(' ', line)))
+    return bound, wildcards, package
+
+
+def _bare_identifiers(code: str) -> Set[str]:
+    """Identifiers that are not member accesses (``obj.name`` or ``ptr->name``)"""
+    return {m.group(2) for m in re.finditer(r'((?<!\.)\.|->)?\s*\b([A-Za-z_]\w*)', code) if not m.group(1)}
+
+
+def _go_package_name(import_path: str) -> str:
+    """Package name an import path binds (major version suffixes like /v6 are skipped)"""
+    parts = import_path.split('/')
+    if len(parts) > 1 and re.fullmatch(r'v\d+', parts[-1]):
+        return parts[-2]
+    return parts[-1]
+
+
+def _python_names(code: str):
+    """Return (used, bound) top-level names for Python code, with a regex fallback"""
+    import builtins
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        used = set(re.findall(r'\b([A-Za-z_]\w*)\s*[(.]', code))
+        bound = set(re.findall(r'(?:import|def|class)\s+(\w+)', code))
+        return used, bound | set(dir(builtins))
+
+    used: Set[str] = set()
+    bound: Set[str] = set(dir(builtins))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            (used if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            bound.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+    return used, bound
@@ -1,7 +1,13 @@
 import re
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Callable, Dict, Iterable, List, NamedTuple, Tuple, Optional, Any
 import os
+import logging
+import threading
+import time
+from collections import OrderedDict
 from .language_detector import LanguageDetector
+from .fingerprint import function_fingerprint
+from .fs_events import DEFAULT_IGNORED_DIRS, FileEvent, create_watcher
 
 def get_changed_functions(before_file: str, after_file: str) -> dict:
     """Get changed functions from before and after files using language-agnostic parsing."""
@@ -27,9 +33,12 @@ def get_changed_functions(before_file: str, after_file: str) -> dict:
     funcs_before = _extract_functions_with_patterns(before_content, function_patterns)
     funcs_after = _extract_functions_with_patterns(after_content, function_patterns)
 
+    # Whitespace, comment and docstring edits do not count as changes
     changed_funcs = {}
     for name, func_code in funcs_after.items():
-        if name not in funcs_before or funcs_before[name] != func_code:
+        if name not in funcs_before or (
+            function_fingerprint(funcs_before[name], language) != function_fingerprint(func_code, language)
+        ):
             changed_funcs[name] = func_code
 
     return changed_funcs
@@ -42,7 +51,9 @@ def _extract_functions_with_patterns(content: str, patterns: List[str]) -> Dict[
         matches = re.finditer(pattern, content, re.MULTILINE)
         for match in matches:
             func_name = match.group(1)
-            func_code = _extract_function_code_by_pattern(content, match.start(), patterns)
+            # ``^\s*`` can match across preceding blank lines; start at the definition's own line
+            line_start = content.rfind('\n', 0, match.start(1)) + 1
+            func_code = _extract_function_code_by_pattern(content, line_start, patterns)
             if func_code:
                 functions[func_name] = func_code
     
@@ -54,14 +65,14 @@ def _extract_function_code_by_pattern(content: str, start_pos: int, patterns: Li
     start_line = len(lines)
     
     # Find the end of the function by looking for the next function or class definition
-    remaining_content = content[start_pos:]
     end_pos = start_pos
     
-    # Look for the next function/class definition
+    # Look for the next function/class definition, from the line after this one
+    next_line = content.find('\n', start_pos) + 1
     for pattern in patterns:
-        next_match = re.search(pattern, remaining_content[1:], re.MULTILINE)
+        next_match = re.compile(pattern, re.MULTILINE).search(content, next_line) if next_line else None
         if next_match:
-            potential_end = start_pos + 1 + next_match.start()
+            potential_end = content.rfind('\n', 0, next_match.start(1)) + 1
             if potential_end < end_pos or end_pos == start_pos:
                 end_pos = potential_end
     
@@ -341,3 +352,171 @@ def analyze_diff_changes(diff_content: str) -> Dict[str, Any]:
 
 
 
+
+
+class FunctionChange(NamedTuple):
+    """A function whose source changed on disk; ``previous_code`` is None for new functions"""
+    file_path: str
+    language: str
+    name: str
+    code: str
+    previous_code: Optional[str]
+
+
+class WorkingTreeWatcher:
+    """Watches a working tree and reports changed functions as files are saved.
+
+    The last parsed version of every source file is kept in memory, so a
+    save is diffed at function granularity and only added or modified
+    functions are queued. Events are debounced per file (a file is parsed
+    once it has been quiet for ``debounce`` seconds), and the queue is keyed
+    by file and function, so repeated saves coalesce into one entry holding
+    the latest code. ``on_changes`` receives each batch; saves made while
+    it runs are coalesced into the next batch.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        on_changes: Callable[[List[FunctionChange]], None],
+        debounce: float = 0.5,
+        include_tests: bool = False,
+        ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+        polling: bool = False,
+        poll_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.root = os.path.abspath(root)
+        self.on_changes = on_changes
+        self.debounce = debounce
+        self.include_tests = include_tests
+        self.ignored_dirs = frozenset(ignored_dirs)
+        self.polling = polling
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.snapshots: Dict[str, Dict[str, str]] = {}
+        self.pending_files: Dict[str, float] = {}
+        self.queue: "OrderedDict[Tuple[str, str], FunctionChange]" = OrderedDict()
+        self._events = None
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def _language_for(self, path: str) -> Optional[str]:
+        language = LanguageDetector.detect_language_from_file(path)
+        if not language or not LanguageDetector.get_function_patterns_for_language(language):
+            return None
+        if not self.include_tests and _is_test_file(path, language):
+            return None
+        return language
+
+    def _parse(self, path: str, language: str) -> Optional[Dict[str, str]]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        return _extract_functions_with_patterns(content, LanguageDetector.get_function_patterns_for_language(language))
+
+    def _source_files(self, top: str) -> List[str]:
+        found = []
+        for directory, subdirs, files in os.walk(top):
+            subdirs[:] = [d for d in subdirs if d not in self.ignored_dirs]
+            found.extend(os.path.join(directory, name) for name in files
+                         if self._language_for(os.path.join(directory, name)))
+        return found
+
+    def prime(self):
+        """Parse every source file once so the first save is diffed against its current state"""
+        for path in self._source_files(self.root):
+            functions = self._parse(path, self._language_for(path))
+            if functions is not None:
+                self.snapshots[path] = functions
+        logging.info(f"Watching {len(self.snapshots)} source files under {self.root}")
+
+    def diff_file(self, path: str) -> List[FunctionChange]:
+        """Re-parse ``path``, update its snapshot and return its added/modified functions"""
+        language = self._language_for(path)
+        before = self.snapshots.get(path, {})
+        after = self._parse(path, language) if language else None
+        if after is None:
+            self.forget_file(path)
+            return []
+        self.snapshots[path] = after
+
+        relative = self._relative(path)
+        for name in set(before) - set(after):
+            self.queue.pop((relative, name), None)
+        return [
+            FunctionChange(relative, language, name, code, before.get(name))
+            for name, code in after.items()
+            if before.get(name) is None or (
+                before[name] != code
+                and function_fingerprint(before[name], language) != function_fingerprint(code, language)
+            )
+        ]
+
+    def forget_file(self, path: str):
+        self.snapshots.pop(path, None)
+        relative = self._relative(path)
+        for key in [key for key in self.queue if key[0] == relative]:
+            del self.queue[key]
+
+    def handle_event(self, event: FileEvent):
+        now = self.clock()
+        if event.kind == "rescan":
+            top = event.path or self.root
+            for path in set(self._source_files(top)) | {p for p in self.snapshots if p == top or p.startswith(top + os.sep)}:
+                self.pending_files[path] = now
+        elif event.kind == "deleted":
+            for path in [p for p in self.snapshots if p == event.path or p.startswith(event.path + os.sep)]:
+                self.forget_file(path)
+                self.pending_files.pop(path, None)
+        elif self._language_for(event.path):
+            self.pending_files[event.path] = now
+
+    def flush_quiet_files(self, now: Optional[float] = None) -> int:
+        """Diff files that have been quiet for the debounce period and queue their changes"""
+        now = self.clock() if now is None else now
+        quiet = [path for path, last_event in self.pending_files.items() if now - last_event >= self.debounce]
+        for path in quiet:
+            del self.pending_files[path]
+            for change in self.diff_file(path):
+                key = (change.file_path, change.name)
+                queued = self.queue.pop(key, None)
+                if queued is not None:
+                    # Keep the code from before the first unprocessed save for the diff context
+                    change = change._replace(previous_code=queued.previous_code)
+                self.queue[key] = change
+        return len(quiet)
+
+    def drain(self) -> List[FunctionChange]:
+        batch = list(self.queue.values())
+        self.queue.clear()
+        return batch
+
+    def run(self, stop_event: Optional[threading.Event] = None, max_batches: Optional[int] = None):
+        """Watch until ``stop_event`` is set (or ``max_batches`` batches were handled)"""
+        self.prime()
+        self._events = create_watcher(self.root, self.ignored_dirs, polling=self.polling,
+                                      poll_interval=self.poll_interval)
+        batches = 0
+        try:
+            while not (stop_event and stop_event.is_set()):
+                timeout = self.debounce if self.pending_files else 0.5
+                for event in self._events.read_events(timeout):
+                    self.handle_event(event)
+                self.flush_quiet_files()
+                if self.queue:
+                    batch = self.drain()
+                    logging.info(f"{len(batch)} changed function(s): "
+                                 + ", ".join(f"{c.file_path}::{c.name}" for c in batch))
+                    try:
+                        self.on_changes(batch)
+                    except Exception as e:
+                        logging.error(f"Error handling changed functions: {e}")
+                    batches += 1
+                    if max_batches is not None and batches >= max_batches:
+                        break
+        finally:
+            self._events.close()
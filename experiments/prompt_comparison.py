@@ -3,22 +3,32 @@ import sys
 import json
 import time
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from ai_agent.agent import AIAgent
 from ai_agent.prompts import PromptStrategy
+from ai_agent.metrics import metrics
 
 class PromptComparisonExperiment:
     
-    def __init__(self, model_name: str = "codellama/CodeLlama-7b-Instruct-hf"):
-        self.agent = AIAgent(model_name=model_name)
+    def __init__(self, model_name: str = "codellama/CodeLlama-7b-Instruct-hf", provider: str = "hf-inference",
+                 concurrency: int = 1, enhanced_context: bool = False, execute_tests: bool = False):
+        self.agent = AIAgent(model_name=model_name, provider=provider, reuse_unchanged=False)
         self.prompt_strategy = PromptStrategy()
+        self.concurrency = max(1, concurrency)
+        self.use_enhanced_context = enhanced_context
+        self.execute_tests = execute_tests
         self.results = {
             "experiment_info": {
                 "model": model_name,
+                "provider": provider,
                 "strategies": self.prompt_strategy.get_all_strategies(),
+                "concurrency": self.concurrency,
+                "enhanced_context": enhanced_context,
+                "execute_tests": execute_tests,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             },
             "results": {}
@@ -32,59 +42,50 @@ class PromptComparisonExperiment:
         with open(diff_file_path, 'r', encoding='utf-8') as f:
             diff_content = f.read()
         
+        enhanced_context = None
+        if self.use_enhanced_context:
+            pr_data_path = self.agent._find_pr_data_directory(diff_file_path)
+            if pr_data_path:
+                enhanced_context = self.agent._get_context_loader(pr_data_path)
+            else:
+                print("⚠️  No PR data directory found next to the diff, using diff context only")
+        
         from ai_agent.watcher import get_functions_from_diff_file
         functions = get_functions_from_diff_file(diff_file_path)
         
         print(f"📊 Found {len(functions)} functions to test")
+        strategies = self.prompt_strategy.get_all_strategies()
+        experiment_started = time.time()
         
-        for i, (function_name, function_code, file_path) in enumerate(functions, 1):
+        for i, (function_name, function_code, file_path, language) in enumerate(functions, 1):
             print(f"\n🔍 Testing function {i}/{len(functions)}: {function_name}")
             
             function_results = {
                 "function_name": function_name,
                 "file_path": file_path,
+                "language": language,
                 "function_code": function_code,
                 "strategies": {}
             }
             
-            for strategy in self.prompt_strategy.get_all_strategies():
-                print(f"  Testing strategy: {strategy}")
-                
-                start_time = time.time()
-                
-                try:
-                    test_code = self.agent.test_generator.generate_tests_for_function(
-                        function_code=function_code,
-                        function_name=function_name,
-                        diff_context=diff_content,
-                        prompt_strategy=strategy
-                    )
-                    
-                    generation_time = time.time() - start_time
-                    
-                    quality_metrics = self._analyze_test_quality(test_code, function_code)
-                    
-                    function_results["strategies"][strategy] = {
-                        "test_code": test_code,
-                        "generation_time": generation_time,
-                        "quality_metrics": quality_metrics,
-                        "success": True
-                    }
-                    
-                    print(f"    ✅ Generated test in {generation_time:.2f}s")
-                    
-                except Exception as e:
-                    generation_time = time.time() - start_time
-                    
-                    function_results["strategies"][strategy] = {
-                        "test_code": f"Error: {str(e)}",
-                        "generation_time": generation_time,
-                        "quality_metrics": {},
-                        "success": False,
-                        "error": str(e)
-                    }
-                    
-                    print(f"    ❌ Error: {e}")
+            def run(strategy: str) -> Dict[str, Any]:
+                return self._run_strategy(strategy, function_name, function_code, file_path, language,
+                                          diff_content, enhanced_context)
+            
+            if self.concurrency > 1:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(strategies))) as pool:
+                    outcomes = list(pool.map(run, strategies))
+            else:
+                outcomes = [run(strategy) for strategy in strategies]
+            
+            for strategy, outcome in zip(strategies, outcomes):
+                function_results["strategies"][strategy] = outcome
+                llm = outcome["llm"]
+                if outcome["success"]:
+                    print(f"  ✅ {strategy}: {outcome['generation_time']:.2f}s, "
+                          f"{llm['tokens_in']}+{llm['tokens_out']} tokens, {llm['retries']} retries")
+                else:
+                    print(f"  ❌ {strategy}: {outcome['error']}")
             
             self.results["results"][function_name] = function_results
             
@@ -92,6 +93,10 @@ class PromptComparisonExperiment:
             with open(function_file, 'w') as f:
                 json.dump(function_results, f, indent=2)
         
+        if self.execute_tests:
+            self._execute_generated_tests(enhanced_context)
+        
+        self.results["experiment_info"]["wall_time"] = time.time() - experiment_started
         self._calculate_summary_statistics()
         
         results_file = os.path.join(output_dir, "prompt_comparison_results.json")
@@ -103,6 +108,106 @@ class PromptComparisonExperiment:
         print(f"\n✅ Experiment complete! Results saved to: {output_dir}")
         return self.results
     
+    def _run_strategy(self, strategy: str, function_name: str, function_code: str, file_path: str,
+                      language: str, diff_content: str, enhanced_context) -> Dict[str, Any]:
+        """Generate one test; LLM spans and cache counters are labelled with this run for attribution"""
+        run_id = f"{function_name}:{strategy}:{time.monotonic_ns()}"
+        start_time = time.time()
+        
+        with metrics.labels(experiment_run=run_id, strategy=strategy):
+            try:
+                if enhanced_context is not None:
+                    test_code = self.agent.test_generator.generate_tests_with_enhanced_context(
+                        function_code=function_code,
+                        function_name=function_name,
+                        file_path=file_path,
+                        language=language,
+                        enhanced_context=enhanced_context,
+                        prompt_strategy=strategy
+                    )
+                else:
+                    test_code = self.agent.test_generator.generate_tests_for_function(
+                        function_code=function_code,
+                        function_name=function_name,
+                        diff_context=diff_content,
+                        prompt_strategy=strategy,
+                        language=language
+                    )
+                
+                result = {
+                    "test_code": test_code,
+                    "generation_time": time.time() - start_time,
+                    "quality_metrics": self._analyze_test_quality(test_code, function_code),
+                    "success": True
+                }
+                
+            except Exception as e:
+                result = {
+                    "test_code": f"Error: {str(e)}",
+                    "generation_time": time.time() - start_time,
+                    "quality_metrics": {},
+                    "success": False,
+                    "error": str(e)
+                }
+        
+        result["llm"] = self._llm_stats(run_id)
+        hits = metrics.counter("context_cache_hit", experiment_run=run_id)
+        misses = metrics.counter("context_cache_miss", experiment_run=run_id)
+        result["cache"] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None
+        }
+        return result
+    
+    def _llm_stats(self, run_id: str) -> Dict[str, Any]:
+        """Token, latency and retry totals from the llm_call spans of one run"""
+        spans = metrics.spans_for("llm_call", experiment_run=run_id)
+        tokens_out = sum(int(span.get("tokens_out") or 0) for span in spans)
+        decode_seconds = sum(float(span.get("decode_s") or 0) for span in spans)
+        if not decode_seconds:
+            decode_seconds = sum(span["duration_s"] for span in spans)
+        # Ollama measures time to first token; locally the prefill time is the same thing
+        first_token = [span.get("ttft_s") or span.get("prefill_s") for span in spans]
+        first_token = [value for value in first_token if value]
+        return {
+            "calls": len(spans),
+            "tokens_in": sum(int(span.get("tokens_in") or 0) for span in spans),
+            "tokens_out": tokens_out,
+            "ttft_s": sum(first_token) / len(first_token) if first_token else None,
+            "decode_tokens_per_second": tokens_out / decode_seconds if decode_seconds and tokens_out else None,
+            # Backend retries plus extra calls made to regenerate an invalid test
+            "retries": sum(max(0, int(span.get("attempts") or 1) - 1) for span in spans) + max(0, len(spans) - 1)
+        }
+    
+    def _execute_generated_tests(self, enhanced_context):
+        """Run every generated Python test and replace the assertion-count estimate with measured results"""
+        from ai_agent.executor import TestExecutor
+        
+        tests, owners = {}, {}
+        for function_name, function_data in self.results["results"].items():
+            if function_data["language"] != "python":
+                continue
+            for strategy, strategy_data in function_data["strategies"].items():
+                if strategy_data["success"]:
+                    name = f"test_{function_name}_{strategy.replace('-', '_')}.py"
+                    tests[name] = strategy_data["test_code"]
+                    owners[name] = strategy_data, strategy
+        if not tests:
+            return
+        
+        sources = self.agent._python_sources(enhanced_context) if enhanced_context is not None else None
+        print(f"\n🧪 Executing {len(tests)} generated Python tests")
+        started = time.time()
+        executed = TestExecutor().run_tests(tests, sources)
+        for name, result in executed.items():
+            strategy_data, strategy = owners[name]
+            strategy_data["execution"] = result
+            strategy_data["quality_metrics"]["pass_rate"] = result["pass_rate"]
+            strategy_data["quality_metrics"]["estimated_coverage"] = result["coverage"]
+            self.agent.memory.store_prompt_effectiveness(strategy, "python", result["pass_rate"], result["coverage"])
+        print(f"   Done in {time.time() - started:.1f}s")
+    
     def _analyze_test_quality(self, test_code: str, function_code: str) -> Dict[str, Any]:
         metrics = {
             "test_length": len(test_code.split('\n')),
@@ -135,8 +240,18 @@ class PromptComparisonExperiment:
                 "avg_generation_time": 0,
                 "avg_assertion_count": 0,
                 "avg_estimated_coverage": 0,
+                "avg_pass_rate": None,
+                "_pass_rates": [],
                 "total_successful": 0,
-                "total_tests": 0
+                "total_tests": 0,
+                "total_tokens_in": 0,
+                "total_tokens_out": 0,
+                "total_llm_calls": 0,
+                "total_retries": 0,
+                "cache_hits": 0,
+                "cache_misses": 0,
+                "_ttft": [],
+                "_decode_rates": []
             }
         
         for function_name, function_data in self.results["results"].items():
@@ -144,11 +259,26 @@ class PromptComparisonExperiment:
                 stats = summary["strategies"][strategy]
                 stats["total_tests"] += 1
                 
+                llm = strategy_data.get("llm", {})
+                stats["total_tokens_in"] += llm.get("tokens_in", 0)
+                stats["total_tokens_out"] += llm.get("tokens_out", 0)
+                stats["total_llm_calls"] += llm.get("calls", 0)
+                stats["total_retries"] += llm.get("retries", 0)
+                if llm.get("ttft_s") is not None:
+                    stats["_ttft"].append(llm["ttft_s"])
+                if llm.get("decode_tokens_per_second") is not None:
+                    stats["_decode_rates"].append(llm["decode_tokens_per_second"])
+                cache = strategy_data.get("cache", {})
+                stats["cache_hits"] += cache.get("hits", 0)
+                stats["cache_misses"] += cache.get("misses", 0)
+                
                 if strategy_data["success"]:
                     stats["total_successful"] += 1
                     stats["avg_generation_time"] += strategy_data["generation_time"]
                     stats["avg_assertion_count"] += strategy_data["quality_metrics"].get("assertion_count", 0)
                     stats["avg_estimated_coverage"] += strategy_data["quality_metrics"].get("estimated_coverage", 0)
+                    if "pass_rate" in strategy_data["quality_metrics"]:
+                        stats["_pass_rates"].append(strategy_data["quality_metrics"]["pass_rate"])
         
         for strategy, stats in summary["strategies"].items():
             if stats["total_successful"] > 0:
@@ -156,6 +286,23 @@ class PromptComparisonExperiment:
                 stats["avg_generation_time"] /= stats["total_successful"]
                 stats["avg_assertion_count"] /= stats["total_successful"]
                 stats["avg_estimated_coverage"] /= stats["total_successful"]
+            
+            pass_rates = stats.pop("_pass_rates")
+            if pass_rates:
+                stats["avg_pass_rate"] = sum(pass_rates) / len(pass_rates)
+            ttft = stats.pop("_ttft")
+            decode_rates = stats.pop("_decode_rates")
+            total_tokens = stats["total_tokens_in"] + stats["total_tokens_out"]
+            lookups = stats["cache_hits"] + stats["cache_misses"]
+            stats["avg_ttft_s"] = sum(ttft) / len(ttft) if ttft else None
+            stats["avg_decode_tokens_per_second"] = sum(decode_rates) / len(decode_rates) if decode_rates else None
+            stats["cache_hit_rate"] = stats["cache_hits"] / lookups if lookups else None
+            # Cost side of the tradeoff: tokens spent per usable test
+            stats["tokens_per_success"] = total_tokens / stats["total_successful"] if stats["total_successful"] else None
+            stats["coverage_per_1k_tokens"] = (
+                stats["avg_estimated_coverage"] * stats["total_successful"] / (total_tokens / 1000)
+                if total_tokens else None
+            )
         
         for strategy, stats in summary["strategies"].items():
             if stats["total_successful"] > 0:
@@ -167,8 +314,26 @@ class PromptComparisonExperiment:
                     summary["overall_best_score"] = score
                     summary["overall_best_strategy"] = strategy
         
+        summary["pareto_strategies"] = self._pareto_front(summary["strategies"])
         self.results["summary"] = summary
     
+    @staticmethod
+    def _pareto_front(strategies: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Strategies not beaten on both cost (tokens per success) and quality (coverage)"""
+        candidates = {name: stats for name, stats in strategies.items() if stats["tokens_per_success"] is not None}
+        front = []
+        for name, stats in candidates.items():
+            dominated = any(
+                other["tokens_per_success"] <= stats["tokens_per_success"]
+                and other["avg_estimated_coverage"] >= stats["avg_estimated_coverage"]
+                and (other["tokens_per_success"] < stats["tokens_per_success"]
+                     or other["avg_estimated_coverage"] > stats["avg_estimated_coverage"])
+                for other_name, other in candidates.items() if other_name != name
+            )
+            if not dominated:
+                front.append(name)
+        return front
+    
     def _generate_report(self, output_dir: str):
         report_lines = [
             "# Prompt Strategy Comparison Experiment Report",
@@ -189,6 +354,45 @@ class PromptComparisonExperiment:
                 f"{stats['avg_assertion_count']:.1f} | {stats['avg_estimated_coverage']:.2%} |"
             )
         
+        def fmt(value: Optional[float], pattern: str) -> str:
+            return pattern.format(value) if value is not None else "n/a"
+        
+        report_lines.extend([
+            "",
+            "## Cost / Quality Tradeoff",
+            "",
+            "| Strategy | Prompt Tokens | Output Tokens | Tokens per Success | Avg Coverage | Coverage per 1k Tokens | Pareto |",
+            "|----------|---------------|---------------|--------------------|--------------|------------------------|--------|"
+        ])
+        
+        pareto = self.results["summary"]["pareto_strategies"]
+        for strategy, stats in self.results["summary"]["strategies"].items():
+            report_lines.append(
+                f"| {strategy} | {stats['total_tokens_in']} | {stats['total_tokens_out']} | "
+                f"{fmt(stats['tokens_per_success'], '{:.0f}')} | {stats['avg_estimated_coverage']:.2%} | "
+                f"{fmt(stats['coverage_per_1k_tokens'], '{:.3f}')} | {'✅' if strategy in pareto else ''} |"
+            )
+        
+        report_lines.extend([
+            "",
+            "Pareto strategies are not beaten on both tokens per successful test and coverage by any other strategy.",
+            "",
+            "## Latency and Throughput",
+            "",
+            f"**Concurrency:** {self.results['experiment_info']['concurrency']} | "
+            f"**Wall time:** {self.results['experiment_info'].get('wall_time', 0):.1f}s",
+            "",
+            "| Strategy | LLM Calls | Retries | Avg TTFT | Decode Tokens/s | Context Cache Hit Rate |",
+            "|----------|-----------|---------|----------|-----------------|------------------------|"
+        ])
+        
+        for strategy, stats in self.results["summary"]["strategies"].items():
+            report_lines.append(
+                f"| {strategy} | {stats['total_llm_calls']} | {stats['total_retries']} | "
+                f"{fmt(stats['avg_ttft_s'], '{:.2f}s')} | {fmt(stats['avg_decode_tokens_per_second'], '{:.1f}')} | "
+                f"{fmt(stats['cache_hit_rate'], '{:.0%}')} |"
+            )
+        
         report_lines.extend([
             "",
             f"**Best Overall Strategy:** {self.results['summary']['overall_best_strategy']}",
@@ -211,7 +415,16 @@ class PromptComparisonExperiment:
                     metrics = strategy_data["quality_metrics"]
                     report_lines.append(f"- Generation time: {strategy_data['generation_time']:.2f}s")
                     report_lines.append(f"- Assertions: {metrics.get('assertion_count', 0)}")
-                    report_lines.append(f"- Estimated coverage: {metrics.get('estimated_coverage', 0):.2%}")
+                    execution = strategy_data.get("execution")
+                    if execution:
+                        report_lines.append(f"- Execution: {execution['status']}, {execution['passed']} passed, "
+                                            f"{execution['failed']} failed, {execution['errors']} errors")
+                        report_lines.append(f"- Line coverage: {execution['coverage']:.2%}")
+                    else:
+                        report_lines.append(f"- Estimated coverage: {metrics.get('estimated_coverage', 0):.2%}")
+                    llm = strategy_data.get("llm", {})
+                    report_lines.append(f"- Tokens: {llm.get('tokens_in', 0)} prompt, {llm.get('tokens_out', 0)} output, "
+                                        f"{llm.get('retries', 0)} retries")
                 else:
                     report_lines.append(f"- Error: {strategy_data.get('error', 'Unknown error')}")
                 
@@ -230,15 +443,27 @@ def main():
     parser.add_argument("diff_file", help="Path to diff file to test")
     parser.add_argument("--output-dir", default="experiment_results", help="Output directory")
     parser.add_argument("--model", default="codellama/CodeLlama-7b-Instruct-hf", help="LLM model to use")
+    parser.add_argument("--provider", default="hf-inference", choices=["hf-inference", "local", "ollama"],
+                        help="LLM provider")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Run up to N strategies for a function at the same time")
+    parser.add_argument("--enhanced-context", action="store_true",
+                        help="Build prompts from the PR data directory next to the diff (as main.py does)")
+    parser.add_argument("--execute-tests", action="store_true",
+                        help="Run the generated Python tests and score coverage by execution instead of "
+                             "counting assertions")
     
     args = parser.parse_args()
     
-    experiment = PromptComparisonExperiment(model_name=args.model)
+    experiment = PromptComparisonExperiment(model_name=args.model, provider=args.provider,
+                                            concurrency=args.concurrency, enhanced_context=args.enhanced_context,
+                                            execute_tests=args.execute_tests)
     results = experiment.run_experiment(args.diff_file, args.output_dir)
     
     print("\n📊 Experiment Summary:")
     print(f"Best strategy: {results['summary']['overall_best_strategy']}")
     print(f"Best score: {results['summary']['overall_best_score']:.3f}")
+    print(f"Cost/quality Pareto strategies: {', '.join(results['summary']['pareto_strategies']) or 'none'}")
 
 if __name__ == "__main__":
     main()
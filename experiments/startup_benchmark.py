@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+import tempfile
+from typing import Dict, List, Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry points that never touch a local model and must start without torch
+COMMANDS = {
+    "import ai_agent": [sys.executable, "-c", "import ai_agent"],
+    "cli list-strategies": [sys.executable, os.path.join(ROOT, "interface", "cli.py"), "list-strategies"],
+    "cli memory-insights": [sys.executable, os.path.join(ROOT, "interface", "cli.py"), "memory-insights"],
+    "main.py --help": [sys.executable, os.path.join(ROOT, "main.py"), "--help"],
+}
+
+HEAVY_MODULES = ("torch", "transformers", "huggingface_hub")
+
+# Imports every non-local entry point and reports which heavy modules came along
+HEAVY_CHECK = (
+    "import sys; sys.path[:0] = [{root!r}, {interface!r}]\n"
+    "import ai_agent, cli, main\n"
+    "from ai_agent.llm import PhindCodeLlamaLLM\n"
+    "print(','.join(m for m in {modules!r} if m in sys.modules))"
+)
+
+
+def time_command(command: List[str], runs: int, cwd: str) -> Dict[str, Any]:
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   env=dict(os.environ, PYTHONPATH=ROOT))
+        durations.append(time.perf_counter() - started)
+        if completed.returncode != 0:
+            return {"error": completed.stderr.decode(errors="replace")[-500:], "runs": durations}
+    return {
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "max_s": max(durations),
+        "runs": len(durations),
+    }
+
+
+def heavy_modules_loaded(cwd: str) -> List[str]:
+    code = HEAVY_CHECK.format(root=ROOT, interface=os.path.join(ROOT, "interface"), modules=HEAVY_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Import check failed: {completed.stderr[-500:]}")
+    output = completed.stdout.strip().splitlines()
+    return [m for m in (output[-1] if output else "").split(",") if m]
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Startup-time benchmark for the non-local CLI paths")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command (median is reported)")
+    parser.add_argument("--threshold", type=float, default=1.0,
+                        help="Fail if any command's median startup exceeds this many seconds")
+    parser.add_argument("--output", help="Write the results as JSON")
+
+    args = parser.parse_args()
+
+    # An empty working directory keeps memory-insights from reading a real agent_memory.json
+    with tempfile.TemporaryDirectory(prefix="ai_agent_startup_") as cwd:
+        # Warm the filesystem cache and bytecode so the first measured run is not an outlier
+        subprocess.run([sys.executable, "-c", "import ai_agent"], cwd=cwd, env=dict(os.environ, PYTHONPATH=ROOT),
+                       capture_output=True)
+        results = {name: time_command(command, args.runs, cwd) for name, command in COMMANDS.items()}
+        heavy = heavy_modules_loaded(cwd)
+
+    print(f"\n🚀 Startup times ({args.runs} runs each, threshold {args.threshold:.2f}s)")
+    print(f"{'Command':<24}{'Median s':>10}{'Min s':>10}{'Max s':>10}")
+    failed = False
+    for name, result in results.items():
+        if "error" in result:
+            failed = True
+            print(f"{name:<24}  ❌ failed: {result['error'].strip().splitlines()[-1] if result['error'].strip() else ''}")
+            continue
+        slow = result["median_s"] > args.threshold
+        failed = failed or slow
+        print(f"{name:<24}{result['median_s']:>10.3f}{result['min_s']:>10.3f}{result['max_s']:>10.3f}"
+              f"{'  ⚠️ over threshold' if slow else ''}")
+
+    if heavy:
+        failed = True
+        print(f"\n❌ Heavy modules imported at startup: {', '.join(heavy)}")
+    else:
+        print(f"\n✅ None of {', '.join(HEAVY_MODULES)} imported by the non-local entry points")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"threshold_s": args.threshold, "commands": results, "heavy_modules": heavy}, f, indent=2)
+        print(f"📄 Results written to {args.output}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,16 @@
 import argparse
 import sys
+from collections import Counter
 import os
 from pathlib import Path
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from ai_agent.agent import AIAgent
+from ai_agent.bandit import StrategyBandit
 from ai_agent.memory import MemoryModule
+from ai_agent.metrics import metrics
+from ai_agent.profiling import PipelineProfiler, PROFILE_MODES
 
 def main():
     parser = argparse.ArgumentParser(
@@ -16,22 +20,43 @@ def main():
 Examples:
   ai-agent process data/fastapi_fastapi/PR_13827/diff.patch
   ai-agent compare-strategies data/fastapi_fastapi/PR_13827/diff.patch
+  ai-agent watch src/ --output-dir generated_tests
   ai-agent memory-insights
   ai-agent suggest-improvements my_function "def my_function(x): return x * 2"
         """
     )
     
+    parser.add_argument('--memory', default=None,
+                       help='Memory location: a JSON file, or a SQLite file (*.db or sqlite:///path) that '
+                            'concurrent agents share (default: AI_AGENT_MEMORY or agent_memory.json)')
+    
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
     process_parser = subparsers.add_parser('process', help='Process a diff file')
     process_parser.add_argument('diff_file', help='Path to diff file')
     process_parser.add_argument('--output-dir', default='generated', help='Output directory')
     process_parser.add_argument('--prompt-strategy', default='diff-aware', 
-                               choices=['naive', 'diff-aware', 'few-shot', 'cot', 'tdd'],
-                               help='Prompt strategy to use')
+                               choices=['naive', 'diff-aware', 'few-shot', 'cot', 'tdd', 'adaptive'],
+                               help="Prompt strategy to use; 'adaptive' lets a bandit pick one per function")
     process_parser.add_argument('--no-docs', action='store_true', help='Skip documentation generation')
     process_parser.add_argument('--model', default='codellama/CodeLlama-13b-Instruct-hf',
                                help='LLM model to use')
+    process_parser.add_argument('--time-budget', type=float, default=None,
+                               help='Wall-clock budget in seconds; lower-priority functions are skipped when it runs out')
+    process_parser.add_argument('--execute-tests', action='store_true',
+                               help='Run the generated Python tests in sandboxed subprocesses and record the results')
+    process_parser.add_argument('--candidates', type=int, default=None,
+                               help='Sample N candidate tests per function and keep the best-ranked one')
+    process_parser.add_argument('--mutation-testing', action='store_true',
+                               help='Score each generated Python test by the share of function mutants it kills')
+    process_parser.add_argument('--force-regenerate', action='store_true',
+                               help='Regenerate tests even for functions that are unchanged since their last test')
+    process_parser.add_argument('--metrics-file', default=None,
+                               help='Append per-stage timing and token spans to this JSONL file')
+    process_parser.add_argument('--profile', nargs='?', const='sample', choices=PROFILE_MODES, default=None,
+                               help="Profile the run ('sample' flamegraph or 'cprofile'); written to the output dir")
+    process_parser.add_argument('--profile-top', type=int, default=15,
+                               help='Number of functions to show, ranked by self time, with --profile')
     
     compare_parser = subparsers.add_parser('compare-strategies', help='Compare all prompt strategies')
     compare_parser.add_argument('diff_file', help='Path to diff file')
@@ -39,6 +64,21 @@ Examples:
     compare_parser.add_argument('--model', default='codellama/CodeLlama-13b-Instruct-hf',
                                help='LLM model to use')
     
+    watch_parser = subparsers.add_parser('watch', help='Regenerate tests for functions as files are saved')
+    watch_parser.add_argument('root', nargs='?', default='.', help='Working tree to watch')
+    watch_parser.add_argument('--output-dir', default='generated_tests', help='Output directory (not watched)')
+    watch_parser.add_argument('--prompt-strategy', default='diff-aware',
+                             choices=['naive', 'diff-aware', 'few-shot', 'cot'],
+                             help='Prompt strategy to use')
+    watch_parser.add_argument('--model', default='codellama/CodeLlama-13b-Instruct-hf',
+                             help='LLM model to use')
+    watch_parser.add_argument('--debounce', type=float, default=0.5,
+                             help='Seconds a file must be quiet before its functions are re-parsed')
+    watch_parser.add_argument('--polling', action='store_true',
+                             help='Poll for changes instead of using inotify')
+    watch_parser.add_argument('--include-tests', action='store_true',
+                             help='Also regenerate tests when existing test files change')
+    
     memory_parser = subparsers.add_parser('memory-insights', help='Show memory insights')
     
     suggest_parser = subparsers.add_parser('suggest-improvements', help='Suggest test improvements')
@@ -55,11 +95,17 @@ Examples:
         parser.print_help()
         return
     
+    if args.memory:
+        # Every AIAgent and MemoryModule below picks the location up from here
+        os.environ['AI_AGENT_MEMORY'] = args.memory
+    
     try:
         if args.command == 'process':
             process_diff_file(args)
         elif args.command == 'compare-strategies':
             compare_strategies(args)
+        elif args.command == 'watch':
+            watch_tree(args)
         elif args.command == 'memory-insights':
             show_memory_insights()
         elif args.command == 'suggest-improvements':
@@ -75,21 +121,58 @@ Examples:
 
 def process_diff_file(args):
     print(f"🤖 Processing diff file: {args.diff_file}")
+    if args.metrics_file:
+        metrics.configure(args.metrics_file)
     
-    agent = AIAgent(model_name=args.model)
+    agent = AIAgent(model_name=args.model, reuse_unchanged=False if args.force_regenerate else None,
+                    execute_tests=args.execute_tests, mutation_testing=args.mutation_testing,
+                    num_candidates=args.candidates)
     
-    results = agent.process_diff_file(
-        diff_file_path=args.diff_file,
-        output_dir=args.output_dir,
-        prompt_strategy=args.prompt_strategy,
-        generate_docs=not args.no_docs
-    )
+    profiler = PipelineProfiler(args.profile) if args.profile else None
+    if profiler:
+        profiler.start()
+    try:
+        results = agent.process_diff_file(
+            diff_file_path=args.diff_file,
+            output_dir=args.output_dir,
+            prompt_strategy=args.prompt_strategy,
+            generate_docs=not args.no_docs,
+            time_budget=args.time_budget
+        )
+    finally:
+        if profiler:
+            profiler.stop()
+            paths = profiler.write(args.output_dir, top_n=args.profile_top)
+            print(f"🔥 Profile ({profiler.wall_seconds:.1f}s), top {args.profile_top} by self time:")
+            print(profiler.format_top(args.profile_top))
+            print(f"Profile written to: {', '.join(paths)}")
     
     print(f"✅ Processing complete!")
     print(f"Generated {len(results['generated_tests'])} tests")
+    reused = results.get('reused_tests', [])
+    if reused:
+        print(f"♻️  Reused {len(reused)} unchanged test(s) without calling the model")
+    skipped = results.get('skipped', [])
+    if skipped:
+        print(f"⏱️  Time budget reached, skipped {len(skipped)} function(s):")
+        for item in skipped:
+            print(f"  {item['file']}::{item['function']} (priority {item['score']})")
+    choices = results.get('strategy_choices', {})
+    if choices:
+        counts = Counter(choices.values())
+        print("🎰 Adaptive strategy choices: " + ", ".join(f"{s} x{n}" for s, n in counts.most_common()))
+    for key, score in results.get('mutation_scores', {}).items():
+        print(f"  🧬 {key}: mutation score {'n/a' if score is None else f'{score:.2f}'}")
+    execution = results.get('execution')
+    if execution:
+        for path, result in execution['results'].items():
+            print(f"  🧪 {result['status']:<8} {path} ({result['passed']} passed, {result['failed']} failed, "
+                  f"{result['errors']} errors, coverage {result['coverage']:.0%}, {result['duration_s']:.2f}s)")
     if not args.no_docs:
         print(f"Generated {len(results['generated_docs'])} documentation files")
     print(f"Results saved to: {args.output_dir}")
+    if metrics.spans:
+        print(metrics.format_summary())
 
 def compare_strategies(args):
     print(f"🤖 Comparing prompt strategies for: {args.diff_file}")
@@ -110,6 +193,39 @@ def compare_strategies(args):
         else:
             print(f"✅ {strategy}: Generated {len(result.get('generated_tests', {}))} tests")
 
+def watch_tree(args):
+    from ai_agent.fs_events import DEFAULT_IGNORED_DIRS
+    from ai_agent.watcher import WorkingTreeWatcher
+    
+    agent = AIAgent(model_name=args.model)
+    
+    def on_changes(changes):
+        print(f"🔁 {len(changes)} changed function(s)")
+        written = agent.generate_tests_for_changes(changes, output_dir=args.output_dir,
+                                                   prompt_strategy=args.prompt_strategy)
+        for key, path in written.items():
+            print(f"  ✅ {key} -> {path}")
+        for change in changes:
+            key = f"{change.file_path}::{change.name}"
+            if key not in written:
+                print(f"  ❌ {key}: generation failed")
+    
+    # Generated tests must not trigger another round of generation
+    ignored = set(DEFAULT_IGNORED_DIRS) | {os.path.basename(os.path.abspath(args.output_dir))}
+    watcher = WorkingTreeWatcher(
+        args.root,
+        on_changes,
+        debounce=args.debounce,
+        include_tests=args.include_tests,
+        ignored_dirs=ignored,
+        polling=args.polling,
+    )
+    print(f"👀 Watching {os.path.abspath(args.root)} (Ctrl+C to stop)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped watching")
+
 def show_memory_insights():
     print("📊 Memory Insights")
     print("=" * 50)
@@ -128,6 +244,15 @@ def show_memory_insights():
             for strategy, metrics in strategies.items():
                 print(f"    {strategy}: Quality={metrics['avg_quality']:.2f}, "
                       f"Coverage={metrics['avg_coverage']:.2f}")
+    
+    bandit = StrategyBandit(memory).summary()
+    if bandit:
+        print("\nAdaptive strategy statistics (reward = quality per second):")
+        for context, arms in bandit.items():
+            print(f"  {context}:")
+            for arm in arms:
+                print(f"    {arm['strategy']}: n={arm['count']}, reward={arm['mean']:.3f}/s, "
+                      f"quality={arm['quality_mean']:.2f}, {arm['seconds_mean']:.1f}s")
 
 def suggest_improvements(args):
     print(f"💡 Suggesting improvements for: {args.function_name}")
@@ -158,6 +283,7 @@ def list_strategies():
     print("3. few-shot - Provides examples in the prompt")
     print("4. cot - Chain of thought reasoning")
     print("5. tdd - Test-driven development approach")
+    print("6. adaptive - Bandit picks naive/diff-aware/few-shot/cot per (language, function type) from past quality per second")
 
 if __name__ == "__main__":
     main()
@@ -4,11 +4,19 @@ import logging
 import argparse
 from pathlib import Path
 import traceback
+import time
+from collections import Counter
+from contextlib import nullcontext
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from extract_prs import REPOS, BASE_OUTPUT_PATH, extract_data
 from ai_agent.agent import AIAgent
+from ai_agent.bandit import ADAPTIVE
+from ai_agent.checkpoint import CheckpointJournal, load_manifest
+from ai_agent.metrics import metrics as stage_metrics
+from ai_agent.profiling import PipelineProfiler, PROFILE_MODES
+from ai_agent.resilience import retry_delay
 
 def setup_logging():
     logging.basicConfig(
@@ -251,23 +259,25 @@ def compare_strategies(pr_data_dir: str, provider: str, model: str):
 
 def process_diff_files(agent: AIAgent, strategies: list[str] = None, compare_strategies: bool = False, 
                       selected_prs=None, repo_filter=None, pr_filter=None, limit=None, interactive=False,
-                      skip_on_error=True):
+                      skip_on_error=True, time_budget=None, profile=None, profile_top=15,
+                      journal=None, max_retries=0, retry_backoff=5.0):
     print(f"\nStep 2: Processing diff files with strategies: {strategies}")
 
     strategies = strategies or ["diff-aware"]  # default if None
 
-    data_dir = Path(BASE_OUTPUT_PATH)
-    if not data_dir.exists():
-        print(f"❌ Data folder {data_dir} not found. Please run data extraction first.")
-        return
+    if selected_prs is None:
+        data_dir = Path(BASE_OUTPUT_PATH)
+        if not data_dir.exists():
+            print(f"❌ Data folder {data_dir} not found. Please run data extraction first.")
+            return
 
-    # Get available PRs
-    available_prs = list_available_prs()
-    if not available_prs:
-        print("❌ No PRs found to process.")
-        return
+        # Get available PRs
+        available_prs = list_available_prs()
+        if not available_prs:
+            print("❌ No PRs found to process.")
+            return
 
-    print(f"Found {len(available_prs)} total PRs in data directory")
+        print(f"Found {len(available_prs)} total PRs in data directory")
 
     # Select which PRs to process
     if selected_prs:
@@ -292,6 +302,13 @@ def process_diff_files(agent: AIAgent, strategies: list[str] = None, compare_str
     processed_count = 0
     failed_count = 0
     results_summary = []
+    skipped_functions = []
+    skipped_runs = []
+    resumed_runs = []
+    partial_runs = []
+    run_started = time.monotonic()
+    # Journal entries are per model, so resuming with another --model/--provider redoes the work
+    run_model = ":".join(part for part in (getattr(agent.llm, 'provider', None), agent.model_name) if part)
 
     for i, pr_info in enumerate(prs_to_process, 1):
         diff_file = pr_info['diff_file']
@@ -315,75 +332,183 @@ def process_diff_files(agent: AIAgent, strategies: list[str] = None, compare_str
             'success': False
         }
 
-        for strategy_idx, prompt_strategy in enumerate(strategies, 1):
-            print(f"\n[Strategy {strategy_idx}/{len(strategies)}] Using: {prompt_strategy}")
+        # Manifest entries can list their own strategies
+        pr_strategies = pr_info.get('strategies') or strategies
+        for strategy_idx, prompt_strategy in enumerate(pr_strategies, 1):
+            if journal is not None and journal.is_done(pr_name, prompt_strategy, run_model):
+                resumed_runs.append(f"{pr_name} [{prompt_strategy}]")
+                print(f"\n⏭️  {pr_name} [{prompt_strategy}] already completed in {journal.path}, skipping")
+                continue
+
+            remaining_budget = None
+            if time_budget is not None:
+                remaining_budget = time_budget - (time.monotonic() - run_started)
+                if remaining_budget <= 0:
+                    skipped_runs.append(f"{pr_name} [{prompt_strategy}]")
+                    continue
+
+            print(f"\n[Strategy {strategy_idx}/{len(pr_strategies)}] Using: {prompt_strategy}")
             
             # Safe folder names
             safe_model_name = agent.model_name.replace("/", "_").replace("-", "_")
             safe_strategy = prompt_strategy.replace("/", "_").replace("-", "_")
-            output_dir = pr_dir / safe_model_name / safe_strategy
+            # Adaptive runs save each test under the strategy the bandit picked for its function
+            output_dir = pr_dir / safe_model_name
+            if prompt_strategy != ADAPTIVE:
+                output_dir = output_dir / safe_strategy
             output_dir.mkdir(parents=True, exist_ok=True)
 
-            try:
-                if compare_strategies:
-                    results = agent.compare_prompt_strategies(
-                        diff_file_path=str(diff_file),
-                        output_dir=str(output_dir)
-                    )
-                    print(f"✅ Strategy comparison complete for {pr_name} [{prompt_strategy}]")
-                    pr_results['strategies'][prompt_strategy] = {
-                        'success': True,
-                        'type': 'comparison',
-                        'output_dir': str(output_dir)
-                    }
-                else:
-                    results = agent.process_diff_file(
-                        diff_file_path=str(diff_file),
-                        output_dir=str(output_dir),
-                        prompt_strategy=prompt_strategy,
-                        generate_docs=True
-                    )
+            stop_pr = False
+            attempt = 0
+            while True:
+                attempt += 1
+                retry_pending = False
+                # One profile per PR/strategy run, written next to its generated tests
+                profiler = PipelineProfiler(profile) if profile else None
+                try:
+                    with stage_metrics.labels(pr=pr_name, strategy=prompt_strategy), (profiler or nullcontext()):
+                        if compare_strategies:
+                            results = agent.compare_prompt_strategies(
+                                diff_file_path=str(diff_file),
+                                output_dir=str(output_dir)
+                            )
+                            print(f"✅ Strategy comparison complete for {pr_name} [{prompt_strategy}]")
+                            pr_results['strategies'][prompt_strategy] = {
+                                'success': True,
+                                'type': 'comparison',
+                                'output_dir': str(output_dir)
+                            }
+                        else:
+                            results = agent.process_diff_file(
+                                diff_file_path=str(diff_file),
+                                output_dir=str(output_dir),
+                                prompt_strategy=prompt_strategy,
+                                generate_docs=True,
+                                time_budget=remaining_budget
+                            )
                     
-                    num_tests = len(results.get('generated_tests', []))
-                    num_docs = len(results.get('generated_docs', []))
+                            num_tests = len(results.get('generated_tests', []))
+                            num_docs = len(results.get('generated_docs', []))
+                            failed_functions = results.get('failed', [])
+                            run_skipped = results.get('skipped', [])
                     
-                    print(f"✅ Processing complete for {pr_name} [{prompt_strategy}]")
-                    print(f"   📄 Generated: {num_tests} tests, {num_docs} docs")
+                            num_reused = len(results.get('reused_tests', []))
+                            strategy_choices = results.get('strategy_choices', {})
+                            if strategy_choices:
+                                choices = Counter(strategy_choices.values())
+                                print("   🎰 Strategies chosen: "
+                                      + ", ".join(f"{s} x{n}" for s, n in choices.most_common()))
+                                for function, arm in strategy_choices.items():
+                                    print(f"      {function} -> {arm}")
+                            print(f"   📄 Generated: {num_tests} tests, {num_docs} docs"
+                                  + (f" ({num_reused} reused unchanged)" if num_reused else ""))
+                            scores = [s for s in results.get('mutation_scores', {}).values() if s is not None]
+                            if scores:
+                                print(f"   🧬 Mean mutation score over {len(scores)} functions: "
+                                      f"{sum(scores) / len(scores):.2f}")
+                            execution = results.get('execution', {}).get('summary')
+                            if execution and execution['files']:
+                                print(f"   🧪 Executed {execution['files']} test files: {execution['passed']} passed, "
+                                      f"{execution['failed']} failed, {execution['errors']} errors, "
+                                      f"coverage {execution['coverage']:.0%}")
                     
-                    pr_results['strategies'][prompt_strategy] = {
-                        'success': True,
-                        'type': 'processing',
-                        'tests_generated': num_tests,
-                        'docs_generated': num_docs,
-                        'output_dir': str(output_dir)
-                    }
+                            # The agent logs and skips per-function errors, so judge the run by its functions
+                            if failed_functions and not num_tests:
+                                status = "failed"
+                            elif failed_functions or run_skipped:
+                                status = "partial"
+                            else:
+                                status = "done"
+                            pr_results['strategies'][prompt_strategy] = {
+                                'success': status != "failed",
+                                'type': 'processing',
+                                'status': status,
+                                'tests_generated': num_tests,
+                                'tests_reused': num_reused,
+                                'execution': execution,
+                                'docs_generated': num_docs,
+                                'output_dir': str(output_dir)
+                            }
+                            if strategy_choices:
+                                pr_results['strategies'][prompt_strategy]['strategy_choices'] = strategy_choices
+                            if status == "done":
+                                print(f"✅ Processing complete for {pr_name} [{prompt_strategy}]")
+                            else:
+                                print(f"⚠️  {pr_name} [{prompt_strategy}] {status}: {len(failed_functions)} "
+                                      f"function(s) failed, {len(run_skipped)} skipped for the time budget")
+                                pr_results['strategies'][prompt_strategy].update(
+                                    failed_functions=failed_functions, skipped_functions=run_skipped)
+                                if status == "failed":
+                                    pr_results['strategies'][prompt_strategy]['error'] = \
+                                        f"all {len(failed_functions)} function(s) failed: {failed_functions[0]['error']}"
 
-                processed_count += 1
-                pr_results['success'] = True
+                    run = pr_results['strategies'][prompt_strategy]
+                    status = run.get('status', "done")
+                    if run.get('failed_functions') and attempt <= max_retries:
+                        # Generated tests are reused by fingerprint, so a retry only redoes the failures
+                        retry_in = retry_delay(attempt - 1, base=retry_backoff, cap=300.0)
+                        print(f"🔁 Retrying {pr_name} [{prompt_strategy}] in {retry_in:.1f}s "
+                              f"(attempt {attempt + 1}/{max_retries + 1})")
+                        retry_pending = True
+                    else:
+                        for skipped in run.get('skipped_functions', []):
+                            skipped_functions.append(dict(skipped, pr=pr_name, strategy=prompt_strategy))
+                        if status == "failed":
+                            failed_count += 1
+                            stop_pr = skip_on_error
+                        else:
+                            processed_count += 1
+                            pr_results['success'] = True
+                        if status == "partial":
+                            partial_runs.append(f"{pr_name} [{prompt_strategy}]")
+                        if journal is not None:
+                            journal.record(pr_name, prompt_strategy, status, attempt, model=run_model,
+                                           **{k: v for k, v in run.items() if k not in ('success', 'status')})
 
-            except Exception as e:
-                error_msg = str(e)
-                print(f"❌ Error processing {pr_name} [{prompt_strategy}]: {error_msg}")
-                
-                # Log full traceback for debugging
-                logging.error(f"Full traceback for {pr_name} [{prompt_strategy}]:")
-                logging.error(traceback.format_exc())
+                except Exception as e:
+                    error_msg = str(e)
+                    print(f"❌ Error processing {pr_name} [{prompt_strategy}]: {error_msg}")
                 
-                pr_results['strategies'][prompt_strategy] = {
-                    'success': False,
-                    'error': error_msg,
-                    'output_dir': str(output_dir)
-                }
+                    # Log full traceback for debugging
+                    logging.error(f"Full traceback for {pr_name} [{prompt_strategy}]:")
+                    logging.error(traceback.format_exc())
                 
-                failed_count += 1
+                    if attempt <= max_retries:
+                        retry_in = retry_delay(attempt - 1, base=retry_backoff, cap=300.0)
+                        print(f"🔁 Retrying {pr_name} [{prompt_strategy}] in {retry_in:.1f}s "
+                              f"(attempt {attempt + 1}/{max_retries + 1})")
+                        retry_pending = True
+                    else:
+                        pr_results['strategies'][prompt_strategy] = {
+                            'success': False,
+                            'error': error_msg,
+                            'output_dir': str(output_dir)
+                        }
                 
-                if skip_on_error:
-                    print(f"⚠️  Skipping remaining strategies for {pr_name}")
+                        failed_count += 1
+                        if journal is not None:
+                            journal.record(pr_name, prompt_strategy, "failed", attempt, model=run_model,
+                                           error=error_msg)
+                        stop_pr = skip_on_error
+                finally:
+                    if profiler is not None:
+                        try:
+                            paths = profiler.write(str(output_dir), top_n=profile_top)
+                            print(f"\n🔥 Profile for {pr_name} [{prompt_strategy}] ({profiler.wall_seconds:.1f}s), top {profile_top} by self time:")
+                            print(profiler.format_top(profile_top))
+                            print(f"   Written: {', '.join(paths)}")
+                        except Exception as e:
+                            logging.error(f"Could not write profile for {pr_name} [{prompt_strategy}]: {e}")
+                if not retry_pending:
                     break
-                else:
-                    continue
+                time.sleep(retry_in)
+
+            if stop_pr:
+                print(f"⚠️  Skipping remaining strategies for {pr_name}")
+                break
 
-        results_summary.append(pr_results)
+        if pr_results['strategies']:
+            results_summary.append(pr_results)
 
     # Print final summary
     print(f"\n{'='*60}")
@@ -402,12 +527,39 @@ def process_diff_files(agent: AIAgent, strategies: list[str] = None, compare_str
         for strategy, details in result['strategies'].items():
             if details['success']:
                 if details['type'] == 'processing':
-                    print(f"   {strategy}: {details['tests_generated']} tests, {details['docs_generated']} docs")
+                    print(f"   {strategy}: {details['tests_generated']} tests, {details['docs_generated']} docs"
+                          + (f", {len(details['failed_functions'])} function(s) failed"
+                             if details.get('failed_functions') else ""))
                 else:
                     print(f"   {strategy}: comparison complete")
             else:
                 print(f"   {strategy}: FAILED - {details['error']}")
 
+    if time_budget is not None:
+        print(f"\n⏱️  Time budget: {time_budget:.0f}s, used {time.monotonic() - run_started:.1f}s")
+        if skipped_functions:
+            print(f"Skipped {len(skipped_functions)} function(s) after the budget was reached:")
+            for skipped in skipped_functions:
+                print(f"   {skipped['pr']} [{skipped['strategy']}] {skipped['file']}::{skipped['function']} "
+                      f"(priority {skipped['score']})")
+        if skipped_runs:
+            print(f"Skipped {len(skipped_runs)} PR/strategy run(s) entirely:")
+            for run in skipped_runs:
+                print(f"   {run}")
+
+    if journal is not None:
+        print(f"\n📒 Checkpoint journal: {journal.path} {journal.summary()}")
+        if resumed_runs:
+            print(f"Resumed: skipped {len(resumed_runs)} run(s) already completed")
+        if partial_runs:
+            print(f"Partial: {len(partial_runs)} run(s) will be redone on resume: {', '.join(partial_runs)}")
+
+    if stage_metrics.spans:
+        print("\n⏱️  Per-stage timings")
+        print(stage_metrics.format_summary())
+        if stage_metrics.path:
+            print(f"Spans written to {stage_metrics.path}")
+
 def main():
     parser = argparse.ArgumentParser(description="AI Pair Programming Agent")
     parser.add_argument("--extract-only", action="store_true", help="Only extract PR data")
@@ -417,6 +569,9 @@ def main():
                        help="Prompt strategy to use (all strategies now use enhanced context processing)")
     parser.add_argument("--compare-strategies", action="store_true", 
                        help="Compare all prompt strategies")
+    parser.add_argument("--adaptive-strategy", action="store_true",
+                       help="Let a bandit (AI_AGENT_BANDIT=thompson|ucb) pick one strategy per function from the "
+                            "quality per second recorded in memory, instead of running a fixed one")
     parser.add_argument("--model", default="h2oai/h2ogpt-16k-codellama-13b-python",
                        help="LLM model to use. For Ollama, use model name like 'deepseek-coder'")
     parser.add_argument("--hf-token", default=None,
@@ -441,6 +596,46 @@ def main():
                        help="Limit number of PRs to process")
     parser.add_argument("--continue-on-error", action="store_true",
                        help="Continue processing other strategies even if one fails")
+    parser.add_argument("--manifest", type=str, default=None,
+                       help="Batch mode: JSON or text file listing PR directories (and optional strategies) "
+                            "to process instead of scanning the data folder")
+    parser.add_argument("--checkpoint", type=str, default=None,
+                       help="Checkpoint journal appended after each PR x strategy run "
+                            "(default with --manifest: <manifest>.checkpoint.jsonl)")
+    parser.add_argument("--resume", action="store_true",
+                       help="Skip PR x strategy runs already completed in the checkpoint journal")
+    parser.add_argument("--max-retries", type=int, default=None,
+                       help="Retries per failed PR x strategy run, with exponential backoff "
+                            "(default: 2 with --manifest, otherwise 0)")
+    parser.add_argument("--retry-backoff", type=float, default=5.0,
+                       help="Base delay in seconds for retry backoff (doubles per attempt, with jitter)")
+    parser.add_argument("--time-budget", type=float, default=None,
+                       help="Wall-clock budget in seconds; highest-priority functions are processed first "
+                            "and the rest are reported as skipped")
+    parser.add_argument("--profile", nargs="?", const="sample", choices=PROFILE_MODES, default=None,
+                       help="Profile each PR run: 'sample' (default; collapsed stacks + SVG flamegraph) "
+                            "or 'cprofile' (.prof file); written next to the generated tests")
+    parser.add_argument("--profile-top", type=int, default=15,
+                       help="Number of functions to show, ranked by self time, with --profile")
+    parser.add_argument("--execute-tests", action="store_true",
+                       help="Run the generated Python tests with pytest in sandboxed subprocesses and record "
+                            "pass rate and line coverage")
+    parser.add_argument("--candidates", type=int, default=None,
+                       help="Best-of-N: sample N tests per function in one batched/concurrent call and keep "
+                            "the best by syntax, import resolvability and assertion density "
+                            "(default: AI_AGENT_CANDIDATES or 1)")
+    parser.add_argument("--mutation-testing", action="store_true",
+                       help="Score each generated Python test by the share of AST mutants of its function it "
+                            "kills (stored as mutation_score in memory)")
+    parser.add_argument("--force-regenerate", action="store_true",
+                       help="Regenerate tests even for functions whose normalized body is unchanged "
+                            "since their last test (default: reuse; AI_AGENT_REUSE_TESTS=0 also disables)")
+    parser.add_argument("--memory", type=str, default=None,
+                       help="Memory location: a JSON file, or a SQLite file (*.db or sqlite:///path) shared by "
+                            "concurrent agents (default: AI_AGENT_MEMORY or agent_memory.json)")
+    parser.add_argument("--metrics-file", type=str, default=None,
+                       help="Append per-stage timing and token spans to this JSONL file "
+                            "(default: AI_AGENT_METRICS_FILE)")
     
     # Enhanced context options
     parser.add_argument("--pr-data-dir", type=str, help="Process specific PR data directory")
@@ -451,6 +646,8 @@ def main():
     args = parser.parse_args()
     
     setup_logging()
+    if args.metrics_file:
+        stage_metrics.configure(args.metrics_file)
     
     print("🤖 AI Pair Programming Agent for Automated Test Writing and Documentation")
     print("=" * 70)
@@ -493,11 +690,16 @@ def main():
                 if not hf_token:
                     print("⚠️  No HF token detected. Remote providers may fail or be rate-limited.")
             
-            agent = AIAgent(model_name=args.model, api_token=hf_token, provider=args.provider)
+            agent = AIAgent(model_name=args.model, api_token=hf_token, provider=args.provider,
+                            reuse_unchanged=False if args.force_regenerate else None,
+                            execute_tests=args.execute_tests,
+                            mutation_testing=args.mutation_testing,
+                            num_candidates=args.candidates,
+                            memory_file=args.memory)
             print("✅ AI Agent started successfully!")
             print(f"   Model: {args.model}")
             print(f"   Provider: {args.provider}")
-            print(f"   Strategy: {args.prompt_strategy}")
+            print(f"   Strategy: {ADAPTIVE if args.adaptive_strategy else args.prompt_strategy}")
             
         except Exception as e:
             print(f"❌ Error starting AI Agent: {e}")
@@ -517,15 +719,37 @@ def main():
             return
     
     if not args.extract_only:
+        strategies = [ADAPTIVE] if args.adaptive_strategy else [args.prompt_strategy]
+        selected_prs = None
+        if args.manifest:
+            try:
+                selected_prs = load_manifest(args.manifest, strategies)
+            except (OSError, ValueError) as e:
+                print(f"❌ Could not read manifest {args.manifest}: {e}")
+                return
+            print(f"📋 Manifest {args.manifest}: {len(selected_prs)} PR(s), "
+                  f"{sum(len(pr['strategies']) for pr in selected_prs)} PR x strategy run(s)")
+        checkpoint = args.checkpoint or (f"{args.manifest}.checkpoint.jsonl" if args.manifest else None)
+        if args.resume and not checkpoint:
+            checkpoint = "agent_checkpoint.jsonl"
+        journal = CheckpointJournal(checkpoint, resume=args.resume) if checkpoint else None
+        max_retries = args.max_retries if args.max_retries is not None else (2 if args.manifest else 0)
         process_diff_files(
             agent, 
-            strategies=[args.prompt_strategy], 
+            strategies=strategies, 
+            selected_prs=selected_prs,
             compare_strategies=args.compare_strategies,
             repo_filter=args.repo_filter,
             pr_filter=args.pr_filter,
             limit=args.limit,
             interactive=args.interactive,
-            skip_on_error=not args.continue_on_error
+            skip_on_error=not args.continue_on_error,
+            time_budget=args.time_budget,
+            profile=args.profile,
+            profile_top=args.profile_top,
+            journal=journal,
+            max_retries=max_retries,
+            retry_backoff=args.retry_backoff
         )
         
         if args.memory_insights:
@@ -543,6 +767,12 @@ def main():
                         for strategy, metrics in strategies.items():
                             print(f"    {strategy}: Quality={metrics['avg_quality']:.2f}, "
                                   f"Coverage={metrics['avg_coverage']:.2f}")
+                bandit = agent.strategy_bandit.summary()
+                if bandit:
+                    print("\nAdaptive strategy statistics (reward = quality per second):")
+                    for context, arms in bandit.items():
+                        print(f"  {context}: " + ", ".join(
+                            f"{arm['strategy']} n={arm['count']} {arm['mean']:.3f}/s" for arm in arms))
             except Exception as e:
                 print(f"❌ Error getting memory insights: {e}")
         
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script to verify best-of-N candidate ranking.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.candidate_ranking import local_modules_for, rank_candidates, score_candidate
+
+GOOD = """import pytest
+from calc import add
+
+def test_add():
+    assert add(1, 2) == 3
+    assert add(-1, 1) == 0
+
+def test_add_floats():
+    assert add(0.5, 0.5) == 1.0
+"""
+UNRESOLVED = GOOD.replace("import pytest", "import pytest\nimport not_a_real_module_xyz")
+WEAK = "from calc import add\n\ndef test_add():\n    add(1, 2)\n"
+BROKEN = "from calc import add\n\ndef test_add(:\n    assert add(1, 2) == 3\n"
+
+JAVA_GOOD = """class CalcTest {
+    @Test
+    void adds() {
+        assertEquals(3, Calc.add(1, 2));
+        assertEquals(0, Calc.add(-1, 1));
+    }
+}
+"""
+JAVA_BROKEN = JAVA_GOOD.rstrip().rstrip("}")
+
+
+def test_candidate_ranking():
+    """Syntax validity first, then import resolvability and assertion density."""
+
+    print("🧪 Testing Candidate Ranking")
+    print("=" * 50)
+
+    local = local_modules_for(["calc.py", "src/pkg/util.py", "README.md"])
+    ranked = rank_candidates([BROKEN, WEAK, UNRESOLVED, GOOD], "python", local)
+    order = [{GOOD: "good", UNRESOLVED: "unresolved", WEAK: "weak", BROKEN: "broken"}[code] for _, code in ranked]
+    for score, code in ranked:
+        print(f"   {score.score:.3f} syntax={score.syntax_ok} imports={score.import_ratio:.2f} "
+              f"assertions={score.assertions} tests={score.tests}")
+    java = rank_candidates([JAVA_BROKEN, JAVA_GOOD], "java")
+
+    checks = [
+        ("local modules from source paths", local == {"calc", "pkg"}),
+        ("ranked good > unresolved > weak > broken", order == ["good", "unresolved", "weak", "broken"]),
+        ("broken candidate flagged", not score_candidate(BROKEN, "python", local).syntax_ok),
+        ("unresolved import lowers the ratio", score_candidate(UNRESOLVED, "python", local).import_ratio < 1.0),
+        ("java: balanced candidate wins", java[0][1] == JAVA_GOOD and java[0][0].assertions == 2),
+        ("ties keep generation order", rank_candidates([GOOD, GOOD + "\n"], "python", local)[0][1] == GOOD),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_candidate_ranking()
+    print("\n🎉 All candidate ranking tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script to verify batch manifests and the checkpoint journal.
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.checkpoint import CheckpointJournal, load_manifest
+
+
+def test_checkpoint():
+    """Manifests parse, finished runs survive a torn write and only complete runs per model are skipped."""
+
+    print("🧪 Testing Checkpoint Journal")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        text_manifest = os.path.join(tmp, "batch.txt")
+        with open(text_manifest, "w") as f:
+            f.write("# nightly\ndata/repo_a/PR_1 naive,cot\n\ndata/repo_b/PR_2  # default strategy\n")
+        text_prs = load_manifest(text_manifest, ["diff-aware"])
+
+        json_manifest = os.path.join(tmp, "batch.json")
+        with open(json_manifest, "w") as f:
+            json.dump({"strategies": ["few-shot"],
+                       "prs": ["data/repo_a/PR_1", {"path": "/abs/repo_c/PR_3", "strategies": ["adaptive"]}]}, f)
+        json_prs = load_manifest(json_manifest)
+
+        bad_manifest = os.path.join(tmp, "bad.txt")
+        with open(bad_manifest, "w") as f:
+            f.write("data/repo_a/PR_1 bogus\n")
+        try:
+            load_manifest(bad_manifest)
+            rejected = False
+        except ValueError:
+            rejected = True
+
+        path = os.path.join(tmp, "batch.checkpoint.jsonl")
+        journal = CheckpointJournal(path)
+        journal.record("repo_a/PR_PR_1", "naive", "failed", attempts=3, error="timeout")
+        journal.record("repo_a/PR_PR_1", "naive", "done", attempts=1)
+        journal.record("repo_a/PR_PR_1", "cot", "done", attempts=2)
+        journal.record("repo_a/PR_PR_1", "cot", "partial", model="ollama:codellama:7b",
+                       failed_functions=[{"file": "calc.py", "function": "add", "error": "timeout"}])
+        journal.record("repo_a/PR_PR_1", "naive", "failed", attempts=3, model="ollama:codellama:7b")
+        with open(path, "a") as f:
+            f.write('{"pr": "repo_b/PR_PR_2", "stra')
+        resumed = CheckpointJournal(path)
+        before_append = resumed.summary()
+        resumed.record("repo_b/PR_PR_2", "diff-aware", "done")
+        resumed.record("repo_b/PR_PR_2", "diff-aware", "done", model="openai:gpt-4o")
+        reloaded = CheckpointJournal(path)
+        fresh = CheckpointJournal(path, resume=False)
+
+    print(f"   text manifest: {[(p['full_name'], p['strategies']) for p in text_prs]}")
+    print(f"   journal: {reloaded.summary()}")
+
+    checks = [
+        ("text manifest lines and strategies", [(p['full_name'], p['strategies']) for p in text_prs]
+         == [("repo_a/PR_PR_1", ["naive", "cot"]), ("repo_b/PR_PR_2", ["diff-aware"])]),
+        ("relative paths resolve against the manifest", str(text_prs[0]['diff_file'])
+         == os.path.join(tmp, "data", "repo_a", "PR_1", "diff.patch")),
+        ("JSON manifest defaults and overrides", [p['strategies'] for p in json_prs] == [["few-shot"], ["adaptive"]]
+         and str(json_prs[1]['path']) == "/abs/repo_c/PR_3"),
+        ("unknown strategies are rejected", rejected),
+        ("latest record per run wins", resumed.is_done("repo_a/PR_PR_1", "naive")),
+        ("torn line is ignored on resume", before_append == {"done": 2, "partial": 1, "failed": 1}),
+        ("appends after a torn line stay readable", reloaded.summary() == {"done": 4, "partial": 1, "failed": 1}),
+        ("partial and failed runs are not complete", not reloaded.is_done("repo_a/PR_PR_1", "cot", "ollama:codellama:7b")
+         and not reloaded.is_done("repo_a/PR_PR_1", "naive", "ollama:codellama:7b")),
+        ("partial runs keep their failed functions",
+         reloaded.records[("repo_a/PR_PR_1", "cot", "ollama:codellama:7b")]["failed_functions"][0]["function"] == "add"),
+        ("runs are tracked per model", reloaded.is_done("repo_b/PR_PR_2", "diff-aware", "openai:gpt-4o")
+         and not reloaded.is_done("repo_b/PR_PR_2", "diff-aware", "ollama:codellama:7b")),
+        ("without resume nothing is skipped", not fresh.is_done("repo_a/PR_PR_1", "cot")),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_checkpoint()
+    print("\n🎉 All checkpoint tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
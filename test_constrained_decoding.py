@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the code-only logits processor used for constrained decoding.
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+
+from ai_agent.constrained import CodeOnlyLogitsProcessor
+from ai_agent.enhanced_context import EnhancedContextLoader
+from ai_agent.generator import TestGenerator
+
+
+class WordVocabulary:
+    """Minimal stand-in for TokenVocabulary with whole-word tokens"""
+
+    def __init__(self, words):
+        self.texts = ["</s>"] + list(words)
+        self.banned_ids = torch.tensor([i for i, t in enumerate(self.texts) if "`" in t], dtype=torch.long)
+        self.eos_ids = [0]
+
+
+WORDS = ["import", " pytest", "\n", "def", " test_add", "():", "\n    ", "assert", " True",
+         "Here", " is", " the", " test", ":", "```", "python", "Sure", ",", "client", " =", " Client", "()"]
+
+
+def emit(vocabulary, text_tokens, language="python"):
+    """Greedy decode where the 'model' always prefers the next token of ``text_tokens``"""
+    processor = CodeOnlyLogitsProcessor(vocabulary, language, prompt_length=1)
+    ids = [0]
+    output = []
+    for token in text_tokens:
+        scores = torch.zeros(1, len(vocabulary.texts))
+        scores[0, vocabulary.texts.index(token)] = 10.0
+        scores = processor(torch.tensor([ids]), scores)
+        chosen = int(scores[0].argmax())
+        if chosen != vocabulary.texts.index(token):
+            output.append("<blocked>")
+            break
+        ids.append(chosen)
+        output.append(token)
+    return "".join(output), processor.blocked_tokens
+
+
+def test_constrained_decoding():
+    """Code passes through untouched while prose and fences are blocked."""
+
+    print("🧪 Testing Constrained Decoding")
+    print("=" * 50)
+
+    vocabulary = WordVocabulary(WORDS)
+    test_cases = [
+        (["import", " pytest", "\n", "def", " test_add", "():", "\n    ", "assert", " True", "\n"], False),
+        (["client", " =", " Client", "()", "\n"], False),
+        (["Here", " is", " the", " test", ":"], True),
+        (["Sure", ","], True),
+        (["```", "python"], True),
+        (["import", " pytest", "\n", "Here", " is"], True),
+    ]
+
+    all_passed = True
+    for tokens, should_block in test_cases:
+        output, blocked = emit(vocabulary, tokens)
+        was_blocked = output.endswith("<blocked>")
+        passed = was_blocked == should_block and (blocked > 0) == should_block
+        all_passed = all_passed and passed
+        status = "✅" if passed else "❌"
+        print(f"   {status} {''.join(tokens)!r} -> {output!r}")
+
+    return all_passed
+
+
+# Passes TestGenerator's validation, so each generation is exactly one LLM call
+GENERATED_TEST = """from calc import add, sub
+
+
+def test_add(): assert add(1, 2) == 3
+"""
+
+
+class MinimalLLM:
+    """An injected LLM that only implements ``generate(prompt)``"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate(self, prompt):
+        self.calls += 1
+        return GENERATED_TEST
+
+    def generate_candidates(self, prompt, n):
+        self.calls += 1
+        return [GENERATED_TEST] * n
+
+
+class HintedLLM(MinimalLLM):
+    """An LLM that takes the constrained-decoding hint"""
+
+    def __init__(self):
+        super().__init__()
+        self.languages = []
+
+    def generate(self, prompt, code_language=None):
+        self.languages.append(code_language)
+        return super().generate(prompt)
+
+
+def test_injected_llms():
+    """LLMs without a code_language parameter still work; those with one receive it."""
+
+    print("\n🧪 Testing Injected LLMs")
+    print("=" * 50)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        context = EnhancedContextLoader(tmp)
+        for llm, candidates in ((MinimalLLM(), 1), (MinimalLLM(), 3), (HintedLLM(), 1)):
+            generator = TestGenerator(llm, num_candidates=candidates)
+            code = generator.generate_tests_with_enhanced_context(
+                function_code="def add(a, b):\n    return a + b\n", function_name="add", file_path="calc.py",
+                language="python", enhanced_context=context, output_dir=tmp, prompt_strategy="naive")
+            results.append((llm, generator, code))
+
+    checks = [
+        ("generate without code_language is called", results[0][0].calls == 1
+         and results[0][1].last_fallback_error is None and "def test_add" in results[0][2]),
+        ("generate_candidates without code_language is called", results[1][0].calls == 1
+         and results[1][1].last_fallback_error is None),
+        ("code_language reaches LLMs that accept it", results[2][0].languages == ["python"]),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_constrained_decoding()
+    success = test_injected_llms() and success
+    print("\n🎉 All constrained decoding tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script to verify memoized PR-level context in EnhancedContextLoader.
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.enhanced_context import EnhancedContextLoader
+from ai_agent.metrics import metrics
+
+
+def write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_context_cache():
+    """Derived context is computed once per PR, callers get private copies and invalidation is targeted."""
+
+    print("🧪 Testing Context Cache")
+    print("=" * 50)
+
+    metrics.reset()
+    with tempfile.TemporaryDirectory() as tmp:
+        pr_dir = os.path.join(tmp, "PR_1")
+        os.makedirs(pr_dir)
+        write(os.path.join(pr_dir, "enhanced_patches.json"),
+              json.dumps({"calc.py": {"language": "python", "patch": "+def add(a, b):"}}))
+        write(os.path.join(tmp, "test_calc.py"), "def test_add():\n    assert add(1, 2) == 3\n")
+        loader = EnhancedContextLoader(pr_dir)
+
+        first = loader._get_existing_test_patterns("py")
+        second = loader._get_existing_test_patterns("py")
+        same_result = first == second
+        hits_after_repeat = metrics.counter("context_cache_hit")
+        misses_after_repeat = metrics.counter("context_cache_miss")
+
+        # A caller that edits its result must not change what later prompts see
+        second[0]["content"] = "corrupted"
+        second.append({"file": "bogus"})
+        structure = loader._get_repository_structure()
+        structure["root_files"].append("bogus")
+        after_mutation = loader._get_existing_test_patterns("py")
+        structure_after_mutation = loader._get_repository_structure()
+
+        # New test files only show up once their section and language are invalidated
+        write(os.path.join(tmp, "test_more.py"), "def test_sub():\n    assert sub(3, 2) == 1\n")
+        stale = loader._get_existing_test_patterns("py")
+        loader.invalidate_cache("existing_test_patterns", "go")
+        other_language = loader._get_existing_test_patterns("py")
+        misses_before = metrics.counter("context_cache_miss")
+        loader.invalidate_cache("existing_test_patterns", "py")
+        refreshed = loader._get_existing_test_patterns("py")
+        loader._get_repository_structure()
+        targeted_misses = metrics.counter("context_cache_miss") - misses_before
+
+        index = loader.get_symbol_index()
+        same_index = loader.get_symbol_index() is index
+        loader.invalidate_cache()
+        cleared = not loader._derived_cache
+
+    print(f"   counters: {metrics.counter('context_cache_hit')} hits, {metrics.counter('context_cache_miss')} misses")
+
+    checks = [
+        ("repeat lookups are cache hits", misses_after_repeat == 1 and hits_after_repeat == 1 and same_result),
+        ("mutating a result does not corrupt the cache", len(after_mutation) == 1
+         and after_mutation[0]["content"] == first[0]["content"]
+         and "bogus" not in structure_after_mutation["root_files"]),
+        ("cached results stay until invalidated", len(stale) == 1),
+        ("invalidation is scoped to section and language", len(other_language) == 1),
+        ("invalidated sections are recomputed, others stay cached", len(refreshed) == 2 and targeted_misses == 1),
+        ("the symbol index is shared, not copied", same_index),
+        ("invalidate_cache() with no arguments drops everything", cleared),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_context_cache()
+    print("\n🎉 All context cache tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test script to verify routing and draining across several Ollama endpoints.
+"""
+
+import sys
+import os
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.backends import OllamaEndpointPool
+from ai_agent.resilience import CircuitOpenError
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Answers /api/tags like an Ollama server, or 503 while ``server.down`` is set"""
+
+    def do_GET(self):
+        status = 503 if self.server.down else 200
+        body = json.dumps({"models": [{"name": "codellama:7b"}]}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    server.down = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def closed_port_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}"
+
+
+def test_endpoint_pool():
+    """Requests go to the least-loaded healthy node; drained or tripped nodes are skipped until they recover."""
+
+    print("🧪 Testing Ollama Endpoint Pool")
+    print("=" * 50)
+
+    (server_a, url_a), (server_b, url_b) = start_server(), start_server()
+    dead = closed_port_url()
+    clock = FakeClock()
+    try:
+        parsed = OllamaEndpointPool.parse_urls(f"{url_a}/, {url_b}  {url_a}")
+        pool = OllamaEndpointPool([url_a, url_b, dead], health_interval=30.0, health_timeout=1.0,
+                                  failure_threshold=2, recovery_timeout=60.0, clock=clock)
+        a, b, c = pool.endpoints
+
+        first, second = pool.acquire(), pool.acquire()
+        spread = {first.url, second.url} == {url_a, url_b}
+        pool.release(first, success=True)
+        least_loaded = pool.acquire() is first
+        pool.release(first, success=True)
+        pool.release(second, success=True)
+        models = a.models
+        dead_skipped = not c.healthy and c.outstanding == 0
+
+        excluded = pool.acquire(exclude=[a])
+        pool.release(excluded, success=True)
+
+        # A dropped connection drains the node until a later health check passes
+        held = pool.acquire(exclude=[b])
+        pool.release(held, success=False, drain=True)
+        while_drained = [pool.acquire() for _ in range(3)]
+        for endpoint in while_drained:
+            pool.release(endpoint, success=True)
+        clock.now += 31.0
+        pool.release(pool.acquire(), success=True)
+        recovered = a.healthy
+
+        # A node that stays down fails its re-check and stays drained
+        server_b.down = True
+        pool.release(pool.acquire(exclude=[a]), success=False, drain=True)
+        clock.now += 31.0
+        after_recheck = [pool.acquire() for _ in range(2)]
+        for endpoint in after_recheck:
+            pool.release(endpoint, success=True)
+        still_drained = not b.healthy
+
+        # Repeated request failures trip the node's own breaker
+        for _ in range(2):
+            endpoint = pool.acquire()
+            pool.release(endpoint, success=False)
+        try:
+            pool.acquire()
+            all_down = False
+        except CircuitOpenError:
+            all_down = True
+        status = pool.status()
+    finally:
+        server_a.shutdown()
+        server_b.shutdown()
+
+    print(f"   status: {status}")
+
+    checks = [
+        ("URL lists are split and deduplicated", parsed == [url_a, url_b]),
+        ("concurrent requests spread across nodes", spread),
+        ("least outstanding requests wins", least_loaded),
+        ("health checks read the model list", models == ["codellama:7b"]),
+        ("unreachable nodes are never used", dead_skipped),
+        ("excluded nodes are avoided", excluded is b),
+        ("drained node gets no requests", all(endpoint is b for endpoint in while_drained)),
+        ("drained node rejoins after a passing re-check", recovered),
+        ("node failing its re-check stays drained", still_drained and all(e is a for e in after_recheck)),
+        ("breaker opens and no nodes left raises", all_down and status[0]["circuit"] == "open"),
+        ("released requests are no longer outstanding", all(e["outstanding"] == 0 for e in status)),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_endpoint_pool()
+    print("\n🎉 All endpoint pool tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
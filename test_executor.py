@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test script to verify sandboxed execution of generated tests.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.executor import TestExecutor, summarize_results
+
+SOURCES = {
+    "pkg/__init__.py": "",
+    "pkg/calc.py": (
+        "def add(a, b):\n"
+        "    return a + b\n"
+        "\n"
+        "def div(a, b):\n"
+        "    if b == 0:\n"
+        "        raise ZeroDivisionError('b must not be zero')\n"
+        "    return a / b\n"
+    ),
+}
+
+TESTS = {
+    "test_add.py": "from pkg.calc import add\n\ndef test_add():\n    assert add(1, 2) == 3\n",
+    "test_div.py": (
+        "import pytest\nfrom pkg.calc import div\n\n"
+        "def test_div():\n    assert div(4, 2) == 3\n\n"
+        "def test_div_zero():\n    with pytest.raises(ZeroDivisionError):\n        div(1, 0)\n"
+    ),
+    "test_broken.py": "from pkg.calc import (\n",
+    "test_hang.py": "def test_hang():\n    while True:\n        pass\n",
+    "test_env.py": "import os\n\ndef test_env():\n    assert 'AI_AGENT_SECRET' not in os.environ\n",
+}
+
+
+def test_executor():
+    """Outcomes, coverage, timeouts and environment scrubbing."""
+
+    print("🧪 Testing Test Executor")
+    print("=" * 50)
+
+    os.environ["AI_AGENT_SECRET"] = "token"
+    results = TestExecutor(timeout=3).run_tests(TESTS, SOURCES)
+    for name, result in sorted(results.items()):
+        print(f"   {name}: {result['status']} ({result['passed']} passed, {result['failed']} failed, "
+              f"{result['errors']} errors, coverage {result['coverage']:.0%}, {result['duration_s']:.2f}s)")
+    summary = summarize_results(results)
+
+    checks = [
+        ("passing test passes", results["test_add.py"]["status"] == "passed"),
+        ("only imported lines count towards coverage",
+         results["test_add.py"]["files"] == {"pkg/calc.py": {"covered": 3, "lines": 6}}),
+        ("failing assertion is reported",
+         results["test_div.py"]["status"] == "failed" and results["test_div.py"]["passed"] == 1),
+        ("both branches covered", results["test_div.py"]["coverage"] > results["test_add.py"]["coverage"]),
+        ("syntax error is a collection error", results["test_broken.py"]["status"] == "error"),
+        ("infinite loop is killed", results["test_hang.py"]["status"] == "timeout"),
+        ("environment is scrubbed", results["test_env.py"]["status"] == "passed"),
+        ("summary totals", summary["files"] == 5 and summary["passed"] == 3),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_executor()
+    print("\n🎉 All executor tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script to verify function fingerprints used to skip unchanged functions.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.fingerprint import canonical_language, function_fingerprint, normalize_function
+
+DIVIDE = '''def divide(a, b, c):
+    """Integer division."""
+    return a // b
+'''
+
+JS = '''function total(items) {
+    // sum the prices
+    return items.reduce((sum, item) => sum + item.price, 0);
+}'''
+
+
+def test_fingerprint():
+    """Language codes share one normalizer, so real edits change the fingerprint and cosmetic ones do not."""
+
+    print("🧪 Testing Function Fingerprints")
+    print("=" * 50)
+
+    # Cut out of a diff mid-expression, so it only normalizes as tokens
+    fragment = "    total = (a // b  # floor\n"
+    print(f"   'py' fragment normalizes to: {normalize_function(fragment, 'py')}")
+
+    checks = [
+        ("language codes map to one name", [canonical_language(code) for code in ("py", "PY", ".py", "python")]
+         == ["python"] * 4 and canonical_language("ts") == "typescript" and canonical_language("js") == "javascript"),
+        ("'py' takes the Python AST path", normalize_function(DIVIDE, "py").startswith("ast:")
+         and function_fingerprint(DIVIDE, "py") == function_fingerprint(DIVIDE, "python")),
+        ("floor division operands are not a comment",
+         function_fingerprint(DIVIDE, "py") != function_fingerprint(DIVIDE.replace("// b", "// c"), "py")),
+        ("floor division in a fragment is not a comment",
+         function_fingerprint(fragment, "py") != function_fingerprint(fragment.replace("// b", "// c"), "py")),
+        ("comment-only edits keep the fingerprint", function_fingerprint(DIVIDE, "py")
+         == function_fingerprint(DIVIDE.replace("    return", "    # floor it\n    return"), "py")),
+        ("comment-only edits in a fragment keep the fingerprint", function_fingerprint(fragment, "py")
+         == function_fingerprint(fragment.replace("# floor", "# rounds down"), "py")),
+        ("docstring and formatting edits keep the fingerprint", function_fingerprint(DIVIDE, "py")
+         == function_fingerprint("def divide(a,b,c):\n    return (a // b)\n", "py")),
+        ("C-style comments are stripped for 'js'", function_fingerprint(JS, "js")
+         == function_fingerprint(JS.replace("// sum the prices", "/* totals */"), "javascript")),
+        ("'js' code changes are detected", function_fingerprint(JS, "js")
+         != function_fingerprint(JS.replace("item.price", "item.cost"), "js")),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_fingerprint()
+    print("\n🎉 All fingerprint tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
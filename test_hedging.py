@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Test script to verify hedged LLM requests and the hedge budget.
+"""
+
+import sys
+import os
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.backends import OllamaEndpointPool
+from ai_agent.llm import PhindCodeLlamaLLM
+from ai_agent.resilience import CircuitBreaker, HedgeBudget, LatencyTracker, hedged_call
+
+HEDGE_AFTER = 0.05
+
+
+class FakeEndpoint:
+    """Answers each copy of a request after a scripted delay, or raises; records cancellations"""
+
+    def __init__(self, *copies):
+        # Per copy: (seconds before answering, result or exception)
+        self.copies = list(copies)
+        self.started = 0
+        self.cancelled = []
+        self._lock = threading.Lock()
+
+    def __call__(self, cancelled: threading.Event):
+        with self._lock:
+            index = self.started
+            self.started += 1
+        delay, outcome = self.copies[index]
+        if cancelled.wait(delay):
+            self.cancelled.append(index)
+            raise RuntimeError(f"copy {index} abandoned")
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Streams ``server.name`` back from /api/generate after ``server.delay`` seconds"""
+
+    def do_GET(self):
+        self._reply(json.dumps({"models": [{"name": "fake"}]}).encode())
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        chunks = [{"response": self.server.name, "done": False}, {"response": "", "done": True, "eval_count": 1}]
+        self._reply("".join(json.dumps(chunk) + "\n" for chunk in chunks).encode())
+
+    def _reply(self, body):
+        try:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(name, delay):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllama)
+    server.name, server.delay, server.requests = name, delay, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def hedging_llm(urls=(), client=None):
+    """An LLM wired to a warm latency tracker and a generous hedge budget, without loading a provider"""
+    llm = PhindCodeLlamaLLM.__new__(PhindCodeLlamaLLM)
+    llm._call_state = threading.local()
+    llm.model_name = llm.ollama_model = "fake"
+    llm.api_token = ""
+    llm.latency = LatencyTracker(default_timeout=10.0, min_timeout=5.0, max_timeout=10.0, min_samples=1)
+    llm.breaker = CircuitBreaker("fake", failure_threshold=5, recovery_timeout=60.0)
+    llm.hedge_budget = HedgeBudget(ratio=1.0, burst=5)
+    llm.client = client
+    if urls:
+        llm.ollama_pool = OllamaEndpointPool(list(urls), health_interval=60.0)
+        llm.ollama_pool.check_all()
+    for size in (6, 7):
+        llm.latency.record(size, HEDGE_AFTER)
+    return llm
+
+
+def eventually(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_hedging():
+    """The first answer wins, the loser is told to stop and hedges stay within budget."""
+
+    print("🧪 Testing Request Hedging")
+    print("=" * 50)
+
+    inline = FakeEndpoint((0, "inline"))
+    unbudgeted = hedged_call(inline, HEDGE_AFTER, None)
+
+    budget = HedgeBudget(ratio=0.0, burst=1)
+    no_estimate = FakeEndpoint((0, "first"))
+    hedged_call(no_estimate, None, budget)
+
+    fast = FakeEndpoint((0, "primary"), (0, "hedge"))
+    fast_result = hedged_call(fast, HEDGE_AFTER, budget)
+
+    slow = FakeEndpoint((2.0, "primary"), (0, "hedge"))
+    slow_result = hedged_call(slow, HEDGE_AFTER, budget)
+    # The loser notices its event on its own thread, shortly after the winner returns
+    eventually(lambda: slow.cancelled)
+
+    exhausted = FakeEndpoint((0.2, "primary"), (0, "hedge"))
+    exhausted_result = hedged_call(exhausted, HEDGE_AFTER, budget)
+
+    rescue_budget = HedgeBudget(ratio=1.0, burst=1)
+    failing_primary = FakeEndpoint((0.1, RuntimeError("503")), (0.3, "hedge"))
+    rescued = hedged_call(failing_primary, HEDGE_AFTER, rescue_budget)
+
+    both_fail = FakeEndpoint((0.1, RuntimeError("primary 503")), (0, RuntimeError("hedge 503")))
+    try:
+        hedged_call(both_fail, HEDGE_AFTER, rescue_budget)
+        raised = None
+    except RuntimeError as e:
+        raised = str(e)
+
+    limits = HedgeBudget(ratio=0.1, burst=1)
+    for _ in range(20):
+        limits.record_request()
+    granted = sum(limits.try_acquire() for _ in range(10))
+
+    # A hedge from the LLM goes to a different Ollama host, and never to the only host
+    (slow_host, slow_url), (fast_host, fast_url) = start_server("slow", 1.0), start_server("fast", 0.0)
+    try:
+        pooled = hedging_llm([slow_url, fast_url])
+        pooled_text = pooled._generate_ollama([{"role": "user", "content": "prompt"}], max_retries=1)
+        pooled_endpoint = pooled.last_generation_stats.get("endpoint")
+        eventually(lambda: slow_host.requests == 1)
+        pooled_requests = (slow_host.requests, fast_host.requests)
+
+        slow_host.requests = 0
+        single = hedging_llm([slow_url])
+        single_text = single._generate_ollama([{"role": "user", "content": "prompt"}], max_retries=1)
+        single_requests = slow_host.requests
+    finally:
+        slow_host.shutdown()
+        fast_host.shutdown()
+
+    remote_calls = []
+
+    def slow_create(**kwargs):
+        remote_calls.append(kwargs["model"])
+        time.sleep(0.2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="remote"))], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=slow_create)))
+    client.with_options = lambda timeout: client
+    remote_text = hedging_llm(client=client)._generate_remote(
+        [{"role": "user", "content": "prompt"}], max_new_tokens=8, max_retries=1, temperature=0.0)
+
+    summary = budget.summary()
+    print(f"   budget: {summary}")
+
+    checks = [
+        ("no budget runs inline, once", unbudgeted == "inline" and inline.started == 1),
+        ("no latency estimate never hedges", no_estimate.started == 1),
+        ("fast answers are not hedged", fast_result == "primary" and fast.started == 1),
+        ("slow primary loses to the hedge", slow_result == "hedge" and slow.started == 2),
+        ("the losing copy is cancelled", slow.cancelled == [0]),
+        ("spent budget stops hedging", exhausted_result == "primary" and exhausted.started == 1),
+        ("requests, hedges and wins are counted", summary == {"requests": 4, "hedges": 1, "hedge_wins": 1}),
+        ("a failed primary is rescued by the hedge", rescued == "hedge" and failing_primary.started == 2),
+        ("the first error surfaces when every copy fails", raised in ("primary 503", "hedge 503")),
+        ("hedges capped at ratio x requests + burst", granted == 3),
+        ("an Ollama hedge goes to another host", pooled_text == "fast" and pooled_endpoint == fast_url
+         and pooled_requests == (1, 1)),
+        ("a single Ollama host is never hedged", single_text == "slow" and single_requests == 1),
+        ("single-endpoint remote calls are never hedged", remote_text == "remote" and len(remote_calls) == 1),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_hedging()
+    print("\n🎉 All hedging tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
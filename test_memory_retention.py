@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test script to verify memory retention: TTL, LRU eviction and running aggregates.
+"""
+
+import sys
+import os
+import json
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.memory import MemoryModule
+
+
+def test_memory_retention():
+    """Old lists migrate to aggregates, stale entries expire and categories stay capped."""
+
+    print("🧪 Testing Memory Retention")
+    print("=" * 50)
+
+    old = (datetime.now() - timedelta(days=200)).isoformat()
+    recent = datetime.now().isoformat()
+    signature = "def add(a: int, b: int) -> int:"
+    legacy = {
+        # Keys from the old per-process ``hash(signature) % 10000``: one function, two keys
+        "test_patterns": {
+            "add_1234": {"function_name": "add", "function_signature": signature, "test_code": "old",
+                         "created_at": old, "last_accessed": recent, "usage_count": 2},
+            "add_8765": {"function_name": "add", "function_signature": "def add(a: int,  b: int) -> int:",
+                         "test_code": "new", "created_at": recent, "last_accessed": recent, "usage_count": 1},
+            "sub_4321": {"function_name": "sub", "function_signature": "def sub(a: int, b: int) -> int:",
+                         "test_code": "sub", "created_at": recent, "last_accessed": recent, "usage_count": 0},
+        },
+        "function_contexts": {
+            "stale": {"file_path": "a.py", "diff_context": "", "created_at": old, "last_accessed": old},
+            "fresh": {"file_path": "b.py", "diff_context": "", "created_at": old, "last_accessed": recent},
+        },
+        "diff_patterns": {},
+        "coverage_gaps": {},
+        "prompt_effectiveness": {
+            "cot_python": {"quality_scores": [0.2, 0.4, 0.6], "coverage_scores": [0.5, 0.5, 0.5], "usage_count": 3},
+        },
+        "last_updated": old,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "memory.json")
+        with open(path, "w") as f:
+            json.dump(legacy, f)
+
+        memory = MemoryModule(path, ttl_days=90, max_entries={"function_contexts": 3})
+        aggregate = dict(memory.memory["prompt_effectiveness"]["cot_python"]["quality"])
+        insights = memory.get_insights()["best_strategies"]["python"]["cot"]
+        expired = "stale" not in memory.memory["function_contexts"]
+
+        for name in ("one", "two"):
+            memory.store_function_context(name, f"{name}.py", "diff")
+        memory.get_function_context("fresh")
+        memory.store_function_context("three", "three.py", "diff")
+        kept = list(memory.memory["function_contexts"])
+
+        patterns = dict(memory.memory["test_patterns"])
+
+        memory.store_prompt_effectiveness("cot", "python", 0.8, 0.5)
+        reloaded = MemoryModule(path)
+        saved = json.load(open(path))
+
+        # Separate processes with different string hash seeds must upsert the same entry
+        store = ("from ai_agent.memory import MemoryModule; "
+                 f"MemoryModule({path!r}).store_test_pattern('add', {signature!r}, 'latest', file_path='calc.py')")
+        for seed in ("1", "2"):
+            subprocess.run([sys.executable, "-c", store], check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                           env=dict(os.environ, PYTHONHASHSEED=seed))
+        upserted = [p for p in MemoryModule(path).memory["test_patterns"].values() if p.get("file_path") == "calc.py"]
+
+    print(f"   kept after eviction: {kept}")
+    print(f"   quality aggregate: {aggregate}")
+
+    merged = [p for p in patterns.values() if p["function_name"] == "add"]
+    checks = [
+        ("duplicate legacy keys are merged", len(patterns) == 2 and len(merged) == 1),
+        ("merge keeps the newest test and total usage", merged[0]["test_code"] == "new"
+         and merged[0]["usage_count"] == 3 and merged[0]["created_at"] == old),
+        ("re-runs upsert one stable key", len(upserted) == 1 and upserted[0]["test_code"] == "latest"),
+        ("score lists migrate to count/mean/M2",
+         aggregate["count"] == 3 and abs(aggregate["mean"] - 0.4) < 1e-9 and abs(aggregate["m2"] - 0.08) < 1e-9),
+        ("insights read the aggregates", abs(insights["avg_quality"] - 0.4) < 1e-9),
+        ("entries past the TTL are dropped on load", expired and "fresh" in kept),
+        ("least recently used entry is evicted first", kept == ["two", "fresh", "three"]),
+        ("aggregates keep updating", reloaded.memory["prompt_effectiveness"]["cot_python"]["quality"]["count"] == 4),
+        ("no raw score lists are saved", "quality_scores" not in json.dumps(saved)),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_memory_retention()
+    print("\n🎉 All memory retention tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Test script to verify per-stage span recording and the summary table.
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.metrics import MetricsRecorder
+
+
+def test_metrics_recorder():
+    """Spans carry labels and attributes, failures are counted and JSONL is written."""
+
+    print("🧪 Testing Metrics Recorder")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "spans.jsonl")
+        recorder = MetricsRecorder()
+        recorder.configure(path)
+
+        with recorder.labels(pr="repo/PR_1", strategy="naive"):
+            with recorder.labels(function="add"):
+                with recorder.span("llm_call") as span:
+                    span["tokens_in"] = 120
+                    span["tokens_out"] = 40
+            try:
+                with recorder.span("validation"):
+                    raise ValueError("bad test")
+            except ValueError:
+                pass
+        recorder.record("llm_call", 0.5, tokens_in=80, tokens_out=10)
+        recorder.configure(None)
+
+        with open(path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+
+    rows = {row["stage"]: row for row in recorder.summary()}
+
+    bounded = MetricsRecorder(max_spans=5)
+    for i in range(20):
+        bounded.record("llm_call", 0.1, tokens_out=2, call=i)
+    bounded_row = bounded.summary()[0]
+    kept = [span["call"] for span in bounded.spans_for("llm_call")]
+    bounded.reset()
+    checks = [
+        ("two spans per llm_call row", rows["llm_call"]["count"] == 2),
+        ("tokens summed", rows["llm_call"]["tokens_in"] == 200 and rows["llm_call"]["tokens_out"] == 50),
+        ("error counted", rows["validation"]["errors"] == 1),
+        ("nested labels applied", lines[0].get("pr") == "repo/PR_1" and lines[0].get("function") == "add"),
+        ("labels popped on exit", "function" not in lines[1] and "pr" not in lines[2]),
+        ("all spans written", len(lines) == 3),
+        ("in-memory spans are capped at the newest", kept == list(range(15, 20))),
+        ("summary totals survive eviction", bounded_row["count"] == 20 and bounded_row["tokens_out"] == 40
+         and bounded_row["total_s"] == 2.0),
+        ("reset clears spans and totals", not bounded.spans and bounded.summary() == []),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+
+    print(recorder.format_summary())
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_metrics_recorder()
+    print("\n🎉 All metrics tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
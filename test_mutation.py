@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test script to verify mutant generation, mutation scores and result caching.
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.memory import MemoryModule
+from ai_agent.mutation import MutationTester, generate_mutants
+
+SOURCE = '''def clamp(x, lo=0, hi=10):
+    """Clamp x into [lo, hi]."""
+    if x < lo:
+        return lo
+    if x > hi:
+        return hi
+    return x
+'''
+
+WEAK_TEST = "from calc import clamp\n\ndef test_clamp():\n    assert clamp(5) == 5\n"
+STRONG_TEST = (
+    "from calc import clamp\n\n"
+    "def test_clamp():\n"
+    "    assert clamp(5) == 5\n"
+    "    assert clamp(-1) == 0\n"
+    "    assert clamp(0) == 0\n"
+    "    assert clamp(10) == 10\n"
+    "    assert clamp(11) == 10\n"
+)
+
+
+def test_mutation_testing():
+    """Stronger tests kill more mutants and repeated runs come from the cache."""
+
+    print("🧪 Testing Mutation Testing")
+    print("=" * 50)
+
+    mutants = generate_mutants(SOURCE, "clamp")
+    print(f"   {len(mutants)} mutants: {', '.join(sorted({m.description for m in mutants}))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = MemoryModule(os.path.join(tmp, "memory.json"))
+        tester = MutationTester(memory=memory)
+        sources = {"calc.py": SOURCE}
+        weak = tester.run(sources, "calc.py", "clamp", WEAK_TEST)
+        strong = tester.run(sources, "calc.py", "clamp", STRONG_TEST)
+        again = tester.run(sources, "calc.py", "clamp", STRONG_TEST)
+        failing = tester.run(sources, "calc.py", "clamp", WEAK_TEST.replace("== 5", "== 6"))
+
+    print(f"   weak: {weak['score']:.2f}, strong: {strong['score']:.2f}, survivors: {strong['survivors']}")
+
+    checks = [
+        ("docstring and defaults are not mutated", all(m.lineno >= 3 for m in mutants)),
+        ("every mutant changes the source", all(m.source.strip() != SOURCE.strip() for m in mutants)),
+        ("stronger test scores higher", strong["score"] > weak["score"]),
+        # At the boundary `x <= lo` still returns lo, so these two mutants are equivalent
+        ("only equivalent mutants survive the strong test",
+         sorted(strong["survivors"]) == ["line 3: Lt -> LtE", "line 5: Gt -> GtE"]),
+        ("repeated run is cached", again["cached"] and again["score"] == strong["score"]),
+        ("no score when the test fails on the original", failing["score"] is None),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_mutation_testing()
+    print("\n🎉 All mutation tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
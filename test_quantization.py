@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the quantized CPU inference modes of the local backend.
+"""
+
+import sys
+import os
+import logging
+import tempfile
+import types
+import warnings
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+import transformers
+
+from ai_agent.llm import PhindCodeLlamaLLM
+
+ENV_KEYS = ("AI_AGENT_QUANTIZE", "AI_AGENT_GGUF_PATH", "AI_AGENT_DEVICE", "AI_AGENT_DRAFT_MODEL")
+
+
+class FakeTokenizer:
+    eos_token_id = 0
+
+    def get_vocab(self):
+        return {"a": 0}
+
+
+class FakeLlama:
+    def __init__(self, model_path, **kwargs):
+        self.model_path = model_path
+
+
+def tiny_model(*args, **kwargs):
+    return torch.nn.Sequential(torch.nn.Linear(64, 64), torch.nn.ReLU(), torch.nn.Linear(64, 64))
+
+
+def init_local(env, llama_cpp=None, cuda=False):
+    """Run _init_local with a tiny in-memory model; ``llama_cpp`` None means the package is not installed"""
+    saved_env = {key: os.environ.pop(key, None) for key in ENV_KEYS}
+    saved = (transformers.AutoTokenizer.from_pretrained, transformers.AutoModelForCausalLM.from_pretrained,
+             torch.cuda.is_available, sys.modules.get("llama_cpp"), torch.get_num_threads())
+    os.environ.update(env)
+    transformers.AutoTokenizer.from_pretrained = lambda *args, **kwargs: FakeTokenizer()
+    transformers.AutoModelForCausalLM.from_pretrained = tiny_model
+    torch.cuda.is_available = lambda: cuda
+    sys.modules["llama_cpp"] = llama_cpp
+    try:
+        llm = PhindCodeLlamaLLM.__new__(PhindCodeLlamaLLM)
+        llm.model_name = "tiny/model"
+        llm._init_local()
+    finally:
+        (transformers.AutoTokenizer.from_pretrained, transformers.AutoModelForCausalLM.from_pretrained,
+         torch.cuda.is_available, llama_module, threads) = saved
+        if llama_module is None:
+            sys.modules.pop("llama_cpp", None)
+        else:
+            sys.modules["llama_cpp"] = llama_module
+        torch.set_num_threads(threads)
+        for key in env:
+            os.environ.pop(key, None)
+        os.environ.update({key: value for key, value in saved_env.items() if value is not None})
+    return llm
+
+
+def linear_types(llm):
+    """Kinds of Linear layers in the model: quantized, or plain torch.nn modules"""
+    return {"quantized" if "quantized" in type(module).__module__ else "modules" for module in llm.model
+            if "Linear" in type(module).__name__}
+
+
+def test_quantization():
+    """int8 quantizes on CPU only; GGUF loads through llama.cpp and falls back when it cannot."""
+
+    print("🧪 Testing Quantized Inference Modes")
+    print("=" * 50)
+
+    fake_llama_cpp = types.ModuleType("llama_cpp")
+    fake_llama_cpp.Llama = FakeLlama
+    logging.disable(logging.WARNING)
+    warnings.simplefilter("ignore")
+    try:
+        full = init_local({})
+        int8 = init_local({"AI_AGENT_QUANTIZE": "int8"})
+        int8_cuda = init_local({"AI_AGENT_QUANTIZE": "int8", "AI_AGENT_DEVICE": "cuda"}, cuda=True)
+        no_llama_cpp = init_local({"AI_AGENT_QUANTIZE": "gguf", "AI_AGENT_GGUF_PATH": "/nonexistent.gguf"})
+        no_file = init_local({"AI_AGENT_QUANTIZE": "int4", "AI_AGENT_GGUF_PATH": "/nonexistent.gguf"},
+                             llama_cpp=fake_llama_cpp)
+        with tempfile.NamedTemporaryFile(suffix=".gguf") as gguf_file:
+            gguf_file.write(b"\0" * 4096)
+            gguf_file.flush()
+            gguf = init_local({"AI_AGENT_QUANTIZE": "gguf", "AI_AGENT_GGUF_PATH": gguf_file.name},
+                              llama_cpp=fake_llama_cpp)
+    finally:
+        logging.disable(logging.NOTSET)
+        warnings.resetwarnings()
+
+    print(f"   weights: float32 {full.model_weight_bytes} bytes, int8 {int8.model_weight_bytes} bytes")
+
+    checks = [
+        ("no quantization by default", linear_types(full) == {"modules"} and full.gguf_model is None),
+        ("int8 quantizes Linear layers on CPU", linear_types(int8) == {"quantized"}
+         and int8.model_weight_bytes < full.model_weight_bytes / 2),
+        ("int8 is skipped off the CPU", int8_cuda.local_device == "cuda" and linear_types(int8_cuda) == {"modules"}),
+        ("missing llama-cpp-python falls back to transformers", no_llama_cpp.gguf_model is None
+         and no_llama_cpp.quantize == "" and linear_types(no_llama_cpp) == {"modules"}),
+        ("a missing GGUF file falls back to transformers", no_file.gguf_model is None
+         and linear_types(no_file) == {"modules"}),
+        ("GGUF loads through llama.cpp on the CPU", isinstance(gguf.gguf_model, FakeLlama)
+         and gguf.local_device == "cpu" and gguf.model_weight_bytes == 4096 and not hasattr(gguf, "model")),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_quantization()
+    print("\n🎉 All quantization tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
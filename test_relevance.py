@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test script to verify BM25 ranking of prompt context snippets.
+"""
+
+import sys
+import os
+import json
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.enhanced_context import EnhancedContextLoader
+from ai_agent.prompts import PromptTemplates
+from ai_agent.relevance import RelevanceScorer, tokenize_identifiers
+
+FUNCTION = '''def parse_union_form(field, values):
+    return [field.validate(value) for value in values]
+'''
+
+PATCHES = {
+    "pkg/forms.py": {"language": "python", "patch": "+def parse_union_form(field, values):",
+                     "full_content": FUNCTION},
+    "pkg/logging_setup.py": {"language": "python", "patch": "+LOG_LEVEL = 'INFO'",
+                             "full_content": "LOG_LEVEL = 'INFO'\n"},
+    "pkg/union.py": {"language": "python", "patch": "+class UnionForm:",
+                     "full_content": "class UnionForm:\n    def parseUnionForm(self, field, values):\n        pass\n"},
+    "pkg/fields.py": {"language": "python", "patch": "+def validate(self, value):",
+                      "full_content": "class Field:\n    def validate(self, value):\n        return value\n"},
+    "pkg/settings.py": {"language": "python", "patch": "+DEBUG = False",
+                        "full_content": None},
+}
+
+
+def test_relevance():
+    """Identifiers split on case and underscores, snippets rank by overlap and top-k bounds the prompt."""
+
+    print("🧪 Testing Context Relevance Ranking")
+    print("=" * 50)
+
+    tokens = tokenize_identifiers("parseUnionForm(snake_case_name, self, x)")
+
+    scorer = RelevanceScorer(FUNCTION)
+    docs = [("logging", "LOG_LEVEL = 'INFO'"), ("union", "class UnionForm: def parseUnionForm"),
+            ("forms", "def parse_union_form(field, values): field.validate(value)")]
+    ranked = scorer.rank(docs, top_k=3)
+    truncated = scorer.rank(docs, top_k=1)
+    ties = RelevanceScorer("unrelated_query").rank(docs, top_k=2)
+
+    saved_top_k = os.environ.pop("AI_AGENT_CONTEXT_TOP_K", None)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "enhanced_patches.json"), "w") as f:
+                json.dump(PATCHES, f)
+            loader = EnhancedContextLoader(tmp)
+            unranked = loader.get_full_context_for_prompt("pkg/forms.py", sections=["related_files"])
+            related = loader.get_full_context_for_prompt(
+                "pkg/forms.py", function_code=FUNCTION, sections=["related_files"], top_k=2)["related_files"]
+
+            os.environ["AI_AGENT_CONTEXT_TOP_K"] = "1"
+            from_env = loader.get_full_context_for_prompt(
+                "pkg/forms.py", function_code=FUNCTION, sections=["related_files"])["related_files"]
+            os.environ["AI_AGENT_CONTEXT_TOP_K"] = "five"
+            bad_env = loader.get_full_context_for_prompt(
+                "pkg/forms.py", function_code=FUNCTION, sections=["related_files"])["related_files"]
+            del os.environ["AI_AGENT_CONTEXT_TOP_K"]
+
+            prompt_context = loader.get_full_context_for_prompt(
+                "pkg/forms.py", function_code=FUNCTION, sections=EnhancedContextLoader.PROMPT_SECTIONS)
+            prompt = PromptTemplates.enhanced_context_prompt(FUNCTION, prompt_context, "pkg/forms.py", "python")
+    finally:
+        if saved_top_k is not None:
+            os.environ["AI_AGENT_CONTEXT_TOP_K"] = saved_top_k
+        else:
+            os.environ.pop("AI_AGENT_CONTEXT_TOP_K", None)
+
+    print(f"   tokens: {tokens}")
+    print(f"   ranked: {ranked}, related files: {related}")
+
+    checks = [
+        ("camelCase and snake_case are split and kept whole",
+         {"parseunionform", "parse", "union", "form", "snake_case_name", "snake", "case", "name"} <= set(tokens)),
+        ("stopwords and one-letter names are dropped", "self" not in tokens and "x" not in tokens),
+        ("most relevant snippet ranks first", ranked[0] == "forms" and ranked[-1] == "logging"),
+        ("top_k truncates the ranking", truncated == ["forms"]),
+        ("ties keep their original order", ties == ["logging", "union"]),
+        ("without function code related files are not ranked", len(unranked["related_files"]) == 4),
+        ("related files rank by relevance and respect top_k", related == ["pkg/union.py", "pkg/fields.py"]),
+        ("AI_AGENT_CONTEXT_TOP_K overrides the default", from_env == ["pkg/union.py"]),
+        ("a non-integer override falls back to the default",
+         len(bad_env) == min(4, EnhancedContextLoader.DEFAULT_TOP_K)),
+        ("prompt sections include the related files", "related_files" in prompt_context
+         and "pkg/union.py" in prompt),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_relevance()
+    print("\n🎉 All relevance tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test script to verify adaptive timeouts, the circuit breaker and retry backoff.
+"""
+
+import sys
+import os
+import threading
+import time
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.llm import PhindCodeLlamaLLM
+from ai_agent.resilience import CircuitBreaker, CircuitOpenError, LatencyTracker, percentile, retry_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class HTTPError(Exception):
+    def __init__(self, headers):
+        super().__init__("429")
+        self.response = type("Response", (), {"headers": headers})()
+
+
+class FakeChatClient:
+    """OpenAI-style client; ``with_options`` returns a copy, so the shared client keeps its own timeout"""
+
+    def __init__(self, timeout=None, seen=None):
+        self.timeout = timeout
+        self.seen = seen if seen is not None else []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, timeout):
+        return FakeChatClient(timeout, self.seen)
+
+    def _create(self, model, messages, max_tokens, temperature):
+        # Long prompts answer first, so a shared timeout would be overwritten mid-flight
+        time.sleep(0.05 if len(messages[0]["content"]) < 1000 else 0.0)
+        self.seen.append((len(messages[0]["content"]), self.timeout))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=None)
+
+
+def remote_llm(tracker):
+    llm = PhindCodeLlamaLLM.__new__(PhindCodeLlamaLLM)
+    llm.model_name, llm.api_token = "fake", ""
+    llm.latency = tracker
+    llm.breaker = CircuitBreaker("fake", failure_threshold=5, recovery_timeout=60.0)
+    llm.client = FakeChatClient()
+    return llm
+
+
+def admitted(breaker):
+    try:
+        breaker.before_request()
+        return True
+    except CircuitOpenError:
+        return False
+
+
+def test_resilience():
+    """Timeouts follow observed latency per prompt size and the breaker walks closed/open/half-open."""
+
+    print("🧪 Testing Resilience")
+    print("=" * 50)
+
+    tracker = LatencyTracker(default_timeout=600.0, min_timeout=30.0, max_timeout=300.0,
+                             pct=95.0, headroom=2.0, window=20, min_samples=5)
+    cold = tracker.timeout_for(1000)
+    for latency in [10, 11, 12, 13, 14, 15, 16, 17, 18, 40]:
+        tracker.record(1000, latency)
+    warm = tracker.timeout_for(1000)
+    borrowed = tracker.latency_percentile(4000)
+    huge = tracker.timeout_for(60000)
+    for _ in range(5):
+        tracker.record(200, 1.0)
+    floor = tracker.timeout_for(200)
+    for _ in range(20):
+        tracker.record(1000, 20.0)
+    windowed = tracker.latency_percentile(1000)
+
+    clock = FakeClock()
+    breaker = CircuitBreaker("ollama", failure_threshold=3, recovery_timeout=60.0, clock=clock)
+    states = [breaker.state]
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    still_closed = breaker.state == CircuitBreaker.CLOSED
+    breaker.record_success()
+    reset = breaker.consecutive_failures == 0
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+    states.append(breaker.state)
+    rejected_while_open = not admitted(breaker)
+    clock.now += 59.0
+    still_rejected = not admitted(breaker)
+    clock.now += 1.0
+    trial = admitted(breaker)
+    states.append(breaker.state)
+    second_trial = admitted(breaker)
+    breaker.record_failure()
+    states.append(breaker.state)
+    reopened_rejects = not admitted(breaker)
+    clock.now += 60.0
+    admitted(breaker)
+    breaker.record_success()
+    states.append(breaker.state)
+
+    delays = [retry_delay(attempt, base=1.0, cap=8.0) for attempt in range(6) for _ in range(200)]
+    retry_after = retry_delay(0, HTTPError({"Retry-After": "7"}), cap=30.0)
+    capped_after = retry_delay(0, HTTPError({"Retry-After": "120"}), cap=30.0)
+
+    # Concurrent remote calls each run under the timeout computed for their own prompt
+    request_tracker = LatencyTracker(default_timeout=600.0, min_timeout=1.0, max_timeout=600.0, min_samples=1)
+    request_tracker.record(100, 10.0)
+    llm = remote_llm(request_tracker)
+    expected = {size: request_tracker.timeout_for(size) for size in (100, 5000)}
+    calls = [threading.Thread(target=llm._remote_attempt, args=([{"role": "user", "content": "x" * size}], 8, 0.0, size))
+             for size in (100, 5000)]
+    for call in calls:
+        call.start()
+    for call in calls:
+        call.join()
+    per_request = dict(llm.client.seen)
+    shared_timeout = llm.client.timeout
+    llm.client = object()
+    hf_client_timeout = getattr(llm._request_client(42.0), "timeout", None)
+
+    print(f"   timeouts: cold {cold}, warm {warm}, 60k chars {huge}, short {floor}")
+    print(f"   breaker states: {states}")
+
+    checks = [
+        ("nearest-rank percentile", percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 95) == 10
+         and percentile([5, 1, 3], 50) == 3),
+        ("default timeout without samples", cold == 600.0),
+        ("timeout is p95 x headroom", warm == 80.0),
+        ("other sizes borrow scaled latency", borrowed is not None and abs(borrowed - 160.0) < 1e-9),
+        ("timeouts clamp to max and min", huge == 300.0 and floor == 30.0),
+        ("only the latest window counts", windowed == 20.0),
+        ("stays closed below the threshold", still_closed and reset),
+        ("opens at the threshold and fails fast", states[1] == "open" and rejected_while_open and still_rejected),
+        ("one half-open trial after recovery", trial and states[2] == "half-open" and not second_trial),
+        ("failed trial reopens", states[3] == "open" and reopened_rejects),
+        ("successful trial closes", states[4] == "closed"),
+        ("backoff jitter stays under the cap", all(0 <= d <= 8.0 for d in delays)
+         and max(delays[:200]) <= 1.0 and max(delays[-200:]) > 4.0),
+        ("Retry-After is honoured and capped", retry_after == 7.0 and capped_after == 30.0),
+        ("remote calls get their own timeout", per_request == expected and expected[100] != expected[5000]),
+        ("the shared client is never mutated", shared_timeout is None and hf_client_timeout == 42.0),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_resilience()
+    print("\n🎉 All resilience tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
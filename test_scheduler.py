@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Test script to verify function prioritisation and the time budget.
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.scheduler import FunctionScheduler, WorkItem
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class PRContext:
+    """The parts of EnhancedContextLoader the scheduler reads"""
+
+    enhanced_patches = {
+        "calc.py": {"additions": "30", "deletions": "10", "patch": "+def add(a, b):", "is_test_file": False},
+        "tests/test_ops.py": {"is_test_file": True, "full_content": "def test_sub():\n    assert sub(2, 1) == 1\n"},
+        "tests/test_util.py": {"is_test_file": True, "full_content": ""},
+    }
+
+    def get_file_context(self, file_path):
+        return self.enhanced_patches.get(file_path, {})
+
+
+def body(lines):
+    return "\n".join(["def f():"] + ["    x = 1"] * lines)
+
+
+def test_scheduler():
+    """High-value functions run first and the run stops before overrunning its budget."""
+
+    print("🧪 Testing Function Scheduler")
+    print("=" * 50)
+
+    context = PRContext()
+    add = FunctionScheduler.build_item("calc.py", "python", "add", body(3), context)
+    sub = FunctionScheduler.build_item("calc.py", "python", "sub", body(3), context)
+    untouched = FunctionScheduler.build_item("util.py", "python", "helper", body(3), context)
+
+    scheduler = FunctionScheduler()
+    ordered = [item.function_name for item in scheduler.order([
+        WorkItem("a.py", "python", "small", body(1)),
+        WorkItem("a.py", "python", "tested", body(40), churn=50, touched_by_patch=True, has_tests=True),
+        WorkItem("a.py", "python", "hot", body(40), churn=50, touched_by_patch=True),
+        WorkItem("a.py", "python", "tie_first", body(5)),
+        WorkItem("a.py", "python", "tie_second", body(5)),
+    ])]
+
+    clock = FakeClock()
+    budgeted = FunctionScheduler(time_budget=30.0, clock=clock)
+    budgeted.start()
+    completed = 0
+    while budgeted.has_time_for_next():
+        clock.now += 8.0
+        budgeted.record(8.0)
+        completed += 1
+    elapsed = budgeted.elapsed()
+
+    unlimited = FunctionScheduler(clock=clock)
+    unlimited.start()
+    clock.now += 1e6
+
+    os.environ["AI_AGENT_TIME_BUDGET"] = "45"
+    from_env = FunctionScheduler.budget_from_env()
+    del os.environ["AI_AGENT_TIME_BUDGET"]
+
+    print(f"   order: {ordered}")
+    print(f"   completed {completed} items in {elapsed:.0f}s of a 30s budget")
+
+    checks = [
+        ("churn and patch hits come from the PR", add.churn == 40 and add.touched_by_patch
+         and not untouched.touched_by_patch and untouched.churn == 0),
+        ("tests naming the function or module count", sub.has_tests and untouched.has_tests and not add.has_tests),
+        ("touched, high-churn code goes first", ordered[0] == "hot"),
+        ("existing tests lower the priority", ordered.index("tested") == 1),
+        ("ties keep discovery order", ordered.index("tie_first") < ordered.index("tie_second")),
+        ("smallest function goes last", ordered[-1] == "small"),
+        ("stops before the item that would overrun", completed == 3 and elapsed <= 30.0),
+        ("no budget never stops", unlimited.has_time_for_next() and unlimited.remaining() is None),
+        ("budget read from AI_AGENT_TIME_BUDGET", from_env == 45.0 and FunctionScheduler.budget_from_env() is None),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_scheduler()
+    print("\n🎉 All scheduler tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test script to verify the shared SQLite memory used by concurrent agents.
+"""
+
+import sys
+import os
+import tempfile
+import multiprocessing
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.memory import MemoryModule
+from ai_agent.memory_store import merge_records
+
+WORKERS, UPDATES = 4, 50
+
+
+def _worker(path, worker_id):
+    memory = MemoryModule(path)
+    for i in range(UPDATES):
+        memory.store_test_pattern(f"w{worker_id}_f{i}", f"def f{i}(x: int):", "def test_f():\n    assert True\n")
+        memory.store_prompt_effectiveness("cot", "python", (worker_id * UPDATES + i) / 1000.0, 0.5)
+    memory.close()
+
+
+def sync_between_agents(path):
+    """Two agents on one store: own writes are not pulled back, deletes and trims propagate"""
+    writer = MemoryModule(path, max_entries={"function_contexts": 2})
+    reader = MemoryModule(path)
+    writer.store.sync_interval = reader.store.sync_interval = 0
+    for name in ("f0", "f1"):
+        writer.store_function_context(name, f"{name}.py", "diff")
+    writer.flush()
+    own_writes = writer.store.pull(force=True)
+    loaded = reader.get_function_context("f0") is not None
+
+    # A commit from another agent in between means the next pull must not skip it
+    writer.store_function_context("f1", "f1.py", "diff")
+    writer.flush()
+    reader.store_function_context("r0", "r0.py", "diff")
+    reader.flush()
+    writer.store_function_context("f1", "f1.py", "diff")
+    writer.flush()
+    interleaved = [key for _, key, _ in writer.store.pull(force=True)]
+
+    writer.store_function_context("f2", "f2.py", "diff")
+    writer.flush()
+    trimmed = reader.get_function_context("f0") is None
+
+    writer.store.delete("function_contexts", "f2")
+    writer.flush()
+    deleted = reader.get_function_context("f2") is None
+    writer.store_function_context("f2", "f2.py", "diff")
+    writer.flush()
+    restored = reader.get_function_context("f2") is not None
+    writer.close()
+    reader.close()
+    return own_writes, loaded, interleaved, trimmed, deleted, restored
+
+
+def test_shared_memory():
+    """Concurrent writers lose no entries or aggregate updates and see each other's writes."""
+
+    print("🧪 Testing Shared Memory")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "shared.db")
+        context = multiprocessing.get_context("spawn")
+        processes = [context.Process(target=_worker, args=(path, w)) for w in range(WORKERS)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        memory = MemoryModule(path)
+        quality = memory.memory["prompt_effectiveness"]["cot_python"]["quality"]
+        values = [(w * UPDATES + i) / 1000.0 for w in range(WORKERS) for i in range(UPDATES)]
+        mean = sum(values) / len(values)
+        m2 = sum((v - mean) ** 2 for v in values)
+
+        reader = MemoryModule(path)
+        reader.store.sync_interval = 0
+        memory.store_function_context("live", "live.py", "diff")
+        memory.flush()
+        seen = reader.get_function_context("live") is not None
+        patterns = len(memory.memory["test_patterns"])
+        memory.close()
+        reader.close()
+
+        own_writes, loaded, interleaved, trimmed, deleted, restored = sync_between_agents(
+            os.path.join(tmp, "sync.db"))
+
+    print(f"   {patterns} patterns, quality count {quality['count']}, mean {quality['mean']:.4f}")
+    split = merge_records({"count": 2, "mean": 1.5, "m2": 0.5}, {"count": 2, "mean": 3.5, "m2": 0.5})
+
+    checks = [
+        ("all workers exited cleanly", all(p.exitcode == 0 for p in processes)),
+        ("no entries lost", patterns == WORKERS * UPDATES),
+        ("no aggregate updates lost", quality["count"] == WORKERS * UPDATES),
+        ("merged mean and M2 are exact", abs(quality["mean"] - mean) < 1e-9 and abs(quality["m2"] - m2) < 1e-6),
+        ("Chan merge of [1, 2] and [3, 4]", split == {"count": 4, "mean": 2.5, "m2": 5.0}),
+        ("other agents see committed writes", seen),
+        ("an agent does not pull back its own commits", own_writes == [] and loaded),
+        ("commits interleaved with another agent's are still pulled", "r0" in interleaved),
+        ("trimmed entries disappear from other agents", trimmed),
+        ("deleted entries disappear from other agents", deleted),
+        ("re-adding a deleted entry clears its tombstone", restored),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_shared_memory()
+    print("\n🎉 All shared memory tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
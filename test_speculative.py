@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Test script to verify draft model loading and speculative decoding on the local backend.
+"""
+
+import sys
+import os
+import logging
+import threading
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+import transformers
+
+from ai_agent.llm import PhindCodeLlamaLLM
+
+TARGET_VOCAB = {"a": 0, "b": 1, "c": 2}
+
+
+class FakeTokenizer:
+    def __init__(self, vocab):
+        self.vocab = vocab
+        self.eos_token_id = 0
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+    def apply_chat_template(self, messages, tokenize=False, add_generation_prompt=True):
+        return messages[-1]["content"]
+
+    def __call__(self, text, return_tensors="pt", **kwargs):
+        return {"input_ids": torch.tensor([[1, 2, 3]])}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "def test_add():\n    assert add(1, 2) == 3"
+
+
+class FakeDraftModel:
+    """Counts teacher-forced forward passes; predicts token 2 everywhere"""
+
+    def __init__(self):
+        self.forward_passes = 0
+        self.generation_config = SimpleNamespace(num_assistant_tokens=5)
+
+    def to(self, device):
+        return self
+
+    def __call__(self, input_ids):
+        self.forward_passes += 1
+        logits = torch.zeros(1, input_ids.shape[-1], 3)
+        logits[..., 2] = 1.0
+        return SimpleNamespace(logits=logits)
+
+
+class FakeTargetModel:
+    def __init__(self):
+        self.generate_kwargs = []
+
+    def generate(self, input_ids, **kwargs):
+        self.generate_kwargs.append(kwargs)
+        return torch.cat([input_ids, torch.tensor([[2, 2, 1]])], dim=-1)
+
+
+def init_draft(env, tokenizer_vocab=TARGET_VOCAB, model_error=None):
+    """Run _init_draft_model with patched transformers loaders; returns the LLM and what was loaded"""
+    loaded = []
+
+    def tokenizer_from_pretrained(name, **kwargs):
+        loaded.append(("tokenizer", name))
+        return FakeTokenizer(tokenizer_vocab)
+
+    def model_from_pretrained(name, **kwargs):
+        loaded.append(("model", name))
+        if model_error:
+            raise model_error
+        return FakeDraftModel()
+
+    saved_env = {key: os.environ.pop(key, None) for key in
+                 ("AI_AGENT_DRAFT_MODEL", "AI_AGENT_DRAFT_TOKENS", "AI_AGENT_DRAFT_STATS")}
+    saved_loaders = (transformers.AutoTokenizer.from_pretrained, transformers.AutoModelForCausalLM.from_pretrained)
+    os.environ.update(env)
+    transformers.AutoTokenizer.from_pretrained = tokenizer_from_pretrained
+    transformers.AutoModelForCausalLM.from_pretrained = model_from_pretrained
+    try:
+        llm = PhindCodeLlamaLLM.__new__(PhindCodeLlamaLLM)
+        llm.local_device = "cpu"
+        llm.tokenizer = FakeTokenizer(TARGET_VOCAB)
+        llm._init_draft_model(torch.float32)
+    finally:
+        transformers.AutoTokenizer.from_pretrained, transformers.AutoModelForCausalLM.from_pretrained = saved_loaders
+        for key in env:
+            os.environ.pop(key, None)
+        os.environ.update({key: value for key, value in saved_env.items() if value is not None})
+    return llm, loaded
+
+
+def generate(llm):
+    llm._call_state = threading.local()
+    llm.provider = "local"
+    llm.model = FakeTargetModel()
+    llm.max_input_tokens = 1024
+    llm.gen_defaults = {}
+    llm.constrained_decoding = False
+    llm._token_vocabulary = None
+    text = llm._generate_local([{"role": "user", "content": "def add(a, b): ..."}], 16, 1, 0.2)
+    return text, llm.model.generate_kwargs[-1], dict(llm.last_generation_stats)
+
+
+def test_speculative():
+    """Draft models load when configured, fall back to plain decoding on errors and only pay for stats on request."""
+
+    print("🧪 Testing Speculative Decoding")
+    print("=" * 50)
+    logging.disable(logging.WARNING)
+    try:
+        unset, unset_loaded = init_draft({})
+        missing, _ = init_draft({"AI_AGENT_DRAFT_MODEL": "no/such-model"},
+                                model_error=OSError("no/such-model is not a valid model identifier"))
+        shared, _ = init_draft({"AI_AGENT_DRAFT_MODEL": "tiny/draft", "AI_AGENT_DRAFT_TOKENS": "3"})
+        mismatched, _ = init_draft({"AI_AGENT_DRAFT_MODEL": "tiny/other-vocab"}, tokenizer_vocab={"x": 0, "y": 1})
+        measured, _ = init_draft({"AI_AGENT_DRAFT_MODEL": "tiny/draft", "AI_AGENT_DRAFT_STATS": "1"})
+
+        plain_text, plain_kwargs, _ = generate(missing)
+        _, shared_kwargs, shared_stats = generate(shared)
+        _, mismatched_kwargs, _ = generate(mismatched)
+        _, _, measured_stats = generate(measured)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"   measured stats: {measured_stats}")
+
+    checks = [
+        ("no draft model unless configured", unset.draft_model is None and unset_loaded == []),
+        ("a draft model that fails to load falls back to plain decoding",
+         missing.draft_model is None and missing.draft_tokenizer is None
+         and "assistant_model" not in plain_kwargs and plain_text.startswith("def test_add")),
+        ("a loaded draft model assists generation", shared_kwargs.get("assistant_model") is shared.draft_model
+         and shared.draft_model.generation_config.num_assistant_tokens == 3),
+        ("shared vocabularies need no assistant tokenizer", shared.draft_shares_vocab
+         and "assistant_tokenizer" not in shared_kwargs),
+        ("different vocabularies use universal assisted decoding", not mismatched.draft_shares_vocab
+         and mismatched_kwargs.get("assistant_tokenizer") is mismatched.draft_tokenizer
+         and mismatched_kwargs.get("tokenizer") is mismatched.tokenizer),
+        ("no extra draft pass without AI_AGENT_DRAFT_STATS", shared.draft_model.forward_passes == 0
+         and "acceptance_rate" not in shared_stats and mismatched.draft_model.forward_passes == 0),
+        ("AI_AGENT_DRAFT_STATS measures the acceptance rate", measured.draft_model.forward_passes == 1
+         and abs(measured_stats.get("acceptance_rate", 0) - 2 / 3) < 0.01
+         and measured.speculative_acceptance_rate is not None),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_speculative()
+    print("\n🎉 All speculative decoding tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script to verify watch mode debouncing and change coalescing.
+"""
+
+import sys
+import os
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from ai_agent.fs_events import FileEvent, PollingWatcher
+from ai_agent.watcher import WorkingTreeWatcher
+
+ORIGINAL = """def add(a, b):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
+"""
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 50.0
+
+    def __call__(self):
+        return self.now
+
+
+def save(path, content, clock, watcher, after):
+    clock.now += after
+    with open(path, "w") as f:
+        f.write(content)
+    watcher.handle_event(FileEvent("changed", path))
+
+
+def test_watcher():
+    """Saves are parsed once quiet, repeated edits coalesce and no-op edits are dropped."""
+
+    print("🧪 Testing Watch Mode")
+    print("=" * 50)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "calc.py")
+        with open(path, "w") as f:
+            f.write(ORIGINAL)
+        os.makedirs(os.path.join(tmp, "node_modules"))
+        with open(os.path.join(tmp, "node_modules", "vendored.py"), "w") as f:
+            f.write("def vendored():\n    pass\n")
+
+        clock = FakeClock()
+        watcher = WorkingTreeWatcher(tmp, on_changes=lambda batch: None, debounce=0.5, clock=clock)
+        watcher.prime()
+        primed = sorted(os.path.relpath(p, tmp) for p in watcher.snapshots)
+
+        # A burst of saves is parsed once, 0.5s after the last one
+        save(path, ORIGINAL.replace("a + b", "a + b + 0"), clock, watcher, after=0.0)
+        current = ORIGINAL.replace("a + b", "b + a")
+        save(path, current, clock, watcher, after=0.3)
+        clock.now += 0.3
+        too_soon = watcher.flush_quiet_files()
+        clock.now += 0.2
+        flushed = watcher.flush_quiet_files()
+        first = watcher.drain()
+
+        # Saves flushed before the batch is drained coalesce into one entry per function
+        current = current.replace("a - b", "b - a")
+        save(path, current, clock, watcher, after=1.0)
+        clock.now += 0.5
+        watcher.flush_quiet_files()
+        current = current.replace("return b - a", "return -(a - b) * 1")
+        save(path, current, clock, watcher, after=0.1)
+        clock.now += 0.5
+        watcher.flush_quiet_files()
+        coalesced = watcher.drain()
+
+        # Whitespace and comment edits keep the normalized fingerprint and queue nothing
+        save(path, current.replace("return b + a", "return b + a  # sum"), clock, watcher, after=1.0)
+        clock.now += 0.5
+        watcher.flush_quiet_files()
+        cosmetic = watcher.drain()
+
+        # A queued function that is deleted before the batch runs is dropped
+        save(path, current.replace("b + a", "b + a + 1"), clock, watcher, after=1.0)
+        clock.now += 0.5
+        watcher.flush_quiet_files()
+        queued_before_delete = [key[1] for key in watcher.queue]
+        save(path, "def sub(a, b):\n    return -(a - b) * 1\n", clock, watcher, after=0.1)
+        clock.now += 0.5
+        watcher.flush_quiet_files()
+        removed = watcher.drain()
+
+        # Rescanning a directory does not touch siblings that share its name as a prefix
+        for name in ("lib", "lib_old"):
+            os.makedirs(os.path.join(tmp, name))
+            with open(os.path.join(tmp, name, "util.py"), "w") as f:
+                f.write("def noop():\n    pass\n")
+        watcher.prime()
+        os.remove(os.path.join(tmp, "lib", "util.py"))
+        watcher.pending_files.clear()
+        watcher.handle_event(FileEvent("rescan", os.path.join(tmp, "lib")))
+        rescanned = sorted(os.path.relpath(p, tmp) for p in watcher.pending_files)
+
+        watcher.handle_event(FileEvent("deleted", path))
+        forgotten = path not in watcher.snapshots
+
+        polling = PollingWatcher(tmp, interval=0.0)
+        with open(os.path.join(tmp, "new.py"), "w") as f:
+            f.write("def mul(a, b):\n    return a * b\n")
+        polled = [(event.kind, os.path.basename(event.path)) for event in polling.read_events(0.1)]
+
+    print(f"   first batch: {[(c.name, c.code.splitlines()[-1].strip()) for c in first]}")
+    print(f"   coalesced: {[(c.name, c.previous_code.splitlines()[-1].strip()) for c in coalesced]}")
+
+    checks = [
+        ("ignored directories are not watched", primed == ["calc.py"]),
+        ("nothing is parsed until the file is quiet", too_soon == 0 and flushed == 1),
+        ("a burst of saves yields one change with the final code",
+         [(c.name, "b + a" in c.code) for c in first] == [("add", True)]),
+        ("repeated edits coalesce per function", len(coalesced) == 1 and coalesced[0].name == "sub"),
+        ("coalesced entry has latest code and first previous code",
+         coalesced and coalesced[0].code.strip().endswith("-(a - b) * 1")
+         and coalesced[0].previous_code.strip().endswith("return a - b")),
+        ("cosmetic edits are not queued", cosmetic == []),
+        ("deleted functions leave the queue", queued_before_delete == ["add"] and removed == []),
+        ("rescans stay inside the rescanned directory", rescanned == [os.path.join("lib", "util.py")]),
+        ("deleted files are forgotten", forgotten),
+        ("polling fallback reports new files", ("changed", "new.py") in polled),
+    ]
+
+    all_passed = True
+    for name, passed in checks:
+        all_passed = all_passed and passed
+        print(f"   {'✅' if passed else '❌'} {name}")
+    return all_passed
+
+
+if __name__ == "__main__":
+    success = test_watcher()
+    print("\n🎉 All watcher tests passed!" if success else "\n⚠️  Some tests failed.")
+    sys.exit(0 if success else 1)